@@ -4,56 +4,126 @@ Data Analysis Team
 Purpose: Analyze and compare UDP performance before/after optimization
 """
 
+import argparse
 import csv
 import os
-import statistics
+import sys
+import time
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from metrics_engine import compute_metrics, compute_metrics_python
+from clock_sync import load_clock
+from impairment import describe as describe_impairment, load_record as load_impairment_record
+from kernel_counters import load_series as load_kernel_series
+from manifest import read_manifest
+from rate_log import load_rate_log
+from result_store import COLUMNS as RESULT_COLUMNS, is_columnar, open_columns
+from sequence_analysis import SequenceSet, burst_histogram
+from shm_metrics import SHM_NAME, MetricsReader
+from socket_tuning import OPTIONS as TUNING_OPTIONS, load_record as load_tuning_record
+from fast_charts import CHART_DPI, render_comparison, render_rate_log
+from hdr_histogram import HdrHistogram
+from multi_run import RANK_KEYS, compare_runs
+from streaming import CHUNK_ROWS, IncrementalSummary, StreamingSummary
+
+# NumPy dùng cho engine metrics vector hóa (thiếu thì tính bằng Python thuần)
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
 # Kiểm tra xem có thể import matplotlib hay không
 try:
     import matplotlib.pyplot as plt
-    import numpy as np
     HAS_MATPLOTLIB = True
     print("Matplotlib available - se tao bieu do PNG")
 except ImportError:
     HAS_MATPLOTLIB = False
     print("Matplotlib not available - chi ASCII charts")
 
+TAIL_INTERVAL = 2.0        # --tail: giây giữa hai lần cập nhật
+
 class UDPOptimizerAnalyzer:
     """
     Phân tích hiệu suất UDP và so sánh trước/sau tối ưu hóa
     """
     
-    def __init__(self, unoptimized_file="../Data/results.csv", optimized_file="../Data/results_optimized.csv"):
+    def __init__(self, unoptimized_file="../Data/results.csv", optimized_file="../Data/results_optimized.csv",
+                 streaming=False, chunk_rows=CHUNK_ROWS, manifest_file=None, clock_file=None, cache=True,
+                 rate_log_file=None, impairment_file=None):
         self.unoptimized_file = unoptimized_file
         self.optimized_file = optimized_file
-        self.unoptimized_data = []
-        self.optimized_data = []
+        # streaming=True: không giữ dữ liệu thô, chỉ giữ StreamingSummary (bộ nhớ không đổi)
+        self.streaming = streaming
+        self.chunk_rows = chunk_rows
+        # streaming: dùng/ghi <file>.summary.pkl để không đọc lại file không đổi
+        self.cache = cache
+        self.unoptimized_data = {}   # dict tên cột -> dãy giá trị
+        self.optimized_data = {}
         self.has_optimized_data = False
+        self._metrics_cache = {}     # id(mảng delay) -> (mảng delay, metrics)
+        # Manifest của load_generator.py: số gói thực gửi của từng flow (mất gói thật)
+        self.manifest_file = manifest_file
+        self.manifest = None
+        self._sequence_cache = {}    # id(mảng packet_id) -> (mảng packet_id, SequenceSet)
+        # clock_sync.json của client --sync: offset/drift/RTT đo bằng echo
+        self.clock_file = clock_file
+        self.clock = None
+        # Hồ sơ tinh chỉnh socket ghi cạnh file kết quả (<file>.tuning.json) và trong manifest
+        self.tunings = {}
+        # Chuỗi bộ đếm kernel của server --kernel-stats (<file>.kernel.csv): nhãn -> dict cột
+        self.kernel_series = {}
+        # Nhật ký tốc độ của client --adaptive (rate_log.csv): dict cột -> list
+        self.rate_log_file = rate_log_file
+        self.rate_log = None
+        # Bản ghi của Server/impairment_relay.py --record (impairment.json): hồ sơ + bộ đếm relay
+        self.impairment_file = impairment_file
+        self.impairment = None
         
     def load_data(self):
-        """Tải dữ liệu từ các file CSV"""
+        """Tải dữ liệu từ các file kết quả (CSV hoặc kho dạng cột *.col)"""
         print("\n=== TAI DU LIEU ===")
         
+        # Manifest (nếu có) mô tả các flow của file chưa tối ưu
+        self._load_manifest()
+            
+        if self.clock_file:
+            try:
+                self.clock = load_clock(self.clock_file)
+            except (OSError, ValueError) as e:
+                print(f"Loi khi doc file dong ho: {e}")
+            
+        if self.rate_log_file:
+            self.rate_log = load_rate_log(self.rate_log_file)
+            if self.rate_log is None:
+                print(f"Khong doc duoc nhat ky toc do: {self.rate_log_file}")
+            
+        if self.impairment_file:
+            self.impairment = load_impairment_record(self.impairment_file)
+            if self.impairment is None:
+                print(f"Khong doc duoc ban ghi suy giam mang: {self.impairment_file}")
+            
+        for label, path in (("Chua toi uu", self.unoptimized_file), ("Da toi uu", self.optimized_file)):
+            record = load_tuning_record(path)
+            if record is not None:
+                self.tunings[f"{label} (server)"] = record
+        for label, path in (("Chua toi uu", self.unoptimized_file), ("Da toi uu", self.optimized_file)):
+            series = load_kernel_series(path)
+            if series is not None:
+                self.kernel_series[label] = series
+        if self.manifest and self.manifest.get("tuning"):
+            self.tunings["Chua toi uu (client)"] = self.manifest["tuning"]
+            
         # Tải dữ liệu chưa tối ưu
         if not os.path.exists(self.unoptimized_file):
             print(f"Khong tim thay file: {self.unoptimized_file}")
             return False
             
         try:
-            with open(self.unoptimized_file, 'r', encoding='utf-8') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    delay = float(row['delay_ms'])
-                    if delay > 0:  # Loại bỏ delay âm
-                        self.unoptimized_data.append({
-                            'packet_id': int(row['packet_id']),
-                            'send_time': float(row['send_time']),
-                            'receive_time': float(row['receive_time']),
-                            'delay_ms': delay
-                        })
-                        
-            print(f"Da tai {len(self.unoptimized_data)} goi tin chua toi uu")
+            self.unoptimized_data = self._read_results(self.unoptimized_file, self._flows())
+            print(f"Da tai {self._count(self.unoptimized_data)} goi tin chua toi uu")
             
         except Exception as e:
             print(f"Loi khi doc file chua toi uu: {e}")
@@ -62,19 +132,8 @@ class UDPOptimizerAnalyzer:
         # Thử tải dữ liệu đã tối ưu (nếu có)
         if os.path.exists(self.optimized_file):
             try:
-                with open(self.optimized_file, 'r', encoding='utf-8') as file:
-                    reader = csv.DictReader(file)
-                    for row in reader:
-                        delay = float(row['delay_ms'])
-                        if delay > 0:
-                            self.optimized_data.append({
-                                'packet_id': int(row['packet_id']),
-                                'send_time': float(row['send_time']),
-                                'receive_time': float(row['receive_time']),
-                                'delay_ms': delay
-                            })
-                            
-                print(f"Da tai {len(self.optimized_data)} goi tin da toi uu")
+                self.optimized_data = self._read_results(self.optimized_file)
+                print(f"Da tai {self._count(self.optimized_data)} goi tin da toi uu")
                 self.has_optimized_data = True
                 
             except Exception as e:
@@ -83,63 +142,424 @@ class UDPOptimizerAnalyzer:
         else:
             print("Chua co du lieu da toi uu - chi phan tich du lieu hien tai")
             
-        return len(self.unoptimized_data) > 0
+        return self._count(self.unoptimized_data) > 0
+    
+    def _load_manifest(self):
+        if self.manifest_file and self.manifest is None:
+            try:
+                self.manifest = read_manifest(self.manifest_file)
+                print(f"Da tai manifest: {len(self.manifest['flows'])} flow, "
+                      f"{self.manifest['total_sent']} goi da gui")
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Loi khi doc manifest: {e}")
+        return self.manifest
+    
+    def _flows(self):
+        return self.manifest['flows'] if self.manifest else None
+    
+    def _read_results(self, path, flows=None):
+        """Đọc một file kết quả -> dict tên cột -> dãy giá trị (đã bỏ delay âm)"""
+        if self.streaming:
+            incremental = IncrementalSummary(path, self.chunk_rows, flows, self.cache)
+            incremental.refresh()
+            if incremental.from_cache:
+                print(f"Dung lai tom tat da luu cua {path} ({incremental.summary.count} goi)")
+            return incremental.summary
+        
+        if is_columnar(path):
+            # Kho dạng cột: numpy.memmap, không parse dòng nào
+            columns = open_columns(path)
+            mask = columns['delay_ms'] > 0
+            if not mask.all():
+                columns = {name: values[mask] for name, values in columns.items()}
+            return columns
+        
+        columns = {name: [] for name, _ in RESULT_COLUMNS}
+        with open(path, 'r', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            for row in reader:
+                delay = float(row['delay_ms'])
+                if delay > 0:  # Loại bỏ delay âm
+                    columns['packet_id'].append(int(row['packet_id']))
+                    columns['send_time'].append(float(row['send_time']))
+                    columns['receive_time'].append(float(row['receive_time']))
+                    columns['delay_ms'].append(delay)
+        
+        if HAS_NUMPY:
+            # Chuyển sang mảng liền để engine metrics xử lý vector hóa
+            columns = {name: np.asarray(values, dtype=np.int64 if code == 'q' else np.float64)
+                       for (name, code), values in zip(RESULT_COLUMNS, columns.values())}
+        return columns
+    
+    @staticmethod
+    def _count(data):
+        """Số gói trong một bộ dữ liệu dạng cột (hoặc StreamingSummary)"""
+        if isinstance(data, StreamingSummary):
+            return data.count
+        return len(data['delay_ms']) if data else 0
     
     def calculate_metrics(self, data, label=""):
         """Tính toán các metrics cho dữ liệu"""
-        if not data:
-            return None
+        # Chế độ streaming: metrics đã được cập nhật online khi đọc file
+        if isinstance(data, StreamingSummary):
+            return data.metrics()
         
-        # Xử lý cả list delays và list dict
-        if isinstance(data[0], dict):
-            delays = [packet['delay_ms'] for packet in data]
+        # Xử lý cả dữ liệu dạng cột và list delays
+        if isinstance(data, dict):
+            delays = data.get('delay_ms', [])
         else:
             delays = data  # Đã là list delays
         
-        # Tính jitter (độ biến thiên delay)
-        jitter_values = []
-        for i in range(1, len(delays)):
-            jitter = abs(delays[i] - delays[i-1])
-            jitter_values.append(jitter)
-        
-        metrics = {
-            'total_packets': len(data),
-            'avg_delay': statistics.mean(delays),
-            'min_delay': min(delays),
-            'max_delay': max(delays),
-            'median_delay': statistics.median(delays),
-            'std_delay': statistics.stdev(delays) if len(delays) > 1 else 0,
-            'percentile_95': np.percentile(delays, 95) if HAS_MATPLOTLIB else sorted(delays)[int(0.95 * len(delays))],
-            'percentile_99': np.percentile(delays, 99) if HAS_MATPLOTLIB else sorted(delays)[int(0.99 * len(delays))],
-            'avg_jitter': statistics.mean(jitter_values) if jitter_values else 0,
-            'max_jitter': max(jitter_values) if jitter_values else 0
-        }
+        if len(delays) == 0:
+            return None
+        
+        # Mỗi bộ dữ liệu chỉ tính 1 lần (báo cáo, biểu đồ, file đều gọi lại)
+        cached = self._metrics_cache.get(id(delays))
+        if cached is not None and cached[0] is delays:
+            return cached[1]
+        
+        if HAS_NUMPY:
+            metrics = compute_metrics(delays)
+        else:
+            metrics = compute_metrics_python(delays)
         
+        self._metrics_cache[id(delays)] = (delays, metrics)
         return metrics
     
-    def calculate_packet_loss(self):
-        """Tính tỷ lệ mất gói (giả lập)"""
-        # Trong thực tế, cần so sánh với số gói được gửi
-        # Ở đây giả sử mất gói dựa trên khoảng trống trong packet_id
+    def analyze_sequence(self, data, flows=None):
+        """
+        Phân tích packet_id bằng bitmap (SequenceSet): mất gói, trùng, đảo thứ tự, đến muộn.
+        Trả về None nếu dải id quá rộng để lập bitmap (VD nhiều flow mà không có manifest).
+        """
+        if isinstance(data, StreamingSummary):
+            return data.sequences  # đã cập nhật trong lúc đọc file
+        if self._count(data) == 0:
+            return None
+        
+        packet_ids = data['packet_id']
+        cached = self._sequence_cache.get(id(packet_ids))
+        if cached is not None and cached[0] is packet_ids:
+            return cached[1]
         
+        sequences = SequenceSet(flows)
+        try:
+            sequences.update(packet_ids)
+        except ValueError as e:
+            print(f"Khong phan tich duoc thu tu goi: {e}")
+            sequences = None
+        self._sequence_cache[id(packet_ids)] = (packet_ids, sequences)
+        return sequences
+    
+    def calculate_packet_loss(self):
+        """
+        Tính tỷ lệ mất gói từ bitmap packet_id (theo manifest nếu có).
+        None = không phân tích được thứ tự gói (in N/A, không đem so sánh).
+        """
         if not self.unoptimized_data:
-            return 0, 0
+            return None, None
             
-        def calc_loss_rate(data):
-            if len(data) < 2:
-                return 0
-                
-            packet_ids = [p['packet_id'] for p in data]
-            expected_packets = max(packet_ids) - min(packet_ids) + 1
-            actual_packets = len(packet_ids)
-            loss_rate = ((expected_packets - actual_packets) / expected_packets) * 100
-            return max(0, loss_rate)
+        def calc_loss_rate(data, flows=None):
+            sequences = self.analyze_sequence(data, flows)
+            if sequences is None:
+                return None
+            return sequences.summary()['loss_rate']
         
-        unopt_loss = calc_loss_rate(self.unoptimized_data)
-        opt_loss = calc_loss_rate(self.optimized_data) if self.has_optimized_data else 0
+        unopt_loss = calc_loss_rate(self.unoptimized_data, self._flows())
+        opt_loss = calc_loss_rate(self.optimized_data) if self.has_optimized_data else None
         
         return unopt_loss, opt_loss
     
+    @staticmethod
+    def _format_loss(loss):
+        return "N/A" if loss is None else f"{loss:.2f}"
+    
+    def print_sequence_report(self):
+        """In chi tiết thứ tự gói: trùng, đảo thứ tự, đến muộn, phân bố chuỗi mất gói, theo flow"""
+        datasets = [('Chua toi uu', self.unoptimized_data, self._flows())]
+        if self.has_optimized_data:
+            datasets.append(('Da toi uu', self.optimized_data, None))
+        
+        print(f"\n5. THU TU GOI (bitmap packet_id):")
+        print(f"   {'Loai':<14} {'Ky vong':>10} {'Nhan':>10} {'Mat':>8} {'Trung':>8} "
+              f"{'Dao thu tu':>10} {'Den muon':>9} {'Chuoi max':>10}")
+        summaries = []
+        for label, data, flows in datasets:
+            sequences = self.analyze_sequence(data, flows)
+            if sequences is None:
+                continue
+            total = sequences.summary()
+            summaries.append((label, total))
+            print(f"   {label:<14} {total['expected']:>10} {total['unique']:>10} {total['lost']:>8} "
+                  f"{total['duplicates']:>8} {total['out_of_order']:>10} {total['late']:>9} {total['max_burst']:>10}")
+            if total['stray']:
+                print(f"   {'':<14} {total['stray']} goi co packet_id ngoai moi flow cua manifest")
+        
+        for label, total in summaries:
+            if total['bursts']:
+                print(f"   Do dai chuoi mat goi ({label}): " +
+                      ", ".join(f"{lo}{'-' + str(hi) if hi > lo else ''}: {count}"
+                                for lo, hi, count in burst_histogram(total['bursts'])))
+        
+        if not self.manifest:
+            return
+        sequences = self.analyze_sequence(self.unoptimized_data, self._flows())
+        if sequences is None:
+            return
+        print(f"\n   Theo flow (manifest: {self.manifest_file}):")
+        print(f"   {'Flow':<6} {'Session':>10} {'Da gui':>10} {'Da nhan':>10} {'Mat':>8} {'Ti le (%)':>10} "
+              f"{'Trung':>7} {'Dao':>7}")
+        for flow, result in zip(self.manifest['flows'], sequences.results()):
+            print(f"   {flow['worker']:<6} {flow['session_id']:>10} {flow['sent']:>10} {result['unique']:>10} "
+                  f"{result['lost']:>8} {result['loss_rate']:>10.2f} {result['duplicates']:>7} {result['out_of_order']:>7}")
+    
+    def print_clock_report(self):
+        """So độ trễ một chiều đo được với RTT/2 từ echo (chỉ khi có file đồng hồ)"""
+        if not self.clock:
+            return
+        clock = self.clock
+        rtt = clock['rtt_ms']
+        print(f"\n6. DONG HO (file: {self.clock_file}):")
+        print(f"   Offset server - client: {clock['offset_ns'] / 1e6:+.3f} ms, drift {clock['drift_ppm']:+.2f} ppm "
+              f"({len(clock['points'])} lan do, {rtt['samples']} mau echo)")
+        print(f"   RTT min/trung vi/max: {rtt['min']:.3f} / {rtt['median']:.3f} / {rtt['max']:.3f} ms")
+        metrics = self.calculate_metrics(self.unoptimized_data)
+        if metrics:
+            print(f"   {'Do tre mot chieu (min / trung vi)':<36} {metrics['min_delay']:.3f} / {metrics['median_delay']:.3f} ms")
+            print(f"   {'RTT/2 (min / trung vi)':<36} {rtt['min'] / 2:.3f} / {rtt['median'] / 2:.3f} ms")
+            if metrics['min_delay'] < rtt['min'] / 2 * 0.1:
+                print("   Canh bao: do tre mot chieu nho bat thuong so voi RTT/2 - dong ho co the chua duoc hieu chinh")
+    
+    def print_tuning_report(self):
+        """So sánh hồ sơ tinh chỉnh socket (giá trị kernel thực sự áp dụng) giữa các lần chạy"""
+        if not self.tunings:
+            return
+        labels = list(self.tunings)
+        records = [self.tunings[label] for label in labels]
+        print("\n7. CAU HINH SOCKET (gia tri hieu luc, * = khac nhau giua cac lan chay):")
+        print(f"   {'':<12} " + " ".join(f"{label:>22}" for label in labels))
+        print(f"   {'ho so':<12} " + " ".join(f"{r['name'][-22:]:>22}" for r in records))
+        for option in TUNING_OPTIONS:
+            values = []
+            for r in records:
+                if option in r['errors']:
+                    values.append("loi")
+                else:
+                    value = r['effective'].get(option)
+                    values.append("-" if value is None else str(value))
+            if all(v == "-" for v in values):
+                continue
+            mark = "*" if len(set(values)) > 1 else " "
+            print(f" {mark} {option:<12} " + " ".join(f"{v:>22}" for v in values))
+        for label, r in self.tunings.items():
+            for option, reason in r['errors'].items():
+                print(f"   {label}: {option} khong ap dung duoc ({reason})")
+    
+    def print_loss_attribution(self):
+        """
+        Tách số gói mất theo nơi mất: tràn buffer nhận của kernel (drops của socket / SO_RXQ_OVFL),
+        ứng dụng bỏ (hàng đợi ghi đầy), còn lại là ngoài server (mạng, client, NIC)
+        """
+        if not self.kernel_series:
+            return
+        datasets = {'Chua toi uu': (self.unoptimized_data, self._flows()),
+                    'Da toi uu': (self.optimized_data, None)}
+        print("\n8. NGUYEN NHAN MAT GOI (bo dem kernel cua server):")
+        print(f"   {'Loai':<14} {'Mat':>8} {'Tran buffer':>12} {'Ung dung bo':>12} {'Ngoai server':>13} "
+              f"{'rx_queue dinh':>14} {'RcvbufErr*':>11}")
+        for label, series in self.kernel_series.items():
+            data, flows = datasets[label]
+            sequences = self.analyze_sequence(data, flows) if self._count(data) else None
+            lost = sequences.summary()['lost'] if sequences is not None else 0
+            kernel_drops = int(max(max(series['drops']), max(series['rxq_ovfl'])))
+            app_dropped = int(series['app_dropped'][-1])
+            outside = max(0, lost - kernel_drops - app_dropped)
+            peak = int(max(series['rx_queue']))
+            print(f"   {label:<14} {lost:>8} {kernel_drops:>12} {app_dropped:>12} {outside:>13} "
+                  f"{peak:>14} {int(series['udp_rcvbuf_errors'][-1]):>11}")
+            
+            # Drops tăng ở phần lớn các khoảng có gói đến = vòng nhận chậm hơn tốc độ đến kéo dài;
+            # chỉ vài khoảng = buffer đầy trong burst ngắn
+            if kernel_drops:
+                drops, arrived = series['drops'], series['udp_in']
+                active = [i for i in range(1, len(drops))
+                          if arrived[i] > arrived[i - 1] or drops[i] > drops[i - 1]]
+                dropping = sum(drops[i] > drops[i - 1] for i in active)
+                share = dropping / len(active) * 100 if active else 0
+                if share >= 50:
+                    hint = "vong nhan cham hon toc do den (ung dung cham: batch/workers/bot in)"
+                else:
+                    hint = "buffer day trong burst ngan (tang SO_RCVBUF)"
+                record = self.tunings.get(f"{label} (server)")
+                rcvbuf = record['effective'].get('rcvbuf') if record else None
+                size = f", rcvbuf {rcvbuf} byte" if rcvbuf else ""
+                print(f"   {'':<14} drops tang o {dropping}/{len(active)} khoang co goi den{size}: {hint}")
+        print("   * RcvbufErrors cua /proc/net/snmp tinh cho moi socket UDP tren may, chi de doi chieu")
+    
+    def print_rate_control_report(self):
+        """Tóm tắt quỹ đạo của bộ điều khiển tốc độ (client --adaptive + server --feedback)"""
+        log = self.rate_log
+        if not log:
+            return
+        actions = log['action']
+        feedbacks = [i for i, a in enumerate(actions) if not a.endswith('(het han)')]
+        # Trạng thái ổn định: 30% phản hồi cuối (sau khởi động nhanh và các lần dò đầu tiên)
+        steady = feedbacks[int(len(feedbacks) * 0.7):]
+        
+        def median(values):
+            values = sorted(values)
+            return values[len(values) // 2] if values else 0
+        
+        print("\n9. DIEU KHIEN TOC DO (client --adaptive):")
+        print(f"   {'Thoi gian / so phan hoi':<36} {log['time'][-1]:.1f}s / {len(feedbacks)}")
+        print(f"   {'Toc do muc tieu cao nhat':<36} {max(log['target_rate']):.0f} goi/s")
+        print(f"   {'Server nhan cao nhat (mot khoang)':<36} {max(log['delivered_pps']):.0f} goi/s")
+        if steady:
+            print(f"   {'On dinh - muc tieu (trung vi)':<36} {median(log['target_rate'][i] for i in steady):.0f} goi/s")
+            print(f"   {'On dinh - server nhan (trung vi)':<36} "
+                  f"{median(log['delivered_pps'][i] for i in steady):.0f} goi/s")
+            print(f"   {'On dinh - mat goi TB':<36} "
+                  f"{sum(log['loss_pct'][i] for i in steady) / len(steady):.2f}%")
+            print(f"   {'On dinh - p50 / p99 (trung vi)':<36} {median(log['p50_ms'][i] for i in steady):.3f} / "
+                  f"{median(log['p99_ms'][i] for i in steady):.3f} ms")
+        counts = {}
+        for action in actions:
+            counts[action] = counts.get(action, 0) + 1
+        print("   Hanh dong: " + ", ".join(f"{a} {n}" for a, n in sorted(counts.items(), key=lambda x: -x[1])))
+    
+    def _impairment_profile(self):
+        record = self.impairment
+        return describe_impairment({"name": record['name'], **record['config']})
+    
+    def print_impairment_report(self):
+        """
+        Đối chiếu những gì relay suy giảm mạng đã làm (bỏ, nhân đôi, đảo) với những gì server đo được:
+        mất gói chia theo nơi mất - trước relay, tại relay (có chủ đích), sau relay (relay -> server)
+        """
+        record = self.impairment
+        if not record:
+            return
+        relay_dropped = sum(record['dropped'].values())
+        print(f"\n10. SUY GIAM MANG (relay, file: {self.impairment_file}):")
+        print(f"   Ho so: {self._impairment_profile()}")
+        print(f"   {'Relay nhan / chuyen tiep':<36} {record['received']} / {record['forwarded']} goi")
+        print(f"   {'Relay bo':<36} {relay_dropped} (" +
+              ", ".join(f"{k} {v}" for k, v in record['dropped'].items()) + ")")
+        print(f"   {'Tre phat so voi lich TB / max':<36} {record['release_late_avg_us']} / "
+              f"{record['release_late_max_us']} us")
+        
+        sequences = self.analyze_sequence(self.unoptimized_data, self._flows())
+        if sequences is None:
+            return
+        total = sequences.summary()
+        before = max(0, total['expected'] - record['received'])
+        after = max(0, total['lost'] - before - relay_dropped)
+        print(f"   {'':<14} {'Relay':>10} {'Server do':>10}")
+        print(f"   {'Mat':<14} {relay_dropped:>10} {total['lost']:>10}")
+        print(f"   {'Trung':<14} {record['duplicated']:>10} {total['duplicates']:>10}")
+        print(f"   {'Dao thu tu':<14} {record['reordered']:>10} {total['out_of_order']:>10}")
+        print(f"   Mat theo noi mat: truoc relay {before}, tai relay {relay_dropped}, sau relay {after}")
+        if after > relay_dropped * 0.1 and after > 10:
+            print("   Mat sau relay dang ke: server khong kip nhan cac dot goi relay nha ra "
+                  "(tang SO_RCVBUF, xem muc 8 voi --kernel-stats)")
+    
+    def tail(self, interval=TAIL_INTERVAL):
+        """
+        Theo dõi file chưa tối ưu trong lúc server đang ghi: mỗi `interval` giây chỉ đọc phần
+        mới ghi thêm (IncrementalSummary) và in một dòng metrics. Ctrl+C để dừng.
+        """
+        path = self.unoptimized_file
+        self._load_manifest()
+        tracker = IncrementalSummary(path, self.chunk_rows, self._flows(), self.cache)
+        print(f"\n=== THEO DOI {path} (moi {interval:g}s, Ctrl+C de dung) ===")
+        last = None     # lần cập nhật trước; lần đầu đọc phần đã có sẵn nên không tính tốc độ
+        try:
+            while True:
+                if not os.path.exists(path):
+                    time.sleep(interval)
+                    continue
+                new = tracker.refresh()
+                now = time.monotonic()
+                metrics = tracker.summary.metrics()
+                if metrics:
+                    loss = tracker.summary.loss_rate()
+                    rate = f"{new / (now - last):.0f} goi/s" if last is not None else "ban dau"
+                    print(f"[{datetime.now():%H:%M:%S}] {metrics['total_packets']} goi (+{new}, "
+                          f"{rate}) | tb {metrics['avg_delay']:.3f} "
+                          f"p50 {metrics['median_delay']:.3f} p99 {metrics['percentile_99']:.3f} ms | "
+                          f"jitter {metrics['avg_jitter']:.3f} ms | mat "
+                          f"{'N/A' if loss is None else f'{loss:.2f}%'}")
+                last = now
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\nDung theo doi.")
+        finally:
+            if self.cache:
+                tracker.save_cache()
+    
+    def watch_shm(self, name=SHM_NAME, interval=TAIL_INTERVAL):
+        """
+        Đọc trực tiếp kênh shared memory của server --shm: mỗi `interval` giây lấy snapshot bộ đếm
+        và các gói mới trong vòng (không đọc file, không parse, không chặn server). Dừng khi server
+        dừng hoặc Ctrl+C, in tổng kết các gói đã đọc.
+        """
+        try:
+            reader = MetricsReader(name)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Khong gan duoc kenh shared memory '{name}': {e} (server co chay voi --shm khong?)")
+            return
+        print(f"\n=== KENH SHARED MEMORY '{name}' (vong {reader.capacity} goi, moi {interval:g}s, Ctrl+C de dung) ===")
+        total = HdrHistogram()
+        since = reader.oldest()
+        last = None     # (snapshot, monotonic) lần trước
+        try:
+            while True:
+                running = reader.running
+                records, since = reader.read(since)
+                snapshot = reader.snapshot()
+                now = time.monotonic()
+                ids, delays = ((records['packet_id'], records['delay_ns']) if HAS_NUMPY
+                               else ([r[0] for r in records], [r[3] for r in records]))
+                window = HdrHistogram()
+                if HAS_NUMPY:
+                    window.record_array(delays)
+                    jitter = float(np.abs(np.diff(delays)).mean()) if len(delays) > 1 else 0.0
+                    reordered = int((np.diff(ids.astype(np.int64)) < 0).sum())
+                else:
+                    for delay in delays:
+                        window.record(delay)
+                    jitter = (sum(abs(b - a) for a, b in zip(delays, delays[1:])) / (len(delays) - 1)
+                              if len(delays) > 1 else 0.0)
+                    reordered = sum(1 for a, b in zip(ids, ids[1:]) if b < a)
+                if window.count:
+                    total.merge(window)
+                if snapshot is not None:
+                    rate = (f"{(snapshot['received'] - last[0]['received']) / (now - last[1]):.0f} goi/s"
+                            if last is not None and now > last[1] else "ban dau")
+                    line = f"[{datetime.now():%H:%M:%S}] {snapshot['received']} goi ({rate})"
+                    if window.count:
+                        p50, p99 = window.values_at_quantiles((0.5, 0.99))
+                        line += (f" | p50 {p50 / 1e6:.3f} p99 {p99 / 1e6:.3f} max {window.max / 1e6:.3f} ms"
+                                 f" | jitter {jitter / 1e6:.3f} ms | dao thu tu {reordered}")
+                    line += (f" | hang doi ghi {snapshot['writer_queue']}, bo {snapshot['writer_dropped']}"
+                             f" | kernel bo {snapshot['rxq_ovfl']}")
+                    if snapshot['errors'] or snapshot['truncated']:
+                        line += f" | loi parse {snapshot['errors']}, cat cut {snapshot['truncated']}"
+                    print(line)
+                    last = (snapshot, now)
+                if not running:
+                    print("Server da dung.")
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            print("\nDung theo doi.")
+        finally:
+            reader.close()
+        if total.count:
+            p50, p99, p999 = total.values_at_quantiles((0.5, 0.99, 0.999))
+            print(f"Tong ket {total.count} goi doc tu kenh (lo {reader.missed} goi do doc cham hon server): "
+                  f"tb {total.mean / 1e6:.3f} p50 {p50 / 1e6:.3f} p99 {p99 / 1e6:.3f} p99.9 {p999 / 1e6:.3f} "
+                  f"max {total.max / 1e6:.3f} ms")
+    
     def print_comparison_report(self):
         """In báo cáo so sánh"""
         print("\n" + "="*60)
@@ -154,9 +574,9 @@ class UDPOptimizerAnalyzer:
         unopt_loss, opt_loss = self.calculate_packet_loss()
         
         print(f"\n1. TONG QUAN:")
-        print(f"   - Du lieu chua toi uu: {len(self.unoptimized_data)} goi tin")
+        print(f"   - Du lieu chua toi uu: {self._count(self.unoptimized_data)} goi tin")
         if self.has_optimized_data:
-            print(f"   - Du lieu da toi uu: {len(self.optimized_data)} goi tin")
+            print(f"   - Du lieu da toi uu: {self._count(self.optimized_data)} goi tin")
             print(f"   - Che do: SO SANH TRUOC/SAU TOI UU")
         else:
             print(f"   - Che do: CHI PHAN TICH DU LIEU HIEN TAI")
@@ -214,11 +634,13 @@ class UDPOptimizerAnalyzer:
         
         print(f"\n4. PACKET LOSS:")
         print(f"   {'Loai':<20} {'Ti le mat goi (%)':<20}")
-        print(f"   {'Chua toi uu':<20} {unopt_loss:<20.2f}")
+        print(f"   {'Chua toi uu':<20} {self._format_loss(unopt_loss):<20}")
         if self.has_optimized_data:
-            print(f"   {'Da toi uu':<20} {opt_loss:<20.2f}")
-            improvement = unopt_loss - opt_loss
-            print(f"   {'Cai thien':<20} {improvement:>+7.2f}%")
+            print(f"   {'Da toi uu':<20} {self._format_loss(opt_loss):<20}")
+            if unopt_loss is None or opt_loss is None:
+                print(f"   {'Cai thien':<20} {'N/A':>7}")
+            else:
+                print(f"   {'Cai thien':<20} {unopt_loss - opt_loss:>+7.2f}%")
         
         print("\n" + "="*60)
     
@@ -229,10 +651,10 @@ class UDPOptimizerAnalyzer:
             return False
             
         # Chuẩn bị dữ liệu
-        unopt_delays = [p['delay_ms'] for p in self.unoptimized_data]
+        unopt_delays = self.unoptimized_data['delay_ms']
         
         if self.has_optimized_data:
-            opt_delays = [p['delay_ms'] for p in self.optimized_data]
+            opt_delays = self.optimized_data['delay_ms']
             # Tạo biểu đồ so sánh 2x2 với kích thước lớn hơn
             fig, ((ax1, ax2), (ax3, ax4)) = plt.subplots(2, 2, figsize=(16, 12))
             fig.suptitle('So Sanh Hieu Suat UDP: Truoc va Sau Toi Uu\n(Anh Huong cua Kich Thuoc Goi va Toc Do Gui)', 
@@ -344,33 +766,69 @@ class UDPOptimizerAnalyzer:
         plt.show()
         return True
     
+    def create_fast_charts(self, dpi=CHART_DPI):
+        """
+        Biểu đồ nhanh cho dữ liệu lớn (fast_charts): giảm mẫu min/max, histogram/phân vị tính sẵn,
+        canvas Agg không cần màn hình, không plt.show(). Chạy được cả ở chế độ --stream.
+        """
+        if not HAS_NUMPY:
+            print("Can NumPy de ve bieu do nhanh")
+            return False
+        series = []
+        for label, data, present in (("Client Chua Toi Uu", self.unoptimized_data, True),
+                                     ("Client Da Toi Uu", self.optimized_data, self.has_optimized_data)):
+            if not present:
+                continue
+            values = data if isinstance(data, StreamingSummary) else np.asarray(data['delay_ms'])
+            series.append((label, values, self.calculate_metrics(data)))
+        
+        started = time.perf_counter()
+        output_file = render_comparison(series, "udp_delay_comparison.png",
+                                        'So Sanh Hieu Suat UDP: Truoc va Sau Toi Uu', dpi)
+        print(f"Da luu bieu do so sanh: {output_file} ({time.perf_counter() - started:.2f}s)")
+        return True
+    
+    def create_rate_chart(self, dpi=CHART_DPI):
+        """Biểu đồ quỹ đạo tốc độ / độ trễ của client --adaptive (nếu có --rate-log)"""
+        if not self.rate_log or not HAS_NUMPY or not HAS_MATPLOTLIB:
+            return False
+        output_file = render_rate_log(self.rate_log, "udp_rate_control.png", dpi)
+        print(f"Da luu bieu do dieu khien toc do: {output_file}")
+        return True
+    
     def create_simple_charts(self):
         """Tạo biểu đồ ASCII đơn giản"""
         print("\n=== BIEU DO ASCII ===")
         
-        unopt_delays = [p['delay_ms'] for p in self.unoptimized_data]
+        unopt_delays = self.unoptimized_data['delay_ms']
         
         print("\nPhan bo delay (histogram ASCII):")
         self._print_ascii_histogram(unopt_delays, "Before Optimization", "blue")
         
         if self.has_optimized_data:
-            opt_delays = [p['delay_ms'] for p in self.optimized_data]
+            opt_delays = self.optimized_data['delay_ms']
             print("\nPhan bo delay sau toi uu:")
             self._print_ascii_histogram(opt_delays, "After Optimization", "red")
     
     def _print_ascii_histogram(self, data, title, color):
         """In histogram ASCII"""
-        if not data:
+        # data có thể là list hoặc mảng numpy / memmap (không dùng `not data` với mảng)
+        if len(data) == 0:
             return
             
         # Chia thành 20 bins
-        min_val, max_val = min(data), max(data)
+        if HAS_NUMPY:
+            data = np.asarray(data)
+            min_val, max_val = float(data.min()), float(data.max())
+            bins = np.histogram(data, 20, range=(min_val, max_val))[0].tolist()
+        else:
+            min_val, max_val = min(data), max(data)
+            bins = [0] * 20
+            width = (max_val - min_val) / 20 or 1
+            for value in data:
+                bin_idx = min(int((value - min_val) / width), 19)
+                bins[bin_idx] += 1
         bin_width = (max_val - min_val) / 20
-        bins = [0] * 20
-        
-        for value in data:
-            bin_idx = min(int((value - min_val) / bin_width), 19)
-            bins[bin_idx] += 1
         
         max_count = max(bins)
         scale = 50 / max_count if max_count > 0 else 1
@@ -418,6 +876,17 @@ class UDPOptimizerAnalyzer:
                 jitter_improvement = ((unopt_metrics['avg_jitter'] - opt_metrics['avg_jitter']) / unopt_metrics['avg_jitter']) * 100
                 f.write(f"Delay improvement: {delay_improvement:.1f}%\n")
                 f.write(f"Jitter improvement: {jitter_improvement:.1f}%\n")
+            
+            if self.tunings:
+                f.write(f"\nSOCKET TUNING (effective values):\n")
+                for label, r in self.tunings.items():
+                    values = ", ".join(f"{k}={v}" for k, v in r['effective'].items())
+                    f.write(f"{label}: {r['name']} - {values}\n")
+            
+            if self.impairment:
+                f.write(f"\nNETWORK IMPAIRMENT (relay): {self._impairment_profile()}\n")
+                f.write(f"Relay received/forwarded/dropped: {self.impairment['received']}/"
+                        f"{self.impairment['forwarded']}/{sum(self.impairment['dropped'].values())}\n")
         
         print(f"Da tao bao cao: {report_file}")
         
@@ -457,8 +926,63 @@ def main():
     print("Data Analysis Team")
     print("="*50)
     
+    # Có thể truyền đường dẫn file .csv hoặc thư mục .col
+    # VD: python analyze_results.py ../Data/results.col ../Data/results_optimized.col --stream
+    # Nhiều lần chạy: python analyze_results.py --runs 'sweep/*' --jobs 8
+    parser = argparse.ArgumentParser(description="Phan tich hieu suat UDP truoc/sau toi uu")
+    parser.add_argument("unoptimized_file", nargs="?", default="../Data/results.csv")
+    parser.add_argument("optimized_file", nargs="?", default="../Data/results_optimized.csv")
+    parser.add_argument("--stream", action="store_true",
+                        help="doc theo khoi, thong ke online voi bo nho khong doi (file rat lon)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS,
+                        help="so dong moi khoi o che do --stream")
+    parser.add_argument("--clock",
+                        help="clock_sync.json cua client --sync: in offset/drift/RTT va so voi do tre mot chieu")
+    parser.add_argument("--manifest",
+                        help="manifest cua load_generator.py: tinh mat goi that theo flow cho file chua toi uu")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="--stream: khong dung/ghi tom tat <file>.summary.pkl (doc lai toan bo file)")
+    parser.add_argument("--tail", type=float, nargs="?", const=TAIL_INTERVAL, metavar="GIAY",
+                        help=f"theo doi file dang duoc ghi, in metrics moi GIAY (mac dinh {TAIL_INTERVAL:g}s) "
+                             f"chi doc phan moi; Ctrl+C -> bao cao day du (ngu y --stream)")
+    parser.add_argument("--shm", nargs="?", const=SHM_NAME, metavar="TEN",
+                        help=f"doc truc tiep kenh shared memory cua server --shm (mac dinh {SHM_NAME}) moi --tail "
+                             f"GIAY thay vi doc file; dung khi server dung hoac Ctrl+C")
+    parser.add_argument("--runs", nargs="+", metavar="MAU",
+                        help="so sanh nhieu lan chay thay cho cap truoc/sau: mau glob (file .csv/.col hoac thu muc "
+                             "run chua data/results.csv + manifest.json) hoac file danh sach .json")
+    parser.add_argument("--jobs", type=int, help="--runs: so tien trinh tom tat song song (mac dinh: so CPU)")
+    parser.add_argument("--sort", choices=["score", *RANK_KEYS], default="score",
+                        help="--runs: tieu chi xep hang (score = trung binh thu hang)")
+    parser.add_argument("--runs-csv", default="runs_comparison.csv", help="--runs: file CSV bang xep hang")
+    parser.add_argument("--fast-charts", action="store_true",
+                        help="bieu do nhanh cho du lieu lon: giam mau min/max, histogram/phan vi tinh san, "
+                             "khong can man hinh, khong plt.show() (chay duoc ca voi --stream)")
+    parser.add_argument("--dpi", type=int, default=CHART_DPI, help=f"--fast-charts: do phan giai (mac dinh {CHART_DPI})")
+    parser.add_argument("--rate-log",
+                        help="rate_log.csv cua client --adaptive: bao cao va bieu do quy dao toc do / do tre")
+    parser.add_argument("--impairment",
+                        help="impairment.json cua Server/impairment_relay.py --record: doi chieu relay voi so do")
+    parser.add_argument("--charts-dir", help="--runs: ve bieu do nhanh cho tung run (song song) vao thu muc nay")
+    args = parser.parse_args()
+    
+    if args.runs:
+        compare_runs(args.runs, jobs=args.jobs, chunk_rows=args.chunk_rows, cache=not args.no_cache,
+                     sort_key=args.sort, out_csv=args.runs_csv, charts_dir=args.charts_dir, dpi=args.dpi)
+        return
+    
     # Khởi tạo analyzer
-    analyzer = UDPOptimizerAnalyzer()
+    analyzer = UDPOptimizerAnalyzer(args.unoptimized_file, args.optimized_file,
+                                    streaming=args.stream or args.tail is not None, chunk_rows=args.chunk_rows,
+                                    manifest_file=args.manifest, clock_file=args.clock, cache=not args.no_cache,
+                                    rate_log_file=args.rate_log, impairment_file=args.impairment)
+    
+    if args.shm:
+        analyzer.watch_shm(args.shm, args.tail or TAIL_INTERVAL)
+        return
+    
+    if args.tail is not None:
+        analyzer.tail(args.tail)
     
     # Tải dữ liệu
     if not analyzer.load_data():
@@ -467,14 +991,27 @@ def main():
     
     # In báo cáo so sánh
     analyzer.print_comparison_report()
+    analyzer.print_sequence_report()
+    analyzer.print_clock_report()
+    analyzer.print_tuning_report()
+    analyzer.print_loss_attribution()
+    analyzer.print_rate_control_report()
+    analyzer.print_impairment_report()
     
     # Tạo biểu đồ
-    if HAS_MATPLOTLIB:
+    if args.fast_charts and HAS_MATPLOTLIB:
+        print("\nTao bieu do nhanh...")
+        analyzer.create_fast_charts(args.dpi)
+    elif analyzer.streaming:
+        print("\nChe do streaming: bo qua bieu do (khong giu du lieu tho)")
+    elif HAS_MATPLOTLIB:
         print("\nTao bieu do matplotlib...")
         analyzer.create_matplotlib_charts()
     else:
         print("\nTao bieu do ASCII...")
         analyzer.create_simple_charts()
+    if args.rate_log and HAS_MATPLOTLIB:
+        analyzer.create_rate_chart(args.dpi)
     
     # Tạo báo cáo files
     analyzer.generate_reports()
@@ -0,0 +1,224 @@
+"""
+Fast Charts
+Ve bieu do nhanh cho du lieu lon (hang trieu goi): khong ve tung diem tho
+- chuoi thoi gian: giam mau min/max theo tung cot diem anh (giu nguyen dinh/day)
+- histogram, boxplot: tinh san tren mang (np.histogram, np.quantile) hoac tu HDR histogram (--stream)
+- Figure + canvas Agg truc tiep (khong qua pyplot): khong can man hinh, khong plt.show(),
+  ve duoc song song nhieu run trong process pool
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+try:
+    from matplotlib.figure import Figure
+    HAS_MATPLOTLIB = True
+except ImportError:
+    HAS_MATPLOTLIB = False
+
+from metrics_engine import compute_metrics
+from streaming import NS_PER_MS, StreamingSummary, iter_chunks
+
+CHART_DPI = 100            # đủ nét cho màn hình; bản gốc dùng 300 (gấp 9 lần số điểm ảnh)
+PIXEL_WIDTH = 1600         # số cột điểm ảnh của panel chuỗi thời gian = số bucket giảm mẫu
+HIST_BINS = 100
+BOX_QUANTILES = (0.25, 0.5, 0.75)
+
+# (màu đường, màu nền, màu viền) theo thứ tự các chuỗi
+PALETTE = [('b', 'lightblue', 'darkblue'), ('r', 'lightcoral', 'darkred'),
+           ('g', 'lightgreen', 'darkgreen'), ('m', 'plum', 'purple')]
+
+
+def minmax_downsample(values, buckets=PIXEL_WIDTH):
+    """
+    Giảm mẫu giữ min/max: chia chuỗi thành `buckets` đoạn liên tiếp, mỗi đoạn giữ điểm nhỏ nhất
+    và lớn nhất (theo thứ tự chỉ số) -> đường vẽ ra có cùng đường bao với dữ liệu gốc.
+    Trả về (chỉ số, giá trị); chuỗi ngắn hơn 2 * buckets giữ nguyên.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    n = y.size
+    if n <= 2 * buckets:
+        return np.arange(n), y
+    size = n // buckets
+    body = y[:size * buckets].reshape(buckets, size)
+    base = np.arange(buckets) * size
+    picks = [body.argmin(axis=1) + base, body.argmax(axis=1) + base]
+    if n > size * buckets:
+        tail = y[size * buckets:]
+        picks.append(np.array([tail.argmin(), tail.argmax()]) + size * buckets)
+    index = np.unique(np.concatenate(picks))
+    return index, y[index]
+
+
+def delay_histogram(data, edges):
+    """Mật độ theo các khoảng `edges` (ms) từ mảng độ trễ hoặc từ HDR histogram của StreamingSummary"""
+    if isinstance(data, StreamingSummary):
+        buckets = np.array(list(data.histogram.buckets()), dtype=np.float64).reshape(-1, 3)
+        mids = (buckets[:, 0] + buckets[:, 1]) / 2 / NS_PER_MS
+        density, _ = np.histogram(mids, bins=edges, weights=buckets[:, 2], density=True)
+    else:
+        density, _ = np.histogram(data, bins=edges, density=True)
+    return density
+
+
+def box_stats(data, label):
+    """Thống kê cho Axes.bxp (không giữ mẫu ngoại lai): râu = 1.5 IQR, kẹp trong [min, max]"""
+    if isinstance(data, StreamingSummary):
+        q1, median, q3 = (v / NS_PER_MS for v in data.histogram.values_at_quantiles(BOX_QUANTILES))
+        low, high = data.min_delay, data.max_delay
+    else:
+        q1, median, q3 = np.quantile(data, BOX_QUANTILES)
+        low, high = float(data.min()), float(data.max())
+    iqr = q3 - q1
+    return {'label': label, 'med': median, 'q1': q1, 'q3': q3,
+            'whislo': max(low, q1 - 1.5 * iqr), 'whishi': min(high, q3 + 1.5 * iqr),
+            'fliers': [], 'low': low, 'high': high}
+
+
+def render_comparison(series, output_file, title, dpi=CHART_DPI):
+    """
+    Vẽ biểu đồ 2x2 cho một hoặc nhiều chuỗi.
+    series: list (nhãn, dữ liệu, metrics) - dữ liệu là mảng delay_ms hoặc StreamingSummary.
+    """
+    fig = Figure(figsize=(16, 12))
+    (ax1, ax2), (ax3, ax4) = fig.subplots(2, 2)
+    fig.suptitle(title, fontsize=18, fontweight='bold', y=0.98)
+
+    # 1. Chuỗi thời gian đã giảm mẫu (toàn bộ các gói, không chỉ 1000 gói đầu)
+    raw = [(label, data) for label, data, _ in series if not isinstance(data, StreamingSummary)]
+    for i, (label, data) in enumerate(raw):
+        x, y = minmax_downsample(data)
+        ax1.plot(x, y, PALETTE[i % len(PALETTE)][0] + '-', linewidth=0.8, alpha=0.8,
+                 label=f'{label} ({len(data)} goi, {len(x)} diem ve)')
+    if raw:
+        ax1.legend(fontsize=10, loc='upper right')
+    else:
+        ax1.text(0.5, 0.5, 'Che do streaming: khong giu chuoi thoi gian',
+                 ha='center', va='center', transform=ax1.transAxes, fontsize=12)
+    ax1.set_title('Do Tre Theo Thoi Gian\n(giam mau min/max theo diem anh)', fontsize=14, fontweight='bold')
+    ax1.set_xlabel('So Thu Tu Goi Tin', fontsize=12)
+    ax1.set_ylabel('Do Tre (ms)', fontsize=12)
+    ax1.grid(True, alpha=0.3)
+
+    # 2. Histogram tính sẵn, vẽ bằng stairs (1 artist thay vì hàng trăm patch)
+    max_delay = max(m['max_delay'] for _, _, m in series)
+    edges = np.linspace(0, max_delay, HIST_BINS + 1)
+    for i, (label, data, _) in enumerate(series):
+        _, face, edge = PALETTE[i % len(PALETTE)]
+        ax2.stairs(delay_histogram(data, edges), edges, fill=True, alpha=0.6, color=face,
+                   edgecolor=edge, label=label)
+    ax2.set_title('Phan Bo Do Tre\n(So sanh hieu suat tong the)', fontsize=14, fontweight='bold')
+    ax2.set_xlabel('Do Tre (ms)', fontsize=12)
+    ax2.set_ylabel('Mat Do Xac Suat', fontsize=12)
+    ax2.legend(fontsize=11)
+    ax2.grid(True, alpha=0.3)
+
+    # 3. Boxplot từ phân vị tính sẵn; min/max đánh dấu riêng thay cho hàng triệu điểm ngoại lai
+    stats = [box_stats(data, label.replace(' ', '\n', 1)) for label, data, _ in series]
+    bp = ax3.bxp(stats, patch_artist=True, widths=0.6, showfliers=False)
+    for i, box in enumerate(bp['boxes']):
+        _, face, edge = PALETTE[i % len(PALETTE)]
+        box.set_facecolor(face)
+        box.set_edgecolor(edge)
+    positions = range(1, len(stats) + 1)
+    ax3.scatter(positions, [s['low'] for s in stats], marker='v', color='gray', zorder=3, label='min/max')
+    ax3.scatter(positions, [s['high'] for s in stats], marker='^', color='gray', zorder=3)
+    ax3.set_title('Thong Ke Tom Tat\n(Q1, Median, Q3, rau 1.5 IQR, min/max)', fontsize=14, fontweight='bold')
+    ax3.set_ylabel('Do Tre (ms)', fontsize=12)
+    ax3.legend(fontsize=10)
+    ax3.grid(True, alpha=0.3)
+
+    # 4. Các metrics chính
+    metrics_names = ['Delay TB', 'Delay Max', 'P95', 'Jitter TB']
+    keys = ['avg_delay', 'max_delay', 'percentile_95', 'avg_jitter']
+    x = np.arange(len(metrics_names))
+    width = 0.8 / len(series)
+    for i, (label, _, metrics) in enumerate(series):
+        _, face, edge = PALETTE[i % len(PALETTE)]
+        bars = ax4.bar(x + (i - (len(series) - 1) / 2) * width, [metrics[k] for k in keys], width,
+                       label=label, color=face, edgecolor=edge, linewidth=1.5)
+        ax4.bar_label(bars, fmt='%.1f', padding=3, fontsize=10, fontweight='bold')
+    ax4.set_title('So Sanh Metrics Chinh', fontsize=14, fontweight='bold')
+    ax4.set_xlabel('Cac Chi So', fontsize=12)
+    ax4.set_ylabel('Gia Tri (ms)', fontsize=12)
+    ax4.set_xticks(x)
+    ax4.set_xticklabels(metrics_names, fontsize=11)
+    ax4.legend(fontsize=11)
+    ax4.grid(True, alpha=0.3)
+
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=dpi)
+    return output_file
+
+
+def render_rate_log(log, output_file, dpi=CHART_DPI):
+    """
+    Quỹ đạo của client --adaptive (rate_log.load_rate_log): thông lượng và độ trễ theo thời gian,
+    các lần giảm tốc độ đánh dấu bằng đường dọc.
+    """
+    t = np.asarray(log['time'])
+    fig = Figure(figsize=(16, 10))
+    ax1, ax2 = fig.subplots(2, 1, sharex=True)
+    fig.suptitle('Dieu Khien Toc Do Vong Kin', fontsize=18, fontweight='bold', y=0.98)
+
+    ax1.step(t, log['target_rate'], 'k-', where='post', linewidth=1.2, label='muc tieu')
+    ax1.plot(t, log['sent_pps'], 'b-', linewidth=0.8, alpha=0.8, label='client gui')
+    ax1.plot(t, log['delivered_pps'], 'g-', linewidth=0.8, alpha=0.8, label='server nhan')
+    ax1.set_title('Thong Luong', fontsize=14, fontweight='bold')
+    ax1.set_ylabel('Goi/s', fontsize=12)
+
+    ax2.plot(t, log['p50_ms'], 'b-', linewidth=0.8, label='p50')
+    ax2.plot(t, log['p99_ms'], 'r-', linewidth=0.8, alpha=0.8, label='p99')
+    ax2.plot(t, log['queue_ms'], 'm-', linewidth=0.8, alpha=0.8, label='hang doi (p50 - nen)')
+    ax2.set_title('Do Tre Moi Khoang Phan Hoi', fontsize=14, fontweight='bold')
+    ax2.set_xlabel('Thoi Gian (s)', fontsize=12)
+    ax2.set_ylabel('Do Tre (ms)', fontsize=12)
+
+    for when, action in zip(t, log['action']):
+        if action.startswith('giam'):
+            ax1.axvline(when, color='red', alpha=0.25, linewidth=0.8)
+            ax2.axvline(when, color='red', alpha=0.25, linewidth=0.8)
+    for ax in (ax1, ax2):
+        ax.legend(fontsize=10, loc='upper right')
+        ax.grid(True, alpha=0.3)
+
+    fig.tight_layout()
+    fig.savefig(output_file, dpi=dpi)
+    return output_file
+
+
+def _load_delays(path):
+    """Toàn bộ cột delay_ms của một file kết quả (đọc theo khối) -> mảng float64"""
+    chunks = [np.asarray(delays, dtype=np.float64) for _, delays in iter_chunks(path)]
+    return np.concatenate(chunks) if chunks else np.empty(0)
+
+
+def render_run(name, path, output_file, dpi=CHART_DPI):
+    """Biểu đồ của một run (chạy được trong tiến trình con); trả về đường dẫn PNG, None nếu rỗng"""
+    delays = _load_delays(path)
+    if not delays.size:
+        return None
+    return render_comparison([(name, delays, compute_metrics(delays))], output_file,
+                             f'Hieu Suat UDP: {name}', dpi)
+
+
+def render_runs(runs, out_dir, jobs=None, dpi=CHART_DPI):
+    """
+    Vẽ biểu đồ cho nhiều run song song (jobs tiến trình, mặc định = số CPU).
+    runs: list dict có 'name' và 'path' (như multi_run.discover_runs). Trả về list đường dẫn PNG.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    names = [run['name'] for run in runs]
+    paths = [run['path'] for run in runs]
+    outputs = [os.path.join(out_dir, name.replace(os.sep, '_') + '.png') for name in names]
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(runs)))
+    if jobs == 1:
+        return [render_run(*args, dpi) for args in zip(names, paths, outputs)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(render_run, names, paths, outputs, [dpi] * len(runs)))
@@ -0,0 +1,93 @@
+"""
+Metrics Engine
+Tinh cac chi so delay/jitter tren mang float64 lien tuc bang NumPy
+"""
+
+import math
+import statistics
+
+# Các phân vị cần tính (phân vị 50 = trung vị)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def _select_quantiles(delays, quantiles):
+    """
+    Lấy min, max và các phân vị (nội suy tuyến tính như np.percentile)
+    bằng MỘT lần np.partition trên tất cả chỉ số cần thiết thay vì sort nhiều lần
+    """
+    import numpy as np
+
+    n = delays.size
+    positions = [q * (n - 1) for q in quantiles]
+    kth = {0, n - 1}
+    for pos in positions:
+        kth.add(math.floor(pos))
+        kth.add(math.ceil(pos))
+    part = np.partition(delays, sorted(kth))
+
+    values = []
+    for pos in positions:
+        lo, hi = math.floor(pos), math.ceil(pos)
+        values.append(float(part[lo] + (part[hi] - part[lo]) * (pos - lo)))
+    return float(part[0]), float(part[n - 1]), values
+
+
+def compute_metrics(delays):
+    """Tính metrics vector hóa; kết quả cùng khóa với UDPOptimizerAnalyzer.calculate_metrics"""
+    import numpy as np
+
+    d = np.ascontiguousarray(delays, dtype=np.float64)
+    n = d.size
+
+    # Moment: tổng -> trung bình, rồi tích vô hướng của phần lệch -> phương sai (ddof=1)
+    mean = float(d.sum()) / n
+    if n > 1:
+        centered = d - mean
+        std = math.sqrt(float(np.dot(centered, centered)) / (n - 1))
+    else:
+        std = 0
+
+    min_delay, max_delay, (median, p95, p99) = _select_quantiles(d, QUANTILES)
+
+    # Jitter = |delay[i] - delay[i-1]|
+    if n > 1:
+        jitter = np.abs(np.diff(d))
+        avg_jitter = float(jitter.mean())
+        max_jitter = float(jitter.max())
+    else:
+        avg_jitter = max_jitter = 0
+
+    return {
+        'total_packets': n,
+        'avg_delay': mean,
+        'min_delay': min_delay,
+        'max_delay': max_delay,
+        'median_delay': median,
+        'std_delay': std,
+        'percentile_95': p95,
+        'percentile_99': p99,
+        'avg_jitter': avg_jitter,
+        'max_jitter': max_jitter
+    }
+
+
+def compute_metrics_python(delays):
+    """Bản thuần Python (dùng khi không có NumPy, và làm mốc so sánh trong benchmark)"""
+    jitter_values = []
+    for i in range(1, len(delays)):
+        jitter = abs(delays[i] - delays[i-1])
+        jitter_values.append(jitter)
+
+    ordered = sorted(delays)
+    return {
+        'total_packets': len(delays),
+        'avg_delay': statistics.mean(delays),
+        'min_delay': min(delays),
+        'max_delay': max(delays),
+        'median_delay': statistics.median(delays),
+        'std_delay': statistics.stdev(delays) if len(delays) > 1 else 0,
+        'percentile_95': ordered[int(0.95 * len(delays))],
+        'percentile_99': ordered[int(0.99 * len(delays))],
+        'avg_jitter': statistics.mean(jitter_values) if jitter_values else 0,
+        'max_jitter': max(jitter_values) if jitter_values else 0
+    }
@@ -0,0 +1,249 @@
+"""
+Multi-run Comparison
+So sanh nhieu lan chay (VD mot dot quet tinh chinh) thay vi cap truoc/sau co dinh:
+tom tat song song bang process pool, xep hang theo delay tb/p99, jitter, mat goi
+"""
+
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from impairment import RECORD_FILE as IMPAIRMENT_FILE, load_record as load_impairment_record
+from manifest import read_manifest
+from result_store import EXTENSION
+from socket_tuning import load_record as load_tuning_record
+from fast_charts import CHART_DPI, HAS_MATPLOTLIB, HAS_NUMPY, render_runs
+from streaming import CHUNK_ROWS, IncrementalSummary
+
+# File kết quả / manifest tìm trong thư mục của một run (bố cục của bench_e2e.py --keep)
+RUN_RESULTS = ("data/results.csv", "data/results" + EXTENSION, "results.csv", "results" + EXTENSION)
+RUN_MANIFEST = ("manifest.json", "load_manifest.json")
+RUN_IMPAIRMENT = (IMPAIRMENT_FILE,)     # bản ghi của relay giả lập mạng (bench_e2e.py --impairments)
+
+# Tiêu chí xếp hạng (nhỏ hơn là tốt hơn): khóa trong dòng -> tên cột
+RANK_KEYS = {
+    'avg_delay_ms': 'tb',
+    'p99_ms': 'p99',
+    'avg_jitter_ms': 'jitter',
+    'loss_pct': 'mat',
+}
+FIELDS = ['rank', 'score', 'name', 'packets', 'avg_delay_ms', 'p50_ms', 'p99_ms', 'max_delay_ms',
+          'avg_jitter_ms', 'loss_pct', 'duplicates', 'out_of_order', 'tuning', 'rcvbuf_eff', 'impairment',
+          'seconds', 'cached', 'path', 'error']
+
+
+def _first_existing(directory, names):
+    for name in names:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _run_from_path(path):
+    """Đường dẫn file kết quả hoặc thư mục run -> dict run, None nếu không có file kết quả"""
+    if os.path.isdir(path) and not path.rstrip('/\\').endswith(EXTENSION):
+        results = _first_existing(path, RUN_RESULTS)
+        if results is None:
+            return None
+        return {'name': os.path.basename(path.rstrip('/\\')), 'path': results,
+                'manifest': _first_existing(path, RUN_MANIFEST),
+                'impairment': _first_existing(path, RUN_IMPAIRMENT)}
+    if not os.path.exists(path):
+        return None
+    # <run>/data/results.csv -> tên run là <run>, manifest của run nếu có
+    parent = os.path.dirname(os.path.abspath(path))
+    if os.path.basename(parent) == 'data':
+        run_dir = os.path.dirname(parent)
+        return {'name': os.path.basename(run_dir), 'path': path, 'manifest': _first_existing(run_dir, RUN_MANIFEST),
+                'impairment': _first_existing(run_dir, RUN_IMPAIRMENT)}
+    return {'name': os.path.basename(path.rstrip('/\\')), 'path': path, 'manifest': None}
+
+
+def _runs_from_list(list_path):
+    """
+    File JSON liệt kê các run: [đường dẫn, ...] hoặc {"runs": [{"name", "results", "manifest", "impairment"}, ...]}
+    Đường dẫn tương đối tính từ thư mục chứa file.
+    """
+    with open(list_path, encoding='utf-8') as f:
+        entries = json.load(f)
+    if isinstance(entries, dict):
+        entries = entries['runs']
+    base = os.path.dirname(os.path.abspath(list_path))
+    runs = []
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {'results': entry}
+        run = _run_from_path(os.path.join(base, entry['results']))
+        if run is None:
+            print(f"Bo qua {entry['results']}: khong tim thay file ket qua")
+            continue
+        if entry.get('manifest'):
+            run['manifest'] = os.path.join(base, entry['manifest'])
+        if entry.get('impairment'):
+            run['impairment'] = os.path.join(base, entry['impairment'])
+        run['name'] = entry.get('name', run['name'])
+        runs.append(run)
+    return runs
+
+
+def discover_runs(specs):
+    """
+    Danh sách run từ các mẫu glob (file kết quả .csv/.col hoặc thư mục run) và file danh sách .json.
+    Tên trùng nhau được thay bằng đường dẫn tương đối của file kết quả để phân biệt.
+    """
+    runs = []
+    for spec in specs:
+        if spec.endswith('.json') and os.path.isfile(spec):
+            runs.extend(_runs_from_list(spec))
+            continue
+        matches = sorted(glob.glob(spec)) or [spec]
+        for path in matches:
+            if path.endswith('.summary.pkl') or path.endswith('.json') or '.kernel.' in path:
+                continue   # file phụ cạnh file kết quả
+            run = _run_from_path(path)
+            if run is None:
+                print(f"Bo qua {path}: khong tim thay file ket qua")
+            else:
+                runs.append(run)
+
+    seen = {}
+    for run in runs:
+        seen[run['name']] = seen.get(run['name'], 0) + 1
+    for name, count in seen.items():
+        if count > 1:
+            for run in runs:
+                if run['name'] == name:
+                    run['name'] = os.path.relpath(run['path'])
+    return runs
+
+
+def summarize_run(run, chunk_rows=CHUNK_ROWS, cache=True):
+    """
+    Tóm tắt một run (chạy trong tiến trình con): chỉ trả về một dòng số liệu nhỏ,
+    không gửi StreamingSummary (bitmap/histogram) qua lại giữa các tiến trình
+    """
+    started = time.perf_counter()
+    row = {'name': run['name'], 'path': run['path']}
+    try:
+        flows = read_manifest(run['manifest'])['flows'] if run.get('manifest') else None
+        incremental = IncrementalSummary(run['path'], chunk_rows, flows, cache)
+        incremental.refresh()
+    except (OSError, ValueError, KeyError) as e:
+        row['error'] = str(e)
+        return row
+
+    summary = incremental.summary
+    metrics = summary.metrics()
+    if not metrics:
+        row['error'] = 'khong co goi hop le'
+        return row
+    # Nhiều flow không có manifest: không lập được bitmap -> cột mất gói để trống
+    sequence = summary.sequences.summary() if summary.sequences is not None else None
+    tuning = load_tuning_record(run['path'])
+    impairment = load_impairment_record(run['impairment']) if run.get('impairment') else None
+    row.update({
+        'packets': metrics['total_packets'],
+        'avg_delay_ms': round(metrics['avg_delay'], 4),
+        'p50_ms': round(metrics['median_delay'], 4),
+        'p99_ms': round(metrics['percentile_99'], 4),
+        'max_delay_ms': round(metrics['max_delay'], 4),
+        'avg_jitter_ms': round(metrics['avg_jitter'], 4),
+        'loss_pct': round(sequence['loss_rate'], 4) if sequence else None,
+        'duplicates': sequence['duplicates'] if sequence else None,
+        'out_of_order': sequence['out_of_order'] if sequence else None,
+        'tuning': tuning['name'] if tuning else '',
+        'rcvbuf_eff': tuning['effective'].get('rcvbuf', '') if tuning else '',
+        'impairment': impairment['name'] if impairment else '',
+        'seconds': round(time.perf_counter() - started, 3),
+        'cached': incremental.from_cache,
+    })
+    return row
+
+
+def summarize_runs(runs, jobs=None, chunk_rows=CHUNK_ROWS, cache=True):
+    """Tóm tắt các run song song (jobs tiến trình, mặc định = số CPU), giữ thứ tự đầu vào"""
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(runs)))
+    if jobs == 1:
+        return [summarize_run(run, chunk_rows, cache) for run in runs]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(summarize_run, runs, [chunk_rows] * len(runs), [cache] * len(runs)))
+
+
+def rank_runs(rows, sort_key='score'):
+    """
+    Xếp hạng: score = trung bình thứ hạng theo từng tiêu chí RANK_KEYS (1 = tốt nhất).
+    sort_key: 'score' hoặc một khóa của RANK_KEYS. Run lỗi xếp cuối.
+    """
+    valid = [r for r in rows if 'error' not in r]
+    for key in RANK_KEYS:
+        # Giá trị không tính được (None) xếp sau cùng theo tiêu chí đó
+        for position, row in enumerate(sorted(valid, key=lambda r: (r[key] is None, r[key] or 0)), 1):
+            row.setdefault('_ranks', {})[key] = position
+    for row in valid:
+        row['score'] = round(sum(row.pop('_ranks').values()) / len(RANK_KEYS), 2)
+    valid.sort(key=lambda r: (r[sort_key] is None, r[sort_key] or 0, r['score']))
+    for position, row in enumerate(valid, 1):
+        row['rank'] = position
+    return valid + [r for r in rows if 'error' in r]
+
+
+def print_ranking(rows):
+    print("\n" + "=" * 109)
+    print("           XEP HANG CAC LAN CHAY (nho hon la tot hon)")
+    print("=" * 109)
+    print(f"{'#':>3} {'Run':<28} {'Goi':>10} {'TB':>8} {'p50':>8} {'p99':>8} {'Jitter':>8} "
+          f"{'Mat %':>7} {'Diem':>6} {'Tuning':<12} {'Mang':<12}")
+    for r in rows:
+        if 'error' in r:
+            print(f"{'-':>3} {r['name'][:28]:<28} LOI: {r['error']}")
+            continue
+        print(f"{r['rank']:>3} {r['name'][:28]:<28} {r['packets']:>10} {r['avg_delay_ms']:>8.3f} "
+              f"{r['p50_ms']:>8.3f} {r['p99_ms']:>8.3f} {r['avg_jitter_ms']:>8.3f} "
+              f"{'N/A' if r['loss_pct'] is None else format(r['loss_pct'], '.2f'):>7} "
+              f"{r['score']:>6.2f} {r['tuning'][:12]:<12} {r['impairment'][:12]:<12}")
+    print("   * Delay/jitter tinh bang ms; Diem = trung binh thu hang theo "
+          + ", ".join(RANK_KEYS.values()))
+
+
+def write_ranking_csv(rows, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(rows)
+    return path
+
+
+def compare_runs(specs, jobs=None, chunk_rows=CHUNK_ROWS, cache=True, sort_key='score',
+                 out_csv='runs_comparison.csv', charts_dir=None, dpi=CHART_DPI):
+    """
+    Tìm run -> tóm tắt song song -> in bảng xếp hạng và ghi CSV; charts_dir: vẽ thêm biểu đồ
+    nhanh của từng run (song song). Trả về các dòng đã xếp hạng.
+    """
+    runs = discover_runs(specs)
+    if not runs:
+        print("Khong tim thay lan chay nao.")
+        return []
+    print(f"\n=== TOM TAT {len(runs)} LAN CHAY ===")
+    started = time.perf_counter()
+    rows = rank_runs(summarize_runs(runs, jobs, chunk_rows, cache), sort_key)
+    elapsed = time.perf_counter() - started
+    slowest = max((r.get('seconds', 0) for r in rows), default=0)
+    cached = sum(1 for r in rows if r.get('cached'))
+    print(f"Xong trong {elapsed:.2f}s (run cham nhat {slowest:.2f}s, {cached} run dung cache)")
+    print_ranking(rows)
+    if out_csv:
+        print(f"Da tao CSV: {write_ranking_csv(rows, out_csv)}")
+    if charts_dir:
+        if not (HAS_NUMPY and HAS_MATPLOTLIB):
+            print("Can NumPy va matplotlib de ve bieu do")
+            return rows
+        started = time.perf_counter()
+        charts = [c for c in render_runs(runs, charts_dir, jobs, dpi) if c]
+        print(f"Da ve {len(charts)} bieu do vao {charts_dir} trong {time.perf_counter() - started:.2f}s")
+    return rows
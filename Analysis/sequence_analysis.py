@@ -0,0 +1,264 @@
+"""
+Sequence Analysis
+Phan tich thu tu goi bang bitmap 1 bit / packet_id: mat goi, trung lap, dao thu tu,
+den muon va phan bo do dai chuoi mat goi lien tiep - mot lan duyet tuyen tinh
+"""
+
+from collections import Counter
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+LATE_DISTANCE = 64       # đến sau một id lớn hơn nó ít nhất 64 -> "đến muộn" (tập con của đảo thứ tự)
+HEAD_SLACK = 4096        # chừa sẵn bit phía dưới id đầu tiên cho gói đảo thứ tự ở đầu
+MAX_SPAN = 1 << 32       # tối đa 2^32 id mỗi bitmap (512 MB)
+BURST_BLOCK = 1 << 22    # số bit mỗi khối khi quét chuỗi mất gói
+
+
+class SequenceAnalyzer:
+    """
+    Bitmap đánh dấu packet_id đã nhận (bit i <-> id base + i).
+    Biết trước dải gửi (first_id, expected - VD từ manifest) thì tính được cả mất gói
+    ở đầu/cuối; nếu không, dải kỳ vọng là [id nhỏ nhất, id lớn nhất] đã thấy.
+    """
+
+    def __init__(self, first_id=None, expected=None, late_distance=LATE_DISTANCE):
+        self.first_id = first_id
+        self.expected = expected
+        self.late_distance = late_distance
+        self.base = None
+        self.bitmap = np.zeros(0, dtype=np.uint8) if HAS_NUMPY else bytearray()
+        self.received = 0        # tổng số gói (kể cả trùng)
+        self.unique = 0
+        self.duplicates = 0
+        self.out_of_order = 0    # id nhỏ hơn id lớn nhất đã thấy (không tính gói trùng)
+        self.late = 0
+        self.min_id = None
+        self.highest = None
+        if first_id is not None and expected is not None:
+            self.base = first_id
+            self.bitmap = self._new_bitmap((expected + 7) // 8)
+
+    @staticmethod
+    def _new_bitmap(nbytes):
+        return np.zeros(nbytes, dtype=np.uint8) if HAS_NUMPY else bytearray(nbytes)
+
+    def _ensure(self, lo, hi):
+        """Mở rộng bitmap để phủ [lo, hi] (chỉ xảy ra khi không biết trước dải gửi)"""
+        if self.base is None:
+            self.base = max(0, lo - HEAD_SLACK) & ~7
+        if lo < self.base:
+            new_base = max(0, lo - HEAD_SLACK) & ~7
+            pad = self._new_bitmap((self.base - new_base) // 8)
+            self.bitmap = np.concatenate((pad, self.bitmap)) if HAS_NUMPY else pad + self.bitmap
+            self.base = new_base
+        need = (hi - self.base) // 8 + 1
+        if need > MAX_SPAN // 8:
+            raise ValueError(f"dai packet_id qua rong ({hi - self.base + 1} id) - hay dung manifest")
+        if need > len(self.bitmap):
+            grow = self._new_bitmap(min(max(need, 2 * len(self.bitmap)), MAX_SPAN // 8) - len(self.bitmap))
+            self.bitmap = np.concatenate((self.bitmap, grow)) if HAS_NUMPY else self.bitmap + grow
+
+    def update(self, ids):
+        """Ghi một khối packet_id theo thứ tự đến (id ngoài dải gửi đã biết phải lọc trước)"""
+        if len(ids) == 0:
+            return
+        if HAS_NUMPY:
+            self._update_numpy(np.asarray(ids, dtype=np.int64))
+        else:
+            self._update_python(ids)
+
+    def _update_numpy(self, ids):
+        lo, hi = int(ids.min()), int(ids.max())
+        if self.expected is None:
+            self._ensure(lo, hi)
+        n = ids.size
+
+        # id lớn nhất đã thấy TRƯỚC mỗi gói (kể cả các khối trước)
+        before = np.empty(n, dtype=np.int64)
+        before[0] = self.highest if self.highest is not None else ids[0]
+        if n > 1:
+            np.maximum(np.maximum.accumulate(ids[:-1]), before[0], out=before[1:])
+
+        offsets = ids - self.base
+        byte_idx = offsets >> 3
+        bits = np.left_shift(1, offsets & 7).astype(np.uint8)
+        # trùng: bit đã bật từ khối trước, hoặc id đã xuất hiện sớm hơn trong khối này
+        dup = (self.bitmap[byte_idx] & bits) != 0
+        order = np.argsort(offsets, kind="stable")
+        ordered = offsets[order]
+        dup[order[1:]] |= ordered[1:] == ordered[:-1]
+        np.bitwise_or.at(self.bitmap, byte_idx, bits)
+
+        behind = before - ids
+        reordered = (behind > 0) & ~dup
+        dup_count = int(dup.sum())
+        self.received += n
+        self.duplicates += dup_count
+        self.unique += n - dup_count
+        self.out_of_order += int(reordered.sum())
+        self.late += int((reordered & (behind >= self.late_distance)).sum())
+        self.min_id = lo if self.min_id is None else min(self.min_id, lo)
+        self.highest = hi if self.highest is None else max(self.highest, hi)
+
+    def _update_python(self, ids):
+        if self.expected is None:
+            self._ensure(min(ids), max(ids))
+        bitmap = self.bitmap
+        base = self.base
+        highest = self.highest
+        for packet_id in ids:
+            offset = packet_id - base
+            mask = 1 << (offset & 7)
+            self.received += 1
+            if bitmap[offset >> 3] & mask:
+                self.duplicates += 1
+            else:
+                bitmap[offset >> 3] |= mask
+                self.unique += 1
+                if highest is not None and packet_id < highest:
+                    self.out_of_order += 1
+                    if highest - packet_id >= self.late_distance:
+                        self.late += 1
+            if highest is None or packet_id > highest:
+                highest = packet_id
+            if self.min_id is None or packet_id < self.min_id:
+                self.min_id = packet_id
+        self.highest = highest
+
+    def _range(self):
+        if self.expected is not None:
+            return self.first_id, self.first_id + self.expected - 1
+        return self.min_id, self.highest
+
+    def loss_bursts(self):
+        """Counter độ dài chuỗi id liên tiếp bị mất -> số lần xuất hiện"""
+        lo, hi = self._range()
+        bursts = Counter()
+        if lo is None or hi < lo:
+            return bursts
+        start, stop = lo - self.base, hi - self.base + 1
+        if not HAS_NUMPY:
+            run = 0
+            for offset in range(start, stop):
+                if self.bitmap[offset >> 3] >> (offset & 7) & 1:
+                    if run:
+                        bursts[run] += 1
+                    run = 0
+                else:
+                    run += 1
+            if run:
+                bursts[run] += 1
+            return bursts
+
+        carry = 0   # chuỗi mất gói còn dở ở cuối khối trước
+        lengths = []
+        for block in range(start, stop, BURST_BLOCK):
+            end = min(block + BURST_BLOCK, stop)
+            bits = np.unpackbits(self.bitmap[block >> 3:(end + 7) >> 3], bitorder="little")
+            skip = block & 7
+            bits = bits[skip:skip + end - block]
+            got = np.flatnonzero(bits)
+            if got.size == 0:
+                carry += bits.size
+                continue
+            head = carry + int(got[0])
+            if head:
+                lengths.append(np.array([head]))
+            gaps = np.diff(got) - 1
+            lengths.append(gaps[gaps > 0])
+            carry = bits.size - 1 - int(got[-1])
+        if carry:
+            lengths.append(np.array([carry]))
+        if lengths:
+            values, counts = np.unique(np.concatenate(lengths), return_counts=True)
+            bursts.update(dict(zip(values.tolist(), counts.tolist())))
+        return bursts
+
+    def result(self):
+        lo, hi = self._range()
+        expected = hi - lo + 1 if lo is not None else 0
+        lost = max(0, expected - self.unique)
+        bursts = self.loss_bursts()
+        return {
+            'first_id': lo,
+            'last_id': hi,
+            'expected': expected,
+            'received': self.received,
+            'unique': self.unique,
+            'lost': lost,
+            'loss_rate': lost / expected * 100 if expected else 0,
+            'duplicates': self.duplicates,
+            'out_of_order': self.out_of_order,
+            'late': self.late,
+            'bursts': bursts,
+            'max_burst': max(bursts) if bursts else 0,
+        }
+
+
+class SequenceSet:
+    """
+    Một SequenceAnalyzer cho mỗi flow của manifest (dải [first_id, first_id + sent)),
+    hoặc một bộ duy nhất cho cả file khi không có manifest
+    """
+
+    def __init__(self, flows=None, late_distance=LATE_DISTANCE):
+        self.flows = flows
+        if flows:
+            self.analyzers = [SequenceAnalyzer(f['first_id'], f['sent'], late_distance) for f in flows]
+        else:
+            self.analyzers = [SequenceAnalyzer(late_distance=late_distance)]
+        self.stray = 0   # id không thuộc flow nào trong manifest
+
+    def update(self, ids):
+        if not self.flows:
+            self.analyzers[0].update(ids)
+            return
+        if HAS_NUMPY:
+            ids = np.asarray(ids, dtype=np.int64)
+        covered = 0
+        for flow, analyzer in zip(self.flows, self.analyzers):
+            lo, hi = flow['first_id'], flow['first_id'] + flow['sent']
+            if HAS_NUMPY:
+                mine = ids[(ids >= lo) & (ids < hi)]
+            else:
+                mine = [x for x in ids if lo <= x < hi]
+            analyzer.update(mine)
+            covered += len(mine)
+        self.stray += len(ids) - covered
+
+    def results(self):
+        return [analyzer.result() for analyzer in self.analyzers]
+
+    def summary(self):
+        """Gộp kết quả mọi flow thành một dict cùng khóa với SequenceAnalyzer.result"""
+        total = {key: 0 for key in ('expected', 'received', 'unique', 'lost',
+                                    'duplicates', 'out_of_order', 'late')}
+        bursts = Counter()
+        for result in self.results():
+            for key in total:
+                total[key] += result[key]
+            bursts.update(result['bursts'])
+        total['loss_rate'] = total['lost'] / total['expected'] * 100 if total['expected'] else 0
+        total['bursts'] = bursts
+        total['max_burst'] = max(bursts) if bursts else 0
+        total['stray'] = self.stray
+        return total
+
+
+def burst_histogram(bursts):
+    """Gom độ dài chuỗi mất gói theo lũy thừa 2: [(từ, đến, số chuỗi), ...]"""
+    buckets = Counter()
+    for length, count in bursts.items():
+        buckets[length.bit_length() - 1] += count
+    return [(1 << b, (1 << (b + 1)) - 1, buckets[b]) for b in sorted(buckets)]
+
+
+def analyze_ids(ids, flows=None):
+    """Tiện ích: phân tích một dãy packet_id (theo thứ tự đến) trong một lần"""
+    sequences = SequenceSet(flows)
+    sequences.update(ids)
+    return sequences
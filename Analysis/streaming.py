@@ -0,0 +1,319 @@
+"""
+Streaming Analyzer
+Doc file ket qua theo tung khoi va cap nhat thong ke online (bo nho khong doi)
+"""
+
+import csv
+import hashlib
+import json
+import math
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from hdr_histogram import HdrHistogram
+from result_store import column_path, is_columnar, open_columns
+from sequence_analysis import SequenceSet
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+CHUNK_ROWS = 200000        # số dòng mỗi khối đọc
+NS_PER_MS = 1_000_000      # histogram lưu độ trễ theo ns (số nguyên)
+CACHE_SUFFIX = ".summary.pkl"
+CACHE_VERSION = 1
+CACHE_SAVE_ROWS = 1_000_000   # refresh() chỉ ghi lại cache khi đã đọc thêm từng này gói kể từ lần ghi trước
+HEAD_BYTES = 4096          # số byte đầu file dùng để nhận ra file bị ghi lại
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    Đọc file kết quả (CSV hoặc *.col) theo khối -> (packet_ids, delays) đã bỏ delay <= 0.
+    Với *.col mỗi khối chỉ là một lát memmap, không copy toàn bộ file.
+    """
+    for packet_ids, delays, _ in iter_chunks_from(path, 0, chunk_rows):
+        yield packet_ids, delays
+
+
+def iter_chunks_from(path, start=0, chunk_rows=CHUNK_ROWS):
+    """
+    Như iter_chunks nhưng bắt đầu từ vị trí `start` và trả kèm vị trí sau mỗi khối:
+    (packet_ids, delays, end) - CSV: byte ngay sau dòng đầy đủ cuối cùng; *.col: số dòng.
+    Dòng CSV cuối chưa có '\n' (server đang ghi dở) bị bỏ qua, lần sau đọc lại từ đầu dòng đó.
+    """
+    if is_columnar(path):
+        columns = open_columns(path)
+        ids, delays = columns['packet_id'], columns['delay_ms']
+        for begin in range(start, len(delays), chunk_rows):
+            end = min(begin + chunk_rows, len(delays))
+            chunk_ids = ids[begin:end]
+            chunk_delays = delays[begin:end]
+            mask = chunk_delays > 0
+            if not mask.all():
+                chunk_ids, chunk_delays = chunk_ids[mask], chunk_delays[mask]
+            yield chunk_ids, chunk_delays, end
+        return
+
+    with open(path, 'rb') as file:
+        header = file.readline()
+        if not header.endswith(b'\n'):
+            return  # chưa ghi xong dòng tiêu đề
+        columns = next(csv.reader([header.decode('utf-8')]))
+        id_col, delay_col = columns.index('packet_id'), columns.index('delay_ms')
+        offset = max(start, len(header))
+        file.seek(offset)
+        ids, delays = [], []
+        for line in file:
+            if not line.endswith(b'\n'):
+                break
+            offset += len(line)
+            fields = line.split(b',')
+            if len(fields) <= delay_col:
+                continue  # dòng trống
+            delay = float(fields[delay_col])
+            if delay > 0:  # Loại bỏ delay âm
+                ids.append(int(fields[id_col]))
+                delays.append(delay)
+            if len(delays) >= chunk_rows:
+                yield (*_as_arrays(ids, delays), offset)
+                ids, delays = [], []
+        if delays or offset > start:
+            yield (*_as_arrays(ids, delays), offset)
+
+
+def _as_arrays(ids, delays):
+    if HAS_NUMPY:
+        return np.asarray(ids, dtype=np.int64), np.asarray(delays, dtype=np.float64)
+    return ids, delays
+
+
+class StreamingSummary:
+    """
+    Thống kê online cho một lần chạy:
+    - trung bình/phương sai theo Welford (gộp theo khối bằng công thức Chan)
+    - min/max, jitter (nối liền giữa các khối)
+    - mất gói / trùng / đảo thứ tự qua bitmap packet_id (SequenceSet, theo flow nếu có manifest);
+      dải id quá rộng để lập bitmap (nhiều flow không có manifest) -> sequences = None, chỉ còn độ trễ
+    - phân vị qua HDR histogram (gộp được giữa nhiều file/tiến trình)
+    """
+
+    def __init__(self, flows=None):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min_delay = math.inf
+        self.max_delay = -math.inf
+        self.jitter_sum = 0.0
+        self.jitter_max = 0.0
+        self.last_delay = None
+        self.sequences = SequenceSet(flows)
+        self.histogram = HdrHistogram()
+
+    def __len__(self):
+        return self.count
+
+    def update(self, packet_ids, delays):
+        """Cập nhật với một khối dữ liệu (mảng numpy hoặc list)"""
+        n = len(delays)
+        if n == 0:
+            return
+        if self.sequences is not None:
+            try:
+                self.sequences.update(packet_ids)
+            except ValueError as e:
+                print(f"Khong phan tich duoc thu tu goi: {e} - chi tinh do tre")
+                self.sequences = None
+        if HAS_NUMPY:
+            self._update_numpy(np.asarray(packet_ids), np.asarray(delays, dtype=np.float64))
+        else:
+            self._update_python(packet_ids, delays)
+
+    def _merge_moments(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+    def _update_numpy(self, ids, d):
+        chunk_mean = float(d.mean())
+        centered = d - chunk_mean
+        self._merge_moments(d.size, chunk_mean, float(np.dot(centered, centered)))
+
+        self.min_delay = min(self.min_delay, float(d.min()))
+        self.max_delay = max(self.max_delay, float(d.max()))
+
+        jitter = np.abs(np.diff(d))
+        if self.last_delay is not None:
+            first = abs(float(d[0]) - self.last_delay)
+            self.jitter_sum += first
+            self.jitter_max = max(self.jitter_max, first)
+        if jitter.size:
+            self.jitter_sum += float(jitter.sum())
+            self.jitter_max = max(self.jitter_max, float(jitter.max()))
+        self.last_delay = float(d[-1])
+
+        self.histogram.record_array(np.rint(d * NS_PER_MS))
+
+    def _update_python(self, ids, delays):
+        for delay in delays:
+            # Welford từng giá trị
+            self.count += 1
+            delta = delay - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (delay - self.mean)
+
+            if delay < self.min_delay:
+                self.min_delay = delay
+            if delay > self.max_delay:
+                self.max_delay = delay
+            if self.last_delay is not None:
+                jitter = abs(delay - self.last_delay)
+                self.jitter_sum += jitter
+                if jitter > self.jitter_max:
+                    self.jitter_max = jitter
+            self.last_delay = delay
+            self.histogram.record(round(delay * NS_PER_MS))
+
+    def metrics(self):
+        """Cùng khóa với UDPOptimizerAnalyzer.calculate_metrics (phân vị là xấp xỉ)"""
+        if not self.count:
+            return None
+        median, p95, p99 = self.histogram.values_at_quantiles((0.5, 0.95, 0.99))
+        return {
+            'total_packets': self.count,
+            'avg_delay': self.mean,
+            'min_delay': self.min_delay,
+            'max_delay': self.max_delay,
+            'median_delay': median / NS_PER_MS,
+            'std_delay': math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0,
+            'percentile_95': p95 / NS_PER_MS,
+            'percentile_99': p99 / NS_PER_MS,
+            'avg_jitter': self.jitter_sum / (self.count - 1) if self.count > 1 else 0,
+            'max_jitter': self.jitter_max
+        }
+
+    def loss_rate(self):
+        """Tỷ lệ mất gói (%) từ bitmap packet_id (None nếu không phân tích được thứ tự gói)"""
+        return self.sequences.summary()['loss_rate'] if self.sequences is not None else None
+
+
+def _signature(path):
+    """(tổng kích thước, mtime_ns lớn nhất) của file CSV hoặc mọi file trong thư mục *.col"""
+    if is_columnar(path):
+        stats = [os.stat(os.path.join(path, name)) for name in sorted(os.listdir(path))]
+    else:
+        stats = [os.stat(path)]
+    return sum(st.st_size for st in stats), max(st.st_mtime_ns for st in stats)
+
+
+def _head_digest(path, length):
+    """Băm `length` byte đầu (CSV) / của cột packet_id (*.col) để phát hiện file bị ghi lại từ đầu"""
+    target = column_path(path, 'packet_id') if is_columnar(path) else path
+    with open(target, 'rb') as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+def cache_path(path):
+    return path.rstrip('/\\') + CACHE_SUFFIX
+
+
+class IncrementalSummary:
+    """
+    StreamingSummary của một file kết quả + vị trí đã đọc tới.
+    refresh() chỉ đọc phần mới ghi thêm; cache=True lưu trạng thái vào <file>.summary.pkl
+    (khóa: đường dẫn, kích thước, mtime, băm phần đầu, flows) -> lần chạy sau không đọc lại
+    file không đổi, file đang lớn dần thì đọc tiếp từ offset cũ.
+    Lần refresh đầu luôn ghi cache, các lần sau chỉ ghi khi đã đọc thêm CACHE_SAVE_ROWS gói
+    (theo dõi file lâu: gọi save_cache() khi dừng để lưu phần còn lại).
+    """
+
+    def __init__(self, path, chunk_rows=CHUNK_ROWS, flows=None, cache=True):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.flows = flows
+        self.cache = cache
+        self._flows_key = json.dumps(flows, sort_keys=True)
+        self.summary = None
+        self.offset = 0
+        self.signature = None
+        self.head = (0, None)      # (số byte đầu đã băm, giá trị băm)
+        self.from_cache = False    # lần refresh gần nhất dùng lại cache
+        self._saved = None         # (summary, count) lúc ghi cache gần nhất
+
+    def _matches_head(self):
+        length, digest = self.head
+        return length == 0 or _head_digest(self.path, length) == digest
+
+    def _load_cache(self):
+        try:
+            with open(cache_path(self.path), 'rb') as f:
+                state = pickle.load(f)
+            if (state.get('version') != CACHE_VERSION or state.get('path') != os.path.abspath(self.path)
+                    or state.get('flows') != self._flows_key):
+                return False
+        except Exception:
+            # Cache hỏng hoặc do phiên bản mã khác ghi (ImportError, TypeError... khi unpickle): bỏ qua
+            return False
+        self.summary, self.offset = state['summary'], state['offset']
+        self.signature, self.head = state['signature'], state['head']
+        return True
+
+    def save_cache(self):
+        """Ghi trạng thái hiện tại vào <file>.summary.pkl nếu có gói mới kể từ lần ghi trước"""
+        if self.summary is None or self._saved == (self.summary, self.summary.count):
+            return
+        self._save_cache()
+
+    def _save_cache(self):
+        state = {'version': CACHE_VERSION, 'path': os.path.abspath(self.path), 'flows': self._flows_key,
+                 'signature': self.signature, 'head': self.head, 'offset': self.offset,
+                 'summary': self.summary}
+        target = cache_path(self.path)
+        try:
+            with open(target + '.tmp', 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(target + '.tmp', target)
+            self._saved = (self.summary, self.summary.count)
+        except OSError as e:
+            print(f"Khong ghi duoc cache {target}: {e}")
+
+    def refresh(self):
+        """Cập nhật với phần mới của file; trả về số gói mới đọc được"""
+        signature = _signature(self.path)
+        self.from_cache = False
+        if self.summary is None and self.cache and self._load_cache():
+            self.from_cache = True
+        if self.summary is not None:
+            if signature == self.signature:
+                return 0   # không đổi kể từ lần đọc trước
+            if signature[0] < self.signature[0] or not self._matches_head():
+                self.summary = None   # file bị cắt ngắn / ghi lại từ đầu
+        if self.summary is None:
+            self.summary = StreamingSummary(self.flows)
+            self.offset = 0
+            self.from_cache = False
+
+        before = self.summary.count
+        for packet_ids, delays, self.offset in iter_chunks_from(self.path, self.offset, self.chunk_rows):
+            self.summary.update(packet_ids, delays)
+        self.signature = signature
+        if self.head[0] < HEAD_BYTES:
+            length = min(HEAD_BYTES, self.offset * (8 if is_columnar(self.path) else 1))
+            self.head = (length, _head_digest(self.path, length))
+        if self.cache:
+            saved_summary, saved_count = self._saved or (None, 0)
+            if saved_summary is not self.summary or self.summary.count - saved_count >= CACHE_SAVE_ROWS:
+                self._save_cache()
+        return self.summary.count - before
+
+
+def summarize_file(path, chunk_rows=CHUNK_ROWS, flows=None, cache=False):
+    """Tóm tắt một file kết quả bằng cách đọc lần lượt từng khối (cache=True: dùng/ghi <file>.summary.pkl)"""
+    incremental = IncrementalSummary(path, chunk_rows, flows, cache)
+    incremental.refresh()
+    return incremental.summary
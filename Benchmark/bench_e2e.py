@@ -0,0 +1,289 @@
+# Benchmark đầu-cuối: chạy server.py + load_generator.py thành tiến trình con trên localhost,
+# quét tham số (tốc độ, kích thước gói, hồ sơ tinh chỉnh socket, SO_SNDBUF/SO_RCVBUF, số worker nhận,
+# hồ sơ suy giảm mạng) và ghi ma trận kết quả
+#
+# Mỗi lần chạy (run):
+#   1. server.py --mode batch --port P --timeout T --tuning X [--workers W] [--rcvbuf B]  (cwd = thư mục run)
+#      hồ sơ mạng khác "none": server ở cổng P + RELAY_PORT_OFFSET, impairment_relay.py nghe ở P
+#      và ghi impairment.json (hồ sơ + số gói relay đã bỏ/trùng/đảo) vào thư mục run
+#   2. load_generator.py --tuning X gửi đúng `--duration` giây, ghi manifest (số gói đã gửi từng flow)
+#   3. chờ relay rồi server dừng sau T giây nhàn rỗi, đọc data/results.csv bằng streaming analyzer + manifest
+#   4. CPU của client/server lấy từ getrusage(RUSAGE_CHILDREN) trước/sau khi chờ từng tiến trình
+#      (CPU của relay tự ghi trong impairment.json, trừ ra khỏi phần của server)
+#
+# Kết quả: <out>.csv (ma trận, mỗi dòng một run) và <out>.json (kèm thông tin máy)
+# So với lần chạy trước: --baseline <cũ>.json -> in REGRESSION và thoát mã 1 nếu tệ hơn --tolerance %
+#
+# Chạy: cd Benchmark && python bench_e2e.py --rates 2000,20000 --sizes 64,1024 --workers 1,2
+#       python bench_e2e.py --rates 20000 --impairments none,wan,wifi
+import argparse
+import csv
+import itertools
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:   # Windows: không đo được CPU của tiến trình con
+    resource = None
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Analysis"))
+sys.path.insert(0, os.path.join(ROOT, "Common"))
+
+from impairment import PROFILES as IMPAIRMENTS, RECORD_FILE as IMPAIRMENT_FILE  # noqa: E402
+from impairment import load_record as load_impairment_record  # noqa: E402
+from manifest import read_manifest  # noqa: E402
+from socket_tuning import PROFILES, load_record  # noqa: E402
+from streaming import summarize_file  # noqa: E402
+
+SERVER = os.path.join(ROOT, "Server", "server.py")
+LOAD_GENERATOR = os.path.join(ROOT, "Client", "load_generator.py")
+RELAY = os.path.join(ROOT, "Server", "impairment_relay.py")
+
+PORT = 5205               # cổng riêng để không đụng server thật đang chạy
+RELAY_PORT_OFFSET = 100   # có relay: server ở PORT + 100, relay nghe ở PORT
+RELAY_SEED = 1            # cùng chuỗi mất/trễ ở mọi run để so sánh được
+DURATION = 3.0            # giây gửi mỗi run
+IDLE_TIMEOUT = 3.0        # server dừng sau 3s không có gói (tính cả lúc chờ gói đầu tiên)
+STARTUP_DELAY = 1.0       # chờ server (và các worker) bind xong
+SENDERS = 1               # số tiến trình gửi của load_generator
+TOLERANCE = 10.0          # % xấu đi tối đa trước khi coi là regression
+
+PARAMS = ("impairment", "tuning", "rate", "size", "sndbuf", "rcvbuf", "workers")
+PARAM_DEFAULTS = {"impairment": "none"}   # baseline cũ chưa có chiều này
+# *_eff: giá trị kernel thực sự áp dụng (đọc lại bằng getsockopt, Linux nhân đôi giá trị yêu cầu)
+# relay_dropped: số gói relay cố ý bỏ (nằm trong loss_pct); relay_late_max_us: độ chính xác lập lịch của relay
+FIELDS = PARAMS + ("sndbuf_eff", "rcvbuf_eff", "sent", "received", "loss_pct", "duplicates", "out_of_order", "send_pps", "recv_pps",
+                   "p50_ms", "p99_ms", "avg_jitter_ms", "server_cpu_s", "client_cpu_s",
+                   "server_cpu_pct", "client_cpu_pct", "relay_dropped", "relay_cpu_s", "relay_late_max_us")
+
+# (chỉ số, chiều "tốt hơn"): dùng khi so với baseline
+WATCHED = (("recv_pps", "higher"), ("p99_ms", "lower"), ("loss_pct", "lower"))
+
+
+def _int_list(value):
+    return [int(x) for x in value.split(",")]
+
+
+def _optional_int_list(value):
+    """'0,262144' -> [None, 262144]; 0 = để mặc định của hệ điều hành"""
+    return [int(x) or None for x in value.split(",")]
+
+
+def _children_cpu():
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _tuning_list(value):
+    names = value.split(",")
+    for name in names:
+        if name not in PROFILES and not os.path.exists(name):
+            raise argparse.ArgumentTypeError(f"không có hồ sơ/file tinh chỉnh '{name}'")
+    return [name if name in PROFILES else os.path.abspath(name) for name in names]
+
+
+def _impairment_list(value):
+    names = value.split(",")
+    for name in names:
+        if name not in IMPAIRMENTS and not os.path.exists(name):
+            raise argparse.ArgumentTypeError(f"không có hồ sơ/file suy giảm mạng '{name}'")
+    return [name if name in IMPAIRMENTS else os.path.abspath(name) for name in names]
+
+
+def run_once(run_dir, impairment, tuning, rate, size, sndbuf, rcvbuf, workers, args):
+    """Một run server (+ relay) + client, trả về dict một dòng của ma trận"""
+    os.makedirs(run_dir, exist_ok=True)
+    relayed = impairment != "none"
+    server_port = args.port + RELAY_PORT_OFFSET if relayed else args.port
+    server_cmd = [sys.executable, SERVER, "--mode", "batch", "--port", str(server_port),
+                  "--timeout", str(args.idle_timeout), "--workers", str(workers), "--tuning", tuning]
+    if rcvbuf:
+        server_cmd += ["--rcvbuf", str(rcvbuf)]
+    manifest_path = os.path.join(run_dir, "manifest.json")
+    client_cmd = [sys.executable, LOAD_GENERATOR, "--port", str(args.port), "--workers", str(args.senders),
+                  "--rate", str(rate), "--size", str(size), "--duration", str(args.duration),
+                  "--manifest", manifest_path, "--tuning", tuning]
+    if sndbuf:
+        client_cmd += ["--sndbuf", str(sndbuf)]
+    impairment_path = os.path.join(run_dir, IMPAIRMENT_FILE)
+    relay_cmd = [sys.executable, RELAY, "--profile", impairment, "--listen-port", str(args.port),
+                 "--server-port", str(server_port), "--timeout", str(args.idle_timeout), "--seed", str(RELAY_SEED),
+                 "--record", impairment_path, "--tuning", tuning]
+
+    with open(os.path.join(run_dir, "server.log"), "w") as server_log, \
+            open(os.path.join(run_dir, "client.log"), "w") as client_log, \
+            open(os.path.join(run_dir, "relay.log"), "w") as relay_log:
+        cpu_start = _children_cpu()
+        server = subprocess.Popen(server_cmd, cwd=run_dir, stdout=server_log, stderr=subprocess.STDOUT)
+        relay = subprocess.Popen(relay_cmd, cwd=run_dir, stdout=relay_log,
+                                 stderr=subprocess.STDOUT) if relayed else None
+        try:
+            time.sleep(STARTUP_DELAY)
+            subprocess.run(client_cmd, cwd=run_dir, stdout=client_log, stderr=subprocess.STDOUT,
+                           timeout=args.duration + 60, check=True)
+            cpu_client = _children_cpu()
+            if relay is not None:
+                relay.wait(timeout=args.idle_timeout + 60)
+            server.wait(timeout=args.idle_timeout + 60)
+        finally:
+            for process in (relay, server):
+                if process is not None and process.poll() is None:
+                    process.kill()
+                    process.wait()
+        cpu_server = _children_cpu()
+
+    manifest = read_manifest(manifest_path)
+    results_path = os.path.join(run_dir, "data", "results.csv")
+    summary = summarize_file(results_path, flows=manifest["flows"])
+    server_tuning = load_record(results_path) or {"effective": {}}
+    client_tuning = manifest.get("tuning") or {"effective": {}}
+    metrics = summary.metrics() or {}
+    sequence = summary.sequences.summary()
+    elapsed = max((f["elapsed"] for f in manifest["flows"]), default=0) or args.duration
+    relay_record = load_impairment_record(impairment_path) if relayed else None
+    if relayed and relay_record is None:
+        raise ValueError(f"relay không ghi {impairment_path}")
+    relay_cpu = relay_record["cpu_s"] if relay_record else 0
+    server_cpu = cpu_server - cpu_client - relay_cpu
+    client_cpu = cpu_client - cpu_start
+    return {
+        "impairment": os.path.basename(impairment),
+        "tuning": os.path.basename(tuning),
+        "rate": rate,
+        "size": size,
+        "sndbuf": sndbuf or 0,
+        "rcvbuf": rcvbuf or 0,
+        "workers": workers,
+        "sndbuf_eff": client_tuning["effective"].get("sndbuf", 0),
+        "rcvbuf_eff": server_tuning["effective"].get("rcvbuf", 0),
+        "sent": manifest["total_sent"],
+        "received": sequence["unique"],
+        "loss_pct": round(sequence["loss_rate"], 4),
+        "duplicates": sequence["duplicates"],
+        "out_of_order": sequence["out_of_order"],
+        "send_pps": round(manifest["total_sent"] / elapsed, 1),
+        "recv_pps": round(sequence["unique"] / elapsed, 1),
+        "p50_ms": round(metrics.get("median_delay", 0), 4),
+        "p99_ms": round(metrics.get("percentile_99", 0), 4),
+        "avg_jitter_ms": round(metrics.get("avg_jitter", 0), 4),
+        "server_cpu_s": round(server_cpu, 3),
+        "client_cpu_s": round(client_cpu, 3),
+        # % của một core so với thời gian gửi (gồm cả lúc khởi động/trộn shard -> hơi cao hơn thực)
+        "server_cpu_pct": round(server_cpu / elapsed * 100, 1),
+        "client_cpu_pct": round(client_cpu / elapsed * 100, 1),
+        "relay_dropped": sum(relay_record["dropped"].values()) if relay_record else 0,
+        "relay_cpu_s": relay_cpu,
+        "relay_late_max_us": relay_record["release_late_max_us"] if relay_record else 0,
+    }
+
+
+def compare(rows, baseline_path, tolerance):
+    """In các chỉ số xấu đi quá tolerance % so với baseline, trả về số regression"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {tuple(r.get(p, PARAM_DEFAULTS.get(p)) for p in PARAMS): r for r in json.load(f)["runs"]}
+    regressions = 0
+    for row in rows:
+        old = baseline.get(tuple(row[p] for p in PARAMS))
+        if old is None:
+            continue
+        for key, better in WATCHED:
+            before, after = old[key], row[key]
+            if key == "loss_pct":
+                worse = after - before > tolerance / 10        # điểm phần trăm mất gói
+            elif better == "higher":
+                worse = before > 0 and (before - after) / before * 100 > tolerance
+            else:
+                worse = before > 0 and (after - before) / before * 100 > tolerance
+            if worse:
+                regressions += 1
+                params = ", ".join(f"{p}={row[p]}" for p in PARAMS)
+                print(f"[REGRESSION] {params}: {key} {before} -> {after}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark đầu-cuối server + load generator, quét tham số")
+    parser.add_argument("--tunings", type=_tuning_list, default=["default"],
+                        help=f"hồ sơ socket_tuning cho cả server và client ({', '.join(PROFILES)} hoặc file JSON)")
+    parser.add_argument("--impairments", type=_impairment_list, default=["none"],
+                        help=f"hồ sơ mạng giả lập qua impairment_relay.py ({', '.join(IMPAIRMENTS)} hoặc file JSON; "
+                             f"none = gửi thẳng)")
+    parser.add_argument("--rates", type=_int_list, default=[2000, 20000], help="tổng gói/giây, VD 2000,20000")
+    parser.add_argument("--sizes", type=_int_list, default=[256], help="kích thước gói (byte)")
+    parser.add_argument("--sndbufs", type=_optional_int_list, default=[None], help="SO_SNDBUF client, ghi đè hồ sơ (0 = theo hồ sơ)")
+    parser.add_argument("--rcvbufs", type=_optional_int_list, default=[None], help="SO_RCVBUF server, ghi đè hồ sơ (0 = theo hồ sơ)")
+    parser.add_argument("--workers", type=_int_list, default=[1], help="số worker nhận của server")
+    parser.add_argument("--senders", type=int, default=SENDERS, help="số tiến trình gửi mỗi run")
+    parser.add_argument("--duration", type=float, default=DURATION)
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--out", default="e2e_results", help="tiền tố file kết quả (.csv và .json)")
+    parser.add_argument("--keep", metavar="DIR", help="giữ file kết quả/log từng run trong thư mục này")
+    parser.add_argument("--baseline", help="file .json của lần chạy trước để phát hiện regression")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="%% xấu đi tối đa (recv_pps, p99); mất gói: tolerance/10 điểm %%")
+    args = parser.parse_args()
+
+    runs_root = os.path.abspath(args.keep) if args.keep else tempfile.mkdtemp(prefix="bench_e2e_")
+    combos = list(itertools.product(args.impairments, args.tunings, args.rates, args.sizes, args.sndbufs,
+                                    args.rcvbufs, args.workers))
+    print(f"{len(combos)} run x {args.duration:g}s, {args.senders} tiến trình gửi, {os.cpu_count()} CPU")
+    print(f"{'mạng':<10} {'tuning':<12} {'rate':>7} {'size':>5} {'snd eff':>8} {'rcv eff':>8} {'wk':>3} {'sent':>9} {'recv/s':>9} "
+          f"{'mất %':>7} {'p50 ms':>8} {'p99 ms':>8} {'CPU srv%':>8} {'CPU cli%':>8}")
+
+    rows = []
+    try:
+        for i, (impairment, tuning, rate, size, sndbuf, rcvbuf, workers) in enumerate(combos):
+            network = "" if impairment == "none" else "_" + os.path.splitext(os.path.basename(impairment))[0]
+            run_dir = os.path.join(runs_root, f"run{i:03d}{network}_r{rate}_s{size}_w{workers}")
+            try:
+                row = run_once(run_dir, impairment, tuning, rate, size, sndbuf, rcvbuf, workers, args)
+            except (subprocess.SubprocessError, OSError, ValueError) as e:
+                print(f"[LỖI] run {i} ({run_dir}): {e}")
+                continue
+            rows.append(row)
+            print(f"{row['impairment'][:10]:<10} {row['tuning']:<12} {rate:>7} {size:>5} {row['sndbuf_eff']:>8} {row['rcvbuf_eff']:>8} {workers:>3} {row['sent']:>9} "
+                  f"{row['recv_pps']:>9.0f} {row['loss_pct']:>7.2f} {row['p50_ms']:>8.3f} {row['p99_ms']:>8.3f} "
+                  f"{row['server_cpu_pct']:>8.1f} {row['client_cpu_pct']:>8.1f}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(runs_root, ignore_errors=True)
+
+    with open(args.out + ".csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    info = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "duration": args.duration,
+        "senders": args.senders,
+        # hồ sơ mạng đầy đủ (tên có sẵn -> tùy chọn); file JSON ghi nguyên đường dẫn
+        "impairments": {os.path.basename(name): IMPAIRMENTS.get(name, name) for name in args.impairments},
+    }
+    with open(args.out + ".json", "w", encoding="utf-8") as f:
+        json.dump({"info": info, "runs": rows}, f, indent=2)
+    print(f"Đã ghi {len(rows)} run vào {args.out}.csv / {args.out}.json")
+
+    if args.baseline:
+        regressions = compare(rows, args.baseline, args.tolerance)
+        print(f"So với {args.baseline}: {regressions} regression")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# Benchmark engine metrics: bản Python thuần (statistics + vòng for jitter)
+# so với bản vector hóa NumPy và lời gọi lặp lại đã được memo hóa
+#
+# Chạy: cd Benchmark && python bench_metrics.py [so_goi]   (mặc định 10 triệu gói)
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Analysis"))
+
+import numpy as np  # noqa: E402
+
+from analyze_results import UDPOptimizerAnalyzer  # noqa: E402
+from metrics_engine import compute_metrics, compute_metrics_python  # noqa: E402
+
+PACKETS = 10_000_000
+REPEAT_CALLS = 6          # số lần calculate_metrics được gọi cho 1 bộ dữ liệu trong main()
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    packets = int(sys.argv[1]) if len(sys.argv) > 1 else PACKETS
+    rng = np.random.default_rng(42)
+    delays = np.abs(rng.normal(400.0, 64.0, packets))   # giống phân bố Data/results.csv
+    delays_list = delays.tolist()
+
+    print(f"Benchmark metrics tren {packets:,} goi tin tong hop")
+    print(f"{'Cach tinh':<36} {'Thoi gian (s)':>14} {'Tang toc':>10}")
+    print("-" * 62)
+
+    legacy, t_legacy = timed(compute_metrics_python, delays_list)
+    print(f"{'Python thuan (1 lan)':<36} {t_legacy:>14.3f} {'1.0x':>10}")
+
+    vector, t_vector = timed(compute_metrics, delays)
+    print(f"{'NumPy vector hoa (1 lan)':<36} {t_vector:>14.3f} {t_legacy / t_vector:>9.1f}x")
+
+    analyzer = UDPOptimizerAnalyzer()
+    data = {'delay_ms': delays}
+
+    def repeated():
+        for _ in range(REPEAT_CALLS):
+            analyzer.calculate_metrics(data)
+
+    _, t_memo = timed(repeated)
+    print(f"{f'Analyzer, {REPEAT_CALLS} lan goi (memo)':<36} {t_memo:>14.3f} "
+          f"{t_legacy * REPEAT_CALLS / t_memo:>9.1f}x")
+
+    # Kiểm tra 2 cách cho cùng kết quả (phân vị bản Python lấy theo chỉ số, không nội suy)
+    print("-" * 62)
+    for key in ('avg_delay', 'std_delay', 'median_delay', 'percentile_99', 'avg_jitter', 'max_jitter'):
+        print(f"{key:<16} python={legacy[key]:<14.6f} numpy={vector[key]:<14.6f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# Benchmark đường nhận của server: vòng classic (recvfrom + print từng gói)
+# so với chế độ batch (recv_into / recvmmsg vào vùng đệm cấp phát sẵn)
+#
+# Chạy: cd Benchmark && python bench_receive.py
+import contextlib
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+sys.path.insert(0, os.path.join(ROOT, "Common"))
+
+from batch_receiver import HAS_RECVMMSG  # noqa: E402
+from result_writer import AsyncResultWriter, CsvSink  # noqa: E402
+from server import receive_batch, receive_classic  # noqa: E402
+from wire_format import FORMAT_BINARY, FORMAT_TEXT, new_packet, pack_header  # noqa: E402
+
+HOST = "127.0.0.1"
+PORT = 5105              # cổng riêng để không đụng server thật đang chạy
+DURATION = 3.0           # số giây mỗi sender bắn gói
+SENDERS = 2              # số tiến trình gửi (1 tiến trình Python khó làm bão hòa receiver)
+IDLE_TIMEOUT = 0.5       # receiver dừng sau 0.5s không có gói
+
+
+def blast(port, duration, offset, sent, fmt):
+    """Tiến trình gửi: bắn gói (text 'id,send_time' hoặc nhị phân) nhanh nhất có thể"""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.connect((HOST, port))
+    packet = new_packet()
+    packet_id = offset
+    end = time.time() + duration
+    while True:
+        now = time.time()
+        if now >= end:
+            break
+        try:
+            if fmt == FORMAT_BINARY:
+                pack_header(packet, packet_id)
+                s.send(packet)
+            else:
+                s.send(f"{packet_id},{now}".encode())
+        except OSError:
+            pass  # ENOBUFS / ECONNREFUSED khi receiver chưa sẵn sàng
+        packet_id += 1
+    with sent.get_lock():
+        sent.value += packet_id - offset
+    s.close()
+
+
+def run_case(name, receive, fmt=FORMAT_TEXT, **kwargs):
+    """Chạy 1 kịch bản nhận, trả về (số gói, thời gian xử lý, pps)"""
+    sent = multiprocessing.Value("q", 0)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind((HOST, PORT))
+        senders = [multiprocessing.Process(target=blast, args=(PORT, DURATION, i * 10**9, sent, fmt))
+                   for i in range(SENDERS)]
+        for p in senders:
+            p.start()
+
+        with tempfile.TemporaryDirectory() as tmp, \
+                open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            writer = AsyncResultWriter(CsvSink(os.path.join(tmp, "results.csv")))
+            started = time.perf_counter()
+            received = receive(s, writer, timeout=IDLE_TIMEOUT, **kwargs)
+            elapsed = time.perf_counter() - started - IDLE_TIMEOUT
+            writer.close()
+
+        for p in senders:
+            p.join()
+
+    pps = received / elapsed if elapsed > 0 else 0
+    sent_total = sent.value
+    loss = (sent_total - received) / sent_total * 100 if sent_total else 0
+    print(f"{name:<28} {sent_total:>10} {received:>10} {loss:>7.1f}% {elapsed:>9.2f} {pps:>12.0f}")
+    return received, elapsed, pps
+
+
+def main():
+    print(f"Benchmark nhận UDP: {SENDERS} sender x {DURATION:.0f}s -> {HOST}:{PORT}")
+    print(f"{'Che do':<28} {'Da gui':>10} {'Da nhan':>10} {'Mat':>8} {'Thoi gian':>9} {'Goi/giay':>12}")
+    print("-" * 82)
+
+    _, _, base = run_case("classic (print tung goi)", receive_classic)
+    results = [run_case("batch recv_into", receive_batch, use_recvmmsg=False)]
+    names = ["batch recv_into"]
+    if HAS_RECVMMSG:
+        results.append(run_case("batch recvmmsg", receive_batch, use_recvmmsg=True))
+        names.append("batch recvmmsg")
+    results.append(run_case("batch + goi nhi phan", receive_batch, fmt=FORMAT_BINARY))
+    names.append("batch + goi nhi phan")
+
+    print("-" * 82)
+    for (_, _, pps), name in zip(results, names):
+        print(f"{name:<28} nhanh gap {pps / base:.1f} lan so voi classic")
+
+
+if __name__ == "__main__":
+    main()
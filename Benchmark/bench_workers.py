@@ -0,0 +1,74 @@
+# Benchmark khả năng mở rộng của chế độ nhận đa tiến trình SO_REUSEPORT
+# theo số worker (mỗi sender là một flow riêng -> kernel chia đều cho các worker)
+#
+# Chạy: cd Benchmark && python bench_workers.py [so_worker ...]   (mặc định 1 2 4)
+import contextlib
+import csv
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "Server"))
+sys.path.insert(0, os.path.join(ROOT, "Common"))
+
+from bench_receive import HOST, blast  # noqa: E402
+from multi_worker import HAS_REUSEPORT, run_workers  # noqa: E402
+from wire_format import FORMAT_BINARY  # noqa: E402
+
+PORT = 5106
+DURATION = 3.0
+SENDERS = 4               # số flow (tiến trình gửi, mỗi cái một cổng nguồn)
+IDLE_TIMEOUT = 2.0        # đủ dài để worker không dừng trước khi sender bắt đầu
+
+
+def run_case(workers):
+    result = {}
+    sent = multiprocessing.Value("q", 0)
+    with tempfile.TemporaryDirectory() as tmp:
+        def serve():
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result.update(run_workers(workers, HOST, PORT, tmp, os.path.join(tmp, "results.csv"),
+                                          timeout=IDLE_TIMEOUT))
+
+        server = threading.Thread(target=serve)
+        server.start()
+        time.sleep(0.5)  # chờ các worker bind xong
+
+        senders = [multiprocessing.Process(target=blast, args=(PORT, DURATION, i * 10**9, sent, FORMAT_BINARY))
+                   for i in range(SENDERS)]
+        for p in senders:
+            p.start()
+        for p in senders:
+            p.join()
+        server.join()
+
+        # Thời gian nhận thực tế = receive_time cuối - đầu trong file đã trộn
+        with open(os.path.join(tmp, "results.csv"), encoding="utf-8") as f:
+            rows = list(csv.reader(f))[1:]
+        elapsed = float(rows[-1][2]) - float(rows[0][2]) if len(rows) > 1 else 0
+
+    pps = result["total"] / elapsed if elapsed > 0 else 0
+    shares = "/".join(str(c) for c in result["per_worker"])
+    print(f"{workers:>8} {sent.value:>10} {result['total']:>10} {pps:>12.0f}   {shares}")
+
+
+def main():
+    if not HAS_REUSEPORT:
+        print("He dieu hanh khong ho tro SO_REUSEPORT")
+        return
+    counts = [int(a) for a in sys.argv[1:]] or [1, 2, 4]
+    print(f"Benchmark SO_REUSEPORT: {SENDERS} flow x {DURATION:.0f}s, {os.cpu_count()} CPU")
+    print(f"{'Worker':>8} {'Da gui':>10} {'Da nhan':>10} {'Goi/giay':>12}   Chia theo worker")
+    print("-" * 72)
+    for workers in counts:
+        run_case(workers)
+    print("-" * 72)
+    print("Ghi chu: he so mo rong bi gioi han boi so CPU (sender va worker dung chung may).")
+
+
+if __name__ == "__main__":
+    main()
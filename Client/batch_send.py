@@ -0,0 +1,140 @@
+# Gửi gói theo lô từ một bể gói (packet pool) dựng sẵn
+# - Một bytearray chứa BATCH_SIZE gói nhị phân, header tĩnh (magic, version, session,
+#   payload_len) ghi một lần; mỗi lô chỉ ghi lại packet_id + timestamp tại chỗ
+# - Socket connect() một lần: không dựng tuple địa chỉ, kernel không tra route mỗi gói
+# - Linux: sendmmsg qua ctypes (1 syscall đẩy cả lô); nền tảng khác: vòng send() trên memoryview
+# - gso=True (UDP_SEGMENT): các gói của lô vốn nằm liền nhau trong bể -> gửi thẳng cả đoạn bể thành một
+#   siêu datagram, kernel cắt lại thành từng gói (một lượt qua network stack cho tối đa 64 gói);
+#   kernel/đường đi không cắt được (lỗi lúc gửi) thì tắt GSO và gửi tiếp bằng sendmmsg/send()
+import ctypes
+import errno
+import os
+import time
+
+from mmsg import MMsgHdr, build_msgs, load_libc
+from udp_offload import disable_gso, enable_gso, gso_segments
+from wire_format import HEADER_SIZE, pack_header, stamp_header
+
+BATCH_SIZE = 32        # số gói mỗi lần gửi
+
+_sendmmsg = load_libc("sendmmsg", [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int])
+HAS_SENDMMSG = _sendmmsg is not None
+
+# Lỗi khi gửi siêu datagram nghĩa là GSO không dùng được trên đường này (VD thiết bị không có checksum
+# offload -> EIO, đoạn + header > MTU -> EINVAL/EMSGSIZE)
+_GSO_ERRNOS = (errno.EIO, errno.EINVAL, errno.EMSGSIZE, errno.ENOPROTOOPT, errno.EOPNOTSUPP)
+
+
+class BatchSender:
+    """
+    Gửi các lô tối đa batch_size gói nhị phân qua socket UDP đã connect().
+    Timestamp lấy một lần mỗi lô (các gói trong lô rời máy cùng một syscall).
+    """
+
+    def __init__(self, sock, packet_size=HEADER_SIZE, session_id=0, batch_size=BATCH_SIZE,
+                 use_sendmmsg=True, flags=0, gso=False):
+        self.sock = sock
+        self.packet_size = max(packet_size, HEADER_SIZE)
+        self.batch_size = batch_size
+        self.buffer = bytearray(batch_size * self.packet_size)
+        self.view = memoryview(self.buffer)
+        self._slots = [self.view[i * self.packet_size:(i + 1) * self.packet_size] for i in range(batch_size)]
+        for slot in self._slots:
+            pack_header(slot, 0, session_id, 0, 0, flags)
+        self.clock_offset_ns = 0   # cộng vào send_wall_ns (offset đồng hồ server - client, xem clock_sync)
+        self.sent = 0
+        self.refused = 0       # lần gửi bị ECONNREFUSED (server chưa chạy, ICMP port unreachable)
+
+        self.use_sendmmsg = use_sendmmsg and HAS_SENDMMSG
+        if self.use_sendmmsg:
+            self._c_buffer, self._iovecs, self._msgs = build_msgs(self.buffer, batch_size, self.packet_size)
+
+        # Số gói mỗi siêu datagram GSO (0 = tắt); gói đã lớn tới mức một siêu datagram chỉ chứa 1 gói thì bỏ
+        self.gso_segments = 0
+        self.gso_error = None      # lý do GSO bị tắt giữa chừng
+        self.super_datagrams = 0
+        segments = min(gso_segments(self.packet_size), batch_size)
+        if gso and segments > 1 and enable_gso(sock, self.packet_size):
+            self.gso_segments = segments
+        elif gso:
+            self.gso_error = "kernel không hỗ trợ UDP_SEGMENT" if segments > 1 else "gói quá lớn, 1 gói/siêu datagram"
+
+    @property
+    def method(self):
+        if self.gso_segments:
+            return f"GSO ({self.gso_segments} gói/siêu datagram)"
+        return "sendmmsg" if self.use_sendmmsg else "send()"
+
+    def send_batch(self, first_id, count=None):
+        """Gửi count gói (mặc định cả lô) với packet_id first_id, first_id + 1, ...; trả về count"""
+        if count is None:
+            count = self.batch_size
+        wall_ns = time.time_ns() + self.clock_offset_ns
+        mono_ns = time.monotonic_ns()
+        buffer = self.buffer
+        size = self.packet_size
+        for i in range(count):
+            stamp_header(buffer, first_id + i, wall_ns, mono_ns, i * size)
+
+        if self.gso_segments:
+            self._send_gso(count)
+        elif self.use_sendmmsg:
+            self._send_mmsg(count)
+        else:
+            self._send_loop(count)
+        self.sent += count
+        return count
+
+    def _send_gso(self, count):
+        send = self.sock.send
+        view = self.view
+        size = self.packet_size
+        step = self.gso_segments
+        first = 0
+        while first < count:
+            try:
+                send(view[first * size:min(count, first + step) * size])
+            except ConnectionRefusedError:
+                self.refused += 1      # lỗi ICMP chờ sẵn, gói chưa được gửi -> gửi lại như _send_mmsg
+                continue
+            except OSError as e:
+                if e.errno in (errno.EINTR, errno.EAGAIN, errno.ENOBUFS):
+                    continue
+                if e.errno not in _GSO_ERRNOS:
+                    raise
+                self.gso_segments = 0
+                disable_gso(self.sock)
+                self.gso_error = f"lỗi khi gửi ({e.strerror}), chuyển về {self.method}"
+                if self.use_sendmmsg:
+                    self._send_mmsg(count, first)
+                else:
+                    self._send_loop(count, first)
+                return
+            else:
+                self.super_datagrams += 1
+            first += step
+
+    def _send_mmsg(self, count, first=0):
+        fd = self.sock.fileno()
+        done = first
+        while done < count:
+            # sendmmsg có thể gửi thiếu (buffer gửi đầy) -> gửi tiếp phần còn lại
+            n = _sendmmsg(fd, ctypes.byref(self._msgs[done]), count - done, 0)
+            if n < 0:
+                err = ctypes.get_errno()
+                if err == errno.ECONNREFUSED:
+                    self.refused += 1
+                    continue
+                if err in (errno.EINTR, errno.EAGAIN, errno.ENOBUFS):
+                    continue
+                raise OSError(err, os.strerror(err))
+            done += n
+
+    def _send_loop(self, count, first=0):
+        send = self.sock.send
+        slots = self._slots
+        for i in range(first, count):
+            try:
+                send(slots[i])
+            except ConnectionRefusedError:
+                self.refused += 1
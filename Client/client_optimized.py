@@ -1,70 +1,220 @@
 # Client gửi gói có điều chỉnh tốc độ + buffer
 
+import argparse
+import os
 import socket  # Dùng để tạo và thao tác với socket UDP
+import sys
 import time    # Dùng để đo thời gian, tính tốc độ, giới hạn tốc độ gửi
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from wire_format import FLAG_SYNCED, FORMAT_BINARY, FORMATS, encode_text, new_packet, pack_header
+from clock_sync import CLOCK_FILE, SYNC_INTERVAL, ClockSync
+from pacing import PROFILES, SPIN_NS, Pacer, make_profile
+from batch_send import BatchSender
+from socket_tuning import add_tuning_arguments, apply_tuning, describe, tuning_from_args
+from rate_control import MAX_RATE, MIN_RATE, AdaptiveRate, FeedbackListener
+from rate_log import RATE_LOG_FILE
+from profiling import Profiling, add_profiling_arguments
+from udp_offload import MAX_DATAGRAM, parse_size, throughput
+
 SERVER_IP = "127.0.0.1"
 SERVER_PORT = 5005
 
 # Cấu hình hiệu suất
-SEND_BUFFER_SIZE = 65536      # 64 KB buffer gửi
-RECV_BUFFER_SIZE = 65536      # 64 KB buffer nhận (nếu cần)
+TUNING_PROFILE = "buffers-64k"  # 64 KB buffer gửi/nhận (socket_tuning.PROFILES)
 PACKETS_PER_SECOND = 500      # tốc độ gửi (500 gói/giây)
-PACKET_SIZE = 256             # độ dài mỗi gói (byte)
+PACKET_SIZE = 256             # độ dài mỗi gói mặc định (byte, đổi bằng --size)
 DISPLAY_INTERVAL = 2          # in thống kê mỗi 2 giây
+# Công đoạn bấm giờ mỗi lần nhả (--profile-stages); wait gồm thời gian chờ tới deadline
+STAGES = ("wait", "pack", "sendto", "sendmmsg", "report")
+
+parser = argparse.ArgumentParser(description="Client UDP gửi có điều chỉnh tốc độ + buffer")
+parser.add_argument("--format", choices=FORMATS, default=FORMAT_BINARY,
+                    help="binary: header nhị phân ns (mặc định); text: 'id,send_time' kiểu cũ")
+parser.add_argument("--session-id", type=int, default=os.getpid() & 0xFFFFFFFF,
+                    help="id phiên ghi trong header nhị phân (mặc định: pid)")
+parser.add_argument("--rate", type=float, default=PACKETS_PER_SECOND,
+                    help="tốc độ gửi mục tiêu (gói/giây)")
+parser.add_argument("--profile", choices=PROFILES, default="constant",
+                    help="hồ sơ tốc độ: constant, ramp (--rate -> --ramp-to), step (--steps), poisson")
+parser.add_argument("--ramp-to", type=float, help="ramp: tốc độ cuối (mặc định 10 x --rate)")
+parser.add_argument("--ramp-seconds", type=float, default=10.0, help="ramp: thời gian tăng tốc")
+parser.add_argument("--steps", type=lambda v: [float(x) for x in v.split(",")],
+                    help="step: danh sách tốc độ, VD 500,1000,2000")
+parser.add_argument("--step-seconds", type=float, default=5.0, help="step: thời gian mỗi mức")
+parser.add_argument("--burst", type=int, default=1,
+                    help="số gói gửi liền nhau mỗi lần nhả (token bucket), trung bình vẫn đúng --rate")
+parser.add_argument("--spin-us", type=int, default=SPIN_NS // 1000,
+                    help="quay vòng bao nhiêu micro giây cuối trước deadline thay vì sleep (0 = chỉ sleep)")
+parser.add_argument("--size", type=parse_size, default=PACKET_SIZE,
+                    help=f"độ dài mỗi gói: số byte, 64k, hoặc small/mtu/jumbo/max (tối đa {MAX_DATAGRAM}, "
+                         f"mặc định {PACKET_SIZE}); server batch cần --max-size tương ứng")
+parser.add_argument("--sendmmsg", action="store_true",
+                    help="gửi cả burst bằng một lô dựng sẵn (sendmmsg, socket connect), chỉ với --format binary")
+parser.add_argument("--gso", action="store_true",
+                    help="gửi cả burst thành siêu datagram UDP_SEGMENT (kernel cắt thành từng gói, ngụ ý --sendmmsg; "
+                         "kernel không hỗ trợ thì dùng sendmmsg); server nên chạy --gro")
+parser.add_argument("--sync", action="store_true",
+                    help="đo lệch đồng hồ với server (server.py --echo) và hiệu chỉnh timestamp gửi "
+                         "-> delay một chiều đúng cả khi khác máy")
+parser.add_argument("--sync-interval", type=float, default=SYNC_INTERVAL,
+                    help="--sync: đo lại mỗi bao nhiêu giây để ước lượng drift (0 = chỉ đầu/cuối)")
+parser.add_argument("--clock-file", default=CLOCK_FILE,
+                    help="--sync: file JSON ghi offset/drift/RTT (analyze_results.py --clock)")
+parser.add_argument("--adaptive", action="store_true",
+                    help="tự tìm tốc độ cao nhất không mất gói / không tăng độ trễ hàng đợi theo phản hồi của "
+                         "server (server.py --feedback); --rate là tốc độ bắt đầu, bỏ qua --profile")
+parser.add_argument("--min-rate", type=float, default=MIN_RATE, help="--adaptive: tốc độ thấp nhất (gói/giây)")
+parser.add_argument("--max-rate", type=float, default=MAX_RATE, help="--adaptive: tốc độ cao nhất (gói/giây)")
+parser.add_argument("--rate-log", default=RATE_LOG_FILE,
+                    help="--adaptive: file CSV quỹ đạo tốc độ/độ trễ (analyze_results.py --rate-log)")
+add_tuning_arguments(parser, default=TUNING_PROFILE)
+add_profiling_arguments(parser)
+args = parser.parse_args()
+try:
+    tuning = tuning_from_args(args)
+except (OSError, ValueError) as e:
+    parser.error(f"--tuning: {e}")
+args.sendmmsg = args.sendmmsg or args.gso
+if args.sendmmsg and args.format != FORMAT_BINARY:
+    parser.error("--sendmmsg/--gso chỉ dùng với --format binary")
+if args.burst < 1:
+    parser.error("--burst: cần ít nhất 1 gói mỗi lần nhả")
+if args.adaptive:
+    if not 0 < args.min_rate <= args.max_rate:
+        parser.error("--adaptive: cần 0 < --min-rate <= --max-rate")
+    profile = AdaptiveRate(args.rate, args.min_rate, args.max_rate)
+else:
+    try:
+        profile = make_profile(args.profile, args.rate, args.ramp_to, args.ramp_seconds, args.steps,
+                               args.step_seconds)
+    except ValueError as e:
+        parser.error(str(e))
+server_addr = (SERVER_IP, SERVER_PORT)
 
 # Tạo socket UDP
 client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 # AF_INET: dùng IPv4
 # SOCK_DGRAM: dùng giao thức UDP (gửi theo datagram, không đảm bảo thứ tự hay độ tin cậy)
 
-# Điều chỉnh buffer
+# Điều chỉnh buffer (và các tùy chọn khác của hồ sơ --tuning), in giá trị kernel thực sự áp dụng
 # Buffer lớn giúp tránh mất gói khi tốc độ gửi cao hoặc mạng trễ
-client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER_SIZE)
-client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECV_BUFFER_SIZE)
+print(f"Tinh chỉnh socket: {describe(tuning, apply_tuning(client_socket, tuning))}")
 
-print(f"Client đang gửi với tốc độ {PACKETS_PER_SECOND} gói/giây, mỗi gói {PACKET_SIZE} bytes.")
+print(f"Client đang gửi theo hồ sơ {profile.describe()}, burst {args.burst}, "
+      f"mỗi gói {args.size} bytes ({args.format}).")
 print("Nhấn Ctrl+C để dừng...")
 
 packet_id = 0                     # Số thứ tự gói gửi đi
 start_time = time.time()          # Thời điểm bắt đầu gửi
 last_display = start_time         # Thời điểm lần cuối in thống kê
-
-
-# Khoảng trễ giữa 2 gói để đạt tốc độ mong muốn
-interval = 1.0 / PACKETS_PER_SECOND   # VD: 500 gói/giây → mỗi gói cách nhau 0.002 giây
+last_display_count = 0
+
+# Lập lịch theo deadline tuyệt đối (thay cho time.sleep(1 / PACKETS_PER_SECOND) sau mỗi gói,
+# vốn cộng dồn thời gian tạo/gửi gói và độ phân giải thô của sleep)
+pacer = Pacer(profile, burst=args.burst, spin_ns=args.spin_us * 1000)
+
+# Gói nhị phân: cấp phát 1 lần, mỗi vòng chỉ ghi đè header (id + timestamp ns)
+packet = new_packet(args.size)
+binary = args.format == FORMAT_BINARY
+
+# Hiệu chỉnh đồng hồ: send_time = đồng hồ client + offset (server - client)
+clock = None
+offset_ns = 0
+if args.sync:
+    clock = ClockSync(SERVER_IP, SERVER_PORT, session_id=args.session_id)
+    if clock.measure() is None:
+        print(" Không đo được đồng hồ (server chưa chạy với --echo?) - gửi timestamp chưa hiệu chỉnh")
+        clock = None
+    else:
+        offset_ns = clock.offset_at(time.time_ns())
+        print(f" Đồng bộ đồng hồ: {clock.describe()}")
+        clock.start(args.sync_interval)
+flags = FLAG_SYNCED if clock is not None else 0
+
+sender = None
+if args.sendmmsg:
+    client_socket.connect(server_addr)
+    sender = BatchSender(client_socket, args.size, args.session_id, batch_size=args.burst, flags=flags, gso=args.gso)
+    sender.clock_offset_ns = offset_ns
+    print(f" Gửi theo lô bằng {sender.method}" + (f" - không dùng được GSO: {sender.gso_error}"
+                                                   if sender.gso_error else ""))
+
+# Phản hồi của server về cùng socket (cổng nguồn của client) -> luồng nền điều chỉnh profile.rate
+listener = None
+if args.adaptive:
+    listener = FeedbackListener(client_socket, profile, lambda: packet_id, args.rate_log, args.session_id).start()
+profiling = Profiling(args, STAGES, waits=("wait",))
+stages = profiling.stages
 try:
     while True:
-        # Ghi lại thời điểm gửi
-        send_time = time.time()
-
-        # Tạo nội dung gói tin gồm ID và thời gian gửi
-        message = f"{packet_id},{send_time}"
-
-        # Chuyển chuỗi sang bytes, và pad thêm ký tự '-' để đủ PACKET_SIZE byte
-        # (Giúp server dễ xử lý gói có kích thước cố định)
-        data = message.encode().ljust(PACKET_SIZE, b'-')
-        
-        # Gửi gói tin UDP tới server
-        client_socket.sendto(data, (SERVER_IP, SERVER_PORT))
-
-        # Tăng ID cho gói kế tiếp
-        packet_id += 1
-
-        # Giới hạn tốc độ gửi
-        time.sleep(interval) # Dừng lại trong 'interval' giây để đảm bảo đúng tốc độ mong muốn
+        timed = stages is not None and stages.tick()
+        # Chờ tới deadline kế tiếp (sleep + spin), nhận số gói được gửi ngay
+        count = pacer.wait()
+        if timed:
+            stages.lap("wait")
+        if sender is not None:
+            packet_id += sender.send_batch(packet_id, count)
+            count = 0
+            if timed:
+                stages.lap("sendmmsg")
+        for _ in range(count):
+            if binary:
+                pack_header(packet, packet_id, args.session_id, time.time_ns() + offset_ns, flags=flags)
+                data = packet
+            else:
+                # Định dạng cũ: "ID,thời gian gửi", pad thêm '-' để đủ args.size byte
+                # (Giúp server dễ xử lý gói có kích thước cố định)
+                data = encode_text(packet_id, time.time() + offset_ns / 1e9, args.size)
+            if timed:
+                stages.lap("pack")
+
+            # Gửi gói tin UDP tới server
+            client_socket.sendto(data, server_addr)
+            if timed:
+                stages.lap("sendto")
+
+            # Tăng ID cho gói kế tiếp
+            packet_id += 1
 
         now = time.time()
         if now - last_display >= DISPLAY_INTERVAL:
-            elapsed = now - start_time                 # Tổng thời gian chạy
-            rate = packet_id / elapsed                 # Tính tốc độ trung bình (gói/giây)
-            print(f" Đã gửi {packet_id} gói ({rate:.1f} gói/giây)")
+            rate = (packet_id - last_display_count) / (now - last_display)   # tốc độ thực trong kỳ
+            p50, p99, worst = pacer.jitter_summary()
+            print(f" Đã gửi {packet_id} gói | đạt {rate:.1f} / mục tiêu {pacer.target_rate():.1f} gói/giây"
+                  f" ({rate * args.size / 1e6:.2f} MB/s datagram) | lệch lịch p50 {p50:.0f} p99 {p99:.0f} max {worst:.0f} µs")
+            if listener is not None and not listener.received:
+                print(" Chưa nhận phản hồi nào - server có chạy với --feedback không?")
             last_display = now                         # Cập nhật mốc hiển thị mới
+            last_display_count = packet_id
+            if clock is not None:
+                # Offset mới nhất từ luồng đo nền, ngoại suy theo drift
+                offset_ns = clock.offset_at(time.time_ns())
+                if sender is not None:
+                    sender.clock_offset_ns = offset_ns
+        if timed:
+            stages.lap("report")
 
 except KeyboardInterrupt:
     duration = time.time() - start_time
-    print(f"\n Đã gửi {packet_id} gói trong {duration:.2f} giây.")
+    p50, p99, worst = pacer.jitter_summary()
+    print(f"\n Đã gửi {packet_id} gói trong {duration:.2f} giây ({packet_id / duration:.1f} gói/giây, "
+          f"{throughput(packet_id * args.size, duration):.2f} MB/s datagram).")
+    if sender is not None and sender.super_datagrams:
+        print(f" GSO: {sender.super_datagrams} siêu datagram (~{packet_id / sender.super_datagrams:.1f} gói/lần gửi)")
+    print(f" Lệch so với lịch gửi: p50 {p50:.0f} µs, p99 {p99:.0f} µs, max {worst:.0f} µs, "
+          f"đồng bộ lại {pacer.resyncs} lần")
 
 finally:
+    if listener is not None:
+        listener.stop()
+        print(f" Điều khiển tốc độ: {profile.summary()} -> {args.rate_log}")
+    if clock is not None:
+        clock.stop()
+        clock.measure()
+        clock.save(args.clock_file)
+        print(f" Đồng hồ: {clock.describe()} -> {args.clock_file}")
+    for line in profiling.finish(packet_id, "lần nhả"):
+        print(f" {line}")
     client_socket.close()
     print("Client dừng gửi.")
\ No newline at end of file
@@ -1,27 +1,95 @@
 # Client gửi gói với tốc độ cao (chưa tối ưu)
 
+import argparse
+import os
 import socket
+import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from wire_format import FORMAT_BINARY, FORMATS, new_packet, pack_header
+from batch_send import BATCH_SIZE, BatchSender
+from socket_tuning import add_tuning_arguments, apply_tuning, describe, tuning_from_args
+from profiling import Profiling, add_profiling_arguments
+
 SERVER_IP = "127.0.0.1"
 SERVER_PORT = 5005
+# Công đoạn bấm giờ mỗi gói (--profile-stages): text = time + format, binary = pack, --batch = send_batch
+STAGES = ("time", "format", "pack", "sendto", "send_batch")
+
+parser = argparse.ArgumentParser(description="Client UDP gửi tốc độ tối đa (chưa tối ưu)")
+parser.add_argument("--format", choices=FORMATS, default=FORMAT_BINARY,
+                    help="binary: header nhị phân ns (mặc định); text: 'id,send_time' kiểu cũ")
+parser.add_argument("--session-id", type=int, default=os.getpid() & 0xFFFFFFFF,
+                    help="id phiên ghi trong header nhị phân (mặc định: pid)")
+parser.add_argument("--batch", type=int, nargs="?", const=BATCH_SIZE, default=0,
+                    help=f"chế độ tốc độ tối đa: bể gói dựng sẵn + socket connect + gửi theo lô "
+                         f"(mặc định {BATCH_SIZE} gói/lô, chỉ với --format binary)")
+parser.add_argument("--no-sendmmsg", action="store_true",
+                    help="chế độ --batch: dùng vòng send() thay cho sendmmsg")
+add_tuning_arguments(parser)
+add_profiling_arguments(parser)
+args = parser.parse_args()
+try:
+    tuning = tuning_from_args(args)
+except (OSError, ValueError) as e:
+    parser.error(f"--tuning: {e}")
+if args.batch and args.format != FORMAT_BINARY:
+    parser.error("--batch chỉ dùng với --format binary")
 
 # Tạo socket UDP
 client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+if tuning != {"name": "default"}:   # mặc định: giữ nguyên socket như bản chưa tối ưu
+    print(f"Tinh chỉnh socket: {describe(tuning, apply_tuning(client_socket, tuning))}")
 
 packet_id = 0 #id thứ tự gói tin
 print("Client chưa tối ưu đang gửi gói liên tục... Nhấn Ctrl+C để dừng.")
 
+packet = new_packet()  # gói nhị phân chỉ gồm header, ghi đè tại chỗ mỗi vòng
+profiling = Profiling(args, STAGES)
+stages = profiling.stages
 try:
     start_time = time.time()
-    while True:
-        send_time = time.time() #Lấy thời điểm bắt đầu gửi tính bằng giâyy
-        message = f"{packet_id},{send_time}"  #gộp thành chuỗi "ID, time"
-        client_socket.sendto(message.encode(), (SERVER_IP, SERVER_PORT)) #gửi chuỗi vừa gộp đến server
-        packet_id += 1       
+    if args.batch:
+        # Đo chính network stack: không cấp phát, 1 syscall mỗi lô
+        client_socket.connect((SERVER_IP, SERVER_PORT))
+        sender = BatchSender(client_socket, session_id=args.session_id, batch_size=args.batch,
+                             use_sendmmsg=not args.no_sendmmsg)
+        print(f"Chế độ lô: {args.batch} gói/lô qua {'sendmmsg' if sender.use_sendmmsg else 'send()'}")
+        while True:
+            timed = stages is not None and stages.tick()
+            packet_id += sender.send_batch(packet_id)
+            if timed:
+                stages.lap("send_batch")
+    elif args.format == FORMAT_BINARY:
+        while True:
+            timed = stages is not None and stages.tick()
+            pack_header(packet, packet_id, args.session_id)  # id + timestamp ns
+            if timed:
+                stages.lap("pack")
+            client_socket.sendto(packet, (SERVER_IP, SERVER_PORT))
+            if timed:
+                stages.lap("sendto")
+            packet_id += 1
+    else:
+        while True:
+            timed = stages is not None and stages.tick()
+            send_time = time.time() #Lấy thời điểm bắt đầu gửi tính bằng giâyy
+            if timed:
+                stages.lap("time")
+            message = f"{packet_id},{send_time}"  #gộp thành chuỗi "ID, time"
+            data = message.encode()
+            if timed:
+                stages.lap("format")
+            client_socket.sendto(data, (SERVER_IP, SERVER_PORT)) #gửi chuỗi vừa gộp đến server
+            if timed:
+                stages.lap("sendto")
+            packet_id += 1       
 except KeyboardInterrupt:
     duration = time.time() - start_time
-    print(f"\nĐã gửi {packet_id} gói trong {duration:.2f} giây.")
+    print(f"\nĐã gửi {packet_id} gói trong {duration:.2f} giây ({packet_id / duration:.0f} gói/giây).")
 finally:
+    for line in profiling.finish(packet_id if args.batch else None, "lô" if args.batch else "gói"):
+        print(line)
     client_socket.close()
     print("Client dừng gửi")
\ No newline at end of file
@@ -0,0 +1,213 @@
+# Bộ sinh tải đa tiến trình: N sender song song, mỗi sender là một flow riêng
+# - Mỗi worker: socket riêng (cổng nguồn riêng -> SO_REUSEPORT ở server chia được),
+#   session_id riêng, dải packet_id riêng [i * ID_STRIDE, ...), phần tốc độ = rate / N
+# - Khởi động đồng bộ: mọi worker dựng xong socket/bể gói rồi cùng chờ ở một Barrier,
+#   sau đó gửi trong đúng `--duration` giây theo Pacer (deadline tuyệt đối) + BatchSender
+# - Kết thúc: gộp số gói đã gửi / tốc độ đạt được của từng worker và ghi manifest JSON
+#   để analyzer tính mất gói thật theo từng flow
+#
+# Chạy: python load_generator.py --workers 4 --rate 20000 --duration 10
+import argparse
+import multiprocessing
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+from batch_send import BatchSender
+from manifest import write_manifest
+from pacing import PROFILES, SPIN_NS, Pacer, make_profile
+from socket_tuning import add_tuning_arguments, apply_tuning, describe, make_record, tuning_from_args
+from udp_offload import parse_size, throughput
+
+SERVER_IP = "127.0.0.1"
+SERVER_PORT = 5005
+PACKET_SIZE = 256
+ID_STRIDE = 1 << 32           # dải packet_id của worker i bắt đầu tại i * ID_STRIDE
+START_TIMEOUT = 10            # giây chờ tất cả worker sẵn sàng
+MANIFEST_FILE = "load_manifest.json"
+
+
+def _scaled(value, share):
+    return None if value is None else value * share
+
+
+def _worker(index, config, barrier, results):
+    """Tiến trình gửi: dựng socket + bể gói, chờ hiệu lệnh chung, gửi trong `duration` giây"""
+    share = 1.0 / config["workers"]
+    session_id = (config["session_base"] + index) & 0xFFFFFFFF
+    first_id = index * config["id_stride"]
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    applied = apply_tuning(sock, config["tuning"])
+    sock.connect((config["host"], config["port"]))
+    source_port = sock.getsockname()[1]
+    sender = BatchSender(sock, config["packet_size"], session_id, batch_size=config["burst"],
+                         use_sendmmsg=config["sendmmsg"], gso=config["gso"])
+    if sender.gso_error and index == 0:
+        print(f"[W{index}] Không dùng được GSO ({sender.gso_error}), gửi bằng {sender.method}")
+    steps = [r * share for r in config["steps"]] if config["steps"] else None
+    profile = make_profile(config["profile"], config["rate"] * share, _scaled(config["ramp_to"], share),
+                           config["ramp_seconds"], steps, config["step_seconds"])
+
+    packet_id = first_id
+    elapsed = 0.0
+    p99 = 0.0
+    try:
+        barrier.wait(START_TIMEOUT)
+        pacer = Pacer(profile, burst=config["burst"], spin_ns=config["spin_ns"])
+        while pacer.elapsed() < config["duration"]:
+            packet_id += sender.send_batch(packet_id, pacer.wait())
+        elapsed = pacer.elapsed()
+        p99 = pacer.jitter_summary()[1]
+    except KeyboardInterrupt:
+        pass
+    except threading.BrokenBarrierError:
+        print(f"[W{index}] Không đồng bộ được lúc khởi động, bỏ qua worker này")
+    finally:
+        sock.close()
+        sent = packet_id - first_id
+        results.put({
+            "worker": index,
+            "session_id": session_id,
+            "source_port": source_port,
+            "first_id": first_id,
+            "sent": sent,
+            "elapsed": round(elapsed, 6),
+            "rate": round(sent / elapsed, 1) if elapsed > 0 else 0,
+            "target_rate": config["rate"] * share,
+            "refused": sender.refused,
+            "super_datagrams": sender.super_datagrams,
+            "lateness_p99_us": round(p99, 1),
+            "applied": applied,
+        })
+
+
+def run(config):
+    """Chạy N worker đồng bộ, trả về danh sách thống kê từng flow (theo thứ tự worker)"""
+    workers = config["workers"]
+    barrier = multiprocessing.Barrier(workers + 1)   # +1: tiến trình chính nhả hiệu lệnh
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=_worker, name=f"udp-sender-{i}",
+                                     args=(i, config, barrier, results))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+
+    flows = []
+    try:
+        barrier.wait(START_TIMEOUT)
+        print(f"[LOAD] Bắt đầu: {workers} flow x {config['rate'] / workers:g} gói/giây "
+              f"trong {config['duration']:g} giây")
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        print("\n[LOAD] Nhận Ctrl+C, chờ các worker báo cáo.")
+        for p in procs:
+            p.join()
+    except threading.BrokenBarrierError:
+        print("[LOAD] Có worker không khởi động được")
+        for p in procs:
+            p.join()
+
+    for _ in range(workers):
+        try:
+            flows.append(results.get(timeout=1))
+        except queue.Empty:
+            break  # worker lỗi, không gửi được thống kê
+    return sorted(flows, key=lambda f: f["worker"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bộ sinh tải UDP đa tiến trình (mỗi worker một flow)")
+    parser.add_argument("--host", default=SERVER_IP)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="số tiến trình gửi (flow)")
+    parser.add_argument("--rate", type=float, default=2000, help="tổng tốc độ mục tiêu (gói/giây), chia đều cho các worker")
+    parser.add_argument("--duration", type=float, default=10, help="thời gian gửi (giây)")
+    parser.add_argument("--size", type=parse_size, default=PACKET_SIZE,
+                        help="kích thước mỗi gói: số byte, 64k, hoặc small/mtu/jumbo/max")
+    parser.add_argument("--profile", choices=PROFILES, default="constant")
+    parser.add_argument("--ramp-to", type=float, help="ramp: tổng tốc độ cuối")
+    parser.add_argument("--ramp-seconds", type=float, default=10.0)
+    parser.add_argument("--steps", type=lambda v: [float(x) for x in v.split(",")],
+                        help="step: danh sách tổng tốc độ, VD 2000,4000,8000")
+    parser.add_argument("--step-seconds", type=float, default=5.0)
+    parser.add_argument("--burst", type=int, default=8, help="số gói mỗi lần nhả (1 lô sendmmsg)")
+    parser.add_argument("--spin-us", type=int, default=SPIN_NS // 1000)
+    parser.add_argument("--no-sendmmsg", action="store_true", help="dùng vòng send() thay cho sendmmsg")
+    parser.add_argument("--gso", action="store_true",
+                        help="gửi mỗi burst thành một siêu datagram UDP_SEGMENT (server nên chạy --gro)")
+    parser.add_argument("--session-base", type=int, default=os.getpid(),
+                        help="session_id của worker i = session_base + i (mặc định: pid)")
+    parser.add_argument("--id-stride", type=int, default=ID_STRIDE,
+                        help="khoảng cách dải packet_id giữa các worker (0 = mọi flow bắt đầu từ 0, "
+                             "chỉ dùng với server --mode async vốn tách flow theo session)")
+    parser.add_argument("--manifest", default=MANIFEST_FILE, help="file manifest JSON ghi kết quả gửi")
+    add_tuning_arguments(parser, default="buffers-1m")
+    args = parser.parse_args()
+    try:
+        tuning = tuning_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(f"--tuning: {e}")
+    if args.workers < 1:
+        parser.error("--workers: cần ít nhất 1 tiến trình gửi")
+    if args.burst < 1:
+        parser.error("--burst: cần ít nhất 1 gói mỗi lần nhả")
+    try:
+        # Kiểm tra các mức tốc độ trước khi chia cho worker (worker dựng hồ sơ với phần tốc độ của nó)
+        make_profile(args.profile, args.rate, args.ramp_to, args.ramp_seconds, args.steps, args.step_seconds)
+    except ValueError as e:
+        parser.error(str(e))
+
+    config = {
+        "host": args.host,
+        "port": args.port,
+        "workers": args.workers,
+        "rate": args.rate,
+        "duration": args.duration,
+        "packet_size": args.size,
+        "tuning": tuning,
+        "profile": args.profile,
+        "ramp_to": args.ramp_to,
+        "ramp_seconds": args.ramp_seconds,
+        "steps": args.steps,
+        "step_seconds": args.step_seconds,
+        "burst": args.burst,
+        "spin_ns": args.spin_us * 1000,
+        "sendmmsg": not args.no_sendmmsg,
+        "gso": args.gso,
+        "session_base": args.session_base,
+        "id_stride": args.id_stride,
+    }
+    started = time.time()
+    flows = run(config)
+    # Mọi worker cùng hồ sơ -> ghi giá trị hiệu lực một lần (worker đầu tiên) vào manifest
+    applied = [f.pop("applied") for f in flows]
+    record = make_record("client", tuning, applied[0]) if applied else None
+    if record is not None:
+        print(f"[TUNING] {describe(tuning, applied[0])}")
+
+    print(f"\n{'Worker':>6} {'Session':>10} {'Cổng':>6} {'Đã gửi':>10} {'Gói/giây':>10} {'Mục tiêu':>10} {'p99 lệch':>10}")
+    for f in flows:
+        print(f"{f['worker']:>6} {f['session_id']:>10} {f['source_port']:>6} {f['sent']:>10} "
+              f"{f['rate']:>10.0f} {f['target_rate']:>10.0f} {f['lateness_p99_us']:>8.0f}µs")
+    total = sum(f["sent"] for f in flows)
+    elapsed = max((f["elapsed"] for f in flows), default=0)
+    print(f"[LOAD] Tổng: {total} gói, {total / elapsed if elapsed else 0:.0f} gói/giây "
+          f"({throughput(total * args.size, elapsed):.2f} MB/s datagram, mục tiêu {args.rate:g} gói/giây)")
+    super_datagrams = sum(f["super_datagrams"] for f in flows)
+    if super_datagrams:
+        print(f"[LOAD] GSO: {super_datagrams} siêu datagram (~{total / super_datagrams:.1f} gói/lần gửi)")
+
+    write_manifest(args.manifest, flows, server=f"{args.host}:{args.port}", started=started,
+                   duration=args.duration, packet_size=args.size, target_rate=args.rate,
+                   id_stride=args.id_stride, tuning=record)
+    print(f"[LOAD] Đã ghi manifest: {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
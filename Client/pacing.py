@@ -0,0 +1,151 @@
+# Bộ điều tốc gửi gói (pacing) chính xác
+# - Lập lịch theo deadline tuyệt đối trên time.perf_counter_ns(): thời gian tạo/gửi gói
+#   không cộng dồn thành trễ (khác với time.sleep(1/rate) sau mỗi gói)
+# - Chờ lai: sleep tới sát deadline rồi quay vòng (spin) phần còn lại để tránh
+#   độ phân giải thô của sleep (~0.1 ms trên Linux, tới ~15 ms trên Windows)
+# - Burst kiểu token bucket: mỗi lần nhả `burst` gói liền nhau, trung bình vẫn đúng rate;
+#   nếu bị trễ quá nhiều (quá MAX_BACKLOG lần nhả) thì đồng bộ lại thay vì gửi dồn vô hạn
+# - Hồ sơ tốc độ: constant, ramp, step, poisson
+import random
+import sys
+import time
+
+from hdr_histogram import HdrHistogram
+
+NS_PER_SEC = 1_000_000_000
+SPIN_NS = 2_000_000 if sys.platform == "win32" else 200_000   # ngưỡng chuyển từ sleep sang spin
+MAX_BACKLOG = 8             # số lần nhả tối đa được gửi bù khi bị trễ
+
+
+class ConstantRate:
+    def __init__(self, rate):
+        self.rate = rate
+
+    def rate_at(self, elapsed):
+        return self.rate
+
+    def gap_ns(self, elapsed, burst):
+        return burst * NS_PER_SEC / self.rate_at(elapsed)
+
+    def describe(self):
+        return f"constant {self.rate:g} goi/s"
+
+
+class RampRate(ConstantRate):
+    """Tăng (hoặc giảm) tuyến tính từ start tới end trong `seconds` giây rồi giữ nguyên"""
+
+    def __init__(self, start, end, seconds):
+        super().__init__(start)
+        self.end = end
+        self.seconds = seconds
+
+    def rate_at(self, elapsed):
+        if elapsed >= self.seconds:
+            return self.end
+        return self.rate + (self.end - self.rate) * elapsed / self.seconds
+
+    def describe(self):
+        return f"ramp {self.rate:g} -> {self.end:g} goi/s trong {self.seconds:g}s"
+
+
+class StepRate(ConstantRate):
+    """Lần lượt từng mức tốc độ, mỗi mức giữ `seconds` giây (mức cuối giữ mãi)"""
+
+    def __init__(self, rates, seconds):
+        super().__init__(rates[0])
+        self.rates = rates
+        self.seconds = seconds
+
+    def rate_at(self, elapsed):
+        return self.rates[min(int(elapsed // self.seconds), len(self.rates) - 1)]
+
+    def describe(self):
+        return f"step {'/'.join(f'{r:g}' for r in self.rates)} goi/s, moi muc {self.seconds:g}s"
+
+
+class PoissonRate(ConstantRate):
+    """Gói đến theo quá trình Poisson: khoảng cách giữa các lần nhả ~ phân phối mũ"""
+
+    def __init__(self, rate, seed=None):
+        super().__init__(rate)
+        self._random = random.Random(seed)
+
+    def gap_ns(self, elapsed, burst):
+        return self._random.expovariate(self.rate / burst) * NS_PER_SEC
+
+    def describe(self):
+        return f"poisson trung binh {self.rate:g} goi/s"
+
+
+class Pacer:
+    def __init__(self, profile, burst=1, spin_ns=SPIN_NS, max_backlog=MAX_BACKLOG):
+        self.profile = profile
+        self.burst = burst
+        self.spin_ns = spin_ns
+        self.max_backlog = max_backlog
+        self.start_ns = time.perf_counter_ns()
+        self.deadline_ns = self.start_ns
+        self.lateness = HdrHistogram()   # độ trễ so với deadline của mỗi lần nhả (ns)
+        self.releases = 0
+        self.resyncs = 0
+
+    def wait(self):
+        """Chờ tới deadline kế tiếp, trả về số gói được gửi ngay (= burst)"""
+        deadline = self.deadline_ns
+        now = time.perf_counter_ns()
+        remaining = deadline - now
+        if remaining > self.spin_ns:
+            time.sleep((remaining - self.spin_ns) / NS_PER_SEC)
+        while now < deadline:
+            now = time.perf_counter_ns()
+
+        self.lateness.record(now - deadline)
+        self.releases += 1
+
+        # Deadline kế tiếp tính từ deadline trước (tuyệt đối), không từ lúc thức dậy
+        gap = self.profile.gap_ns((deadline - self.start_ns) / NS_PER_SEC, self.burst)
+        self.deadline_ns = deadline + int(gap)
+        if now - self.deadline_ns > self.max_backlog * gap:
+            self.deadline_ns = now  # trễ quá xa: bỏ phần nợ, đồng bộ lại
+            self.resyncs += 1
+        return self.burst
+
+    def elapsed(self):
+        return (time.perf_counter_ns() - self.start_ns) / NS_PER_SEC
+
+    def target_rate(self):
+        return self.profile.rate_at(self.elapsed())
+
+    def jitter_summary(self):
+        """p50/p99/max độ trễ gửi so với lịch (micro giây)"""
+        p50, p99 = self.lateness.values_at_quantiles((0.5, 0.99))
+        return p50 / 1000, p99 / 1000, (self.lateness.max or 0) / 1000
+
+
+def _check_rates(option, rates):
+    bad = [r for r in rates if not r > 0]
+    if bad:
+        raise ValueError(f"{option}: tốc độ phải > 0 gói/giây (nhận {', '.join(f'{r:g}' for r in bad)})")
+
+
+def make_profile(name, rate, ramp_to=None, ramp_seconds=10.0, steps=None, step_seconds=5.0):
+    """
+    Tạo hồ sơ tốc độ từ tham số dòng lệnh; ValueError nếu có mức tốc độ <= 0 (khoảng cách gói vô hạn)
+    hoặc step_seconds <= 0 (không xác định được mức hiện tại)
+    """
+    if name == "ramp":
+        end = ramp_to if ramp_to is not None else rate * 10
+        _check_rates("--rate/--ramp-to", [rate, end])
+        return RampRate(rate, end, ramp_seconds)
+    if name == "step":
+        _check_rates("--steps", steps or [rate])
+        if not step_seconds > 0:
+            raise ValueError(f"--step-seconds: thời gian mỗi mức phải > 0 giây (nhận {step_seconds:g})")
+        return StepRate(steps or [rate], step_seconds)
+    _check_rates("--rate", [rate])
+    if name == "poisson":
+        return PoissonRate(rate)
+    return ConstantRate(rate)
+
+
+PROFILES = ("constant", "ramp", "step", "poisson")
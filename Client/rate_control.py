@@ -0,0 +1,180 @@
+# Điều khiển tốc độ gửi vòng kín theo phản hồi của server (server.py --feedback, client --adaptive)
+# - AdaptiveRate là một hồ sơ tốc độ của Pacer: bộ điều khiển đổi `rate`, Pacer dùng ngay ở lần nhả sau
+# - AIMD có khởi động nhanh:
+#     khởi động: x START_GAIN mỗi phản hồi tới lần nghẽn đầu tiên
+#     sau đó:    + ADDITIVE_FRACTION tốc độ hiện tại (ít nhất MIN_STEP gói/s) mỗi phản hồi
+#     mất gói > LOSS_THRESHOLD %:                 x LOSS_BACKOFF
+#     hàng đợi (p50 - độ trễ nền) > QUEUE_THRESHOLD_MS và đang tăng (gradient EWMA > 0): x DELAY_BACKOFF
+#     không có phản hồi FEEDBACK_TIMEOUT giây:    x LOSS_BACKOFF (chỉ sau phản hồi đầu tiên; trước đó giữ
+#                                                 tốc độ ban đầu - server có thể chưa bật --feedback)
+#   sau mỗi lần giảm giữ nguyên HOLD_FEEDBACKS phản hồi (phản hồi đang trên đường về còn phản ánh tốc độ cũ,
+#   không giảm lần nữa vì cùng một đợt nghẽn)
+# - Độ trễ nền = min độ trễ nhỏ nhất của BASE_WINDOW phản hồi gần nhất: lệch đồng hồ hai máy
+#   triệt tiêu khi lấy hiệu nên không cần --sync
+# - Client gửi không kịp mục tiêu (máy client là nút thắt) thì không tăng tiếp
+# - FeedbackListener: luồng nền đọc phản hồi trên chính socket gửi, ghi quỹ đạo vào RateLog
+import select
+import socket
+import threading
+import time
+from collections import deque
+
+from pacing import ConstantRate
+from rate_log import RateLog
+from wire_format import parse_feedback
+
+LOSS_THRESHOLD = 1.0        # % mất gói trong một khoảng coi là nghẽn
+QUEUE_THRESHOLD_MS = 2.0    # độ trễ xếp hàng coi là hàng đợi đang đầy
+START_GAIN = 1.25
+ADDITIVE_FRACTION = 0.02
+MIN_STEP = 10               # gói/s
+LOSS_BACKOFF = 0.7
+DELAY_BACKOFF = 0.9
+HOLD_FEEDBACKS = 3
+BASE_WINDOW = 100
+EWMA_WEIGHT = 0.3           # trọng số mẫu mới của độ trễ xếp hàng làm mượt
+FEEDBACK_TIMEOUT = 1.0      # giây
+CLIENT_LIMIT = 0.9          # gửi thật < 90% lịch gửi -> client là nút thắt
+SENT_WINDOW = 5             # số phản hồi gần nhất dùng để so số gói gửi thật với lịch gửi
+MIN_RATE = 100
+MAX_RATE = 200000
+POLL_INTERVAL = 0.05        # giây chờ mỗi lần trên luồng nghe
+
+
+class AdaptiveRate(ConstantRate):
+    def __init__(self, start, min_rate=MIN_RATE, max_rate=MAX_RATE):
+        super().__init__(max(min_rate, min(start, max_rate)))
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.slow_start = True
+        self.hold = 0
+        self.base = deque(maxlen=BASE_WINDOW)
+        self.queue_ewma = None
+        self.feedbacks = 0
+        self.decreases = {"mat goi": 0, "hang doi": 0, "het han": 0}
+        self.peak = self.rate
+
+    def describe(self):
+        return f"adaptive {self.min_rate:g}..{self.max_rate:g} goi/s (bat dau {self.rate:g})"
+
+    def _decrease(self, factor, cause):
+        self.rate = max(self.min_rate, self.rate * factor)
+        self.slow_start = False
+        self.hold = HOLD_FEEDBACKS
+        self.decreases[cause] += 1
+        return f"giam ({cause})"
+
+    def on_feedback(self, loss_pct, min_ms, p50_ms, sent_ratio):
+        """
+        Một phản hồi -> cập nhật `rate`; trả về (hành động, độ trễ xếp hàng ms).
+        sent_ratio: số gói gửi thật / số gói theo các mục tiêu đã đặt, trong vài phản hồi gần nhất.
+        """
+        self.feedbacks += 1
+        self.base.append(min_ms)
+        queue_ms = max(0.0, p50_ms - min(self.base))
+        previous = self.queue_ewma
+        self.queue_ewma = queue_ms if previous is None else \
+            (1 - EWMA_WEIGHT) * previous + EWMA_WEIGHT * queue_ms
+        growing = previous is not None and self.queue_ewma > previous
+
+        if loss_pct > LOSS_THRESHOLD and not self.hold:
+            action = self._decrease(LOSS_BACKOFF, "mat goi")
+        elif queue_ms > QUEUE_THRESHOLD_MS and growing and not self.hold:
+            action = self._decrease(DELAY_BACKOFF, "hang doi")
+        elif self.hold:
+            self.hold -= 1
+            action = "giu"
+        elif sent_ratio < CLIENT_LIMIT:
+            action = "gioi han client"
+        elif self.slow_start:
+            self.rate = min(self.max_rate, self.rate * START_GAIN)
+            action = "tang nhanh"
+        else:
+            self.rate = min(self.max_rate, self.rate + max(MIN_STEP, self.rate * ADDITIVE_FRACTION))
+            action = "tang"
+        self.peak = max(self.peak, self.rate)
+        return action, queue_ms
+
+    def on_timeout(self):
+        return self._decrease(LOSS_BACKOFF, "het han")
+
+    def summary(self):
+        causes = ", ".join(f"{k} {v}" for k, v in self.decreases.items())
+        return (f"{self.feedbacks} phan hoi, toc do cuoi {self.rate:.0f} goi/s, cao nhat {self.peak:.0f}, "
+                f"giam: {causes}")
+
+
+class FeedbackListener:
+    """
+    Luồng nền nhận phản hồi của server trên socket gửi (không đổi chế độ chặn của socket:
+    chờ bằng select rồi đọc MSG_DONTWAIT) và cập nhật bộ điều khiển.
+    sent(): tổng số gói client đã gửi (để tính tốc độ gửi thật giữa hai phản hồi).
+    """
+
+    def __init__(self, sock, controller, sent, log_path=None, session_id=None):
+        self.sock = sock
+        self.controller = controller
+        self.sent = sent
+        self.session_id = session_id
+        self.log = RateLog(log_path) if log_path else None
+        self.received = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rate-feedback", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        start = time.monotonic()
+        waiting_since = start
+        # (thời điểm, tổng đã gửi, mục tiêu từ thời điểm đó) của các phản hồi gần nhất
+        history = deque([(start, self.sent(), self.controller.rate)], maxlen=SENT_WINDOW + 1)
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.sock], [], [], POLL_INTERVAL)
+            now = time.monotonic()
+            if not ready:
+                if self.received and now - waiting_since > FEEDBACK_TIMEOUT:
+                    action = self.controller.on_timeout()
+                    waiting_since = now
+                    self._write(now - start, 0, 0, 0, 0, 0, 0, action)
+                continue
+            try:
+                feedback = parse_feedback(self.sock.recv(256, socket.MSG_DONTWAIT))
+            except (BlockingIOError, InterruptedError, ValueError):
+                continue
+            except OSError:
+                continue   # ICMP port unreachable (server chưa chạy) báo qua recv
+            if self.session_id is not None and feedback["session_id"] != self.session_id:
+                continue
+            self.received += 1
+            waiting_since = now
+
+            sent = self.sent()
+            history.append((now, sent, self.controller.rate))
+            scheduled = sum((b[0] - a[0]) * a[2] for a, b in zip(history, list(history)[1:]))
+            sent_ratio = (sent - history[0][1]) / scheduled if scheduled > 0 else 1
+            sent_pps = (sent - history[0][1]) / (now - history[0][0]) if now > history[0][0] else 0
+            interval = feedback["interval_us"] / 1e6 or 1
+            expected = feedback["expected"]
+            loss_pct = max(0, expected - feedback["received"]) / expected * 100 if expected else 0
+            p50_ms = feedback["p50_delay_ns"] / 1e6
+            action, queue_ms = self.controller.on_feedback(loss_pct, feedback["min_delay_ns"] / 1e6, p50_ms,
+                                                           sent_ratio)
+            history[-1] = (now, sent, self.controller.rate)   # mục tiêu mới áp dụng từ bây giờ
+            self._write(now - start, sent_pps, feedback["received"] / interval, loss_pct, p50_ms,
+                        feedback["p99_delay_ns"] / 1e6, queue_ms, action)
+
+    def _write(self, elapsed, sent_pps, delivered_pps, loss_pct, p50_ms, p99_ms, queue_ms, action):
+        if self.log is None:
+            return
+        self.log.write({"time": round(elapsed, 3), "target_rate": round(self.controller.rate, 1),
+                        "sent_pps": round(sent_pps, 1), "delivered_pps": round(delivered_pps, 1),
+                        "loss_pct": round(loss_pct, 3), "p50_ms": round(p50_ms, 4), "p99_ms": round(p99_ms, 4),
+                        "queue_ms": round(queue_ms, 4), "action": action})
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        if self.log is not None:
+            self.log.close()
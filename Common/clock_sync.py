@@ -0,0 +1,135 @@
+# Ước lượng lệch đồng hồ client/server bằng echo kiểu NTP (server.py --echo)
+#   t1: client gửi (đồng hồ client)    t2: server nhận (đồng hồ server)
+#   t3: server trả lời (đồng hồ server) t4: client nhận (đồng hồ client)
+#   rtt    = (t4 - t1) - (t3 - t2)
+#   offset = ((t2 - t1) + (t3 - t4)) / 2     (đồng hồ server - đồng hồ client)
+# Mỗi lần đo gửi PROBES gói và giữ mẫu RTT nhỏ nhất (ít xếp hàng nhất -> offset đúng nhất);
+# đo lại định kỳ trên luồng nền -> độ trôi (drift) = độ dốc offset theo thời gian.
+# Client cộng offset vào send_wall_ns (cờ FLAG_SYNCED) nên delay server tính ra là
+# độ trễ một chiều thật kể cả khi client và server ở hai máy khác nhau.
+import json
+import socket
+import statistics
+import threading
+import time
+
+from wire_format import FLAG_ECHO_REQUEST, new_packet, pack_header, parse_echo_reply
+
+ECHO_PORT_OFFSET = 1        # cổng echo = cổng dữ liệu + 1
+PROBES = 16                 # số gói mỗi lần đo
+PROBE_TIMEOUT = 0.2         # giây chờ trả lời mỗi gói
+SYNC_INTERVAL = 10          # giây giữa hai lần đo trên luồng nền
+CLOCK_FILE = "clock_sync.json"
+
+
+class ClockSync:
+    def __init__(self, host, port, probes=PROBES, timeout=PROBE_TIMEOUT, session_id=0):
+        self.address = (host, port + ECHO_PORT_OFFSET)
+        self.probes = probes
+        self.timeout = timeout
+        self.session_id = session_id
+        self.points = []        # (thời điểm client ns, offset ns, rtt ns) - mẫu tốt nhất mỗi lần đo
+        self.rtts = []          # RTT của mọi mẫu hợp lệ (ns)
+        self._next_id = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def measure(self):
+        """Một lần đo: trả về (offset_ns, rtt_ns) của mẫu RTT nhỏ nhất, None nếu server không trả lời"""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.address)
+        packet = new_packet()
+        best = None
+        try:
+            for _ in range(self.probes):
+                probe_id = self._next_id
+                self._next_id += 1
+                t1 = time.time_ns()
+                pack_header(packet, probe_id, self.session_id, t1, flags=FLAG_ECHO_REQUEST)
+                try:
+                    sock.send(packet)
+                    while True:
+                        data = sock.recv(256)
+                        t4 = time.time_ns()
+                        reply_id, _, t2, t3 = parse_echo_reply(data)
+                        if reply_id == probe_id:
+                            break  # bỏ qua trả lời muộn của probe trước
+                except (socket.timeout, ConnectionRefusedError, ValueError):
+                    continue
+                rtt = (t4 - t1) - (t3 - t2)
+                self.rtts.append(rtt)
+                if best is None or rtt < best[2]:
+                    best = ((t1 + t4) // 2, ((t2 - t1) + (t3 - t4)) // 2, rtt)
+        finally:
+            sock.close()
+        if best is None:
+            return None
+        self.points.append(best)
+        return best[1], best[2]
+
+    def offset_at(self, now_ns):
+        """Offset (ns) tại thời điểm now_ns của client, ngoại suy theo drift"""
+        if not self.points:
+            return 0
+        last_time, last_offset, _ = self.points[-1]
+        return last_offset + int(self.drift() * (now_ns - last_time))
+
+    def drift(self):
+        """Độ trôi (ns/ns) = độ dốc offset giữa lần đo đầu và cuối"""
+        if len(self.points) < 2:
+            return 0.0
+        (t0, o0, _), (t1, o1, _) = self.points[0], self.points[-1]
+        return (o1 - o0) / (t1 - t0) if t1 > t0 else 0.0
+
+    def rtt_summary(self):
+        """(min, trung vị, max) RTT tính bằng ms"""
+        if not self.rtts:
+            return 0.0, 0.0, 0.0
+        return min(self.rtts) / 1e6, statistics.median(self.rtts) / 1e6, max(self.rtts) / 1e6
+
+    # ------------------------------------------------------------------
+    # Đo định kỳ trên luồng nền (không chặn vòng gửi)
+    # ------------------------------------------------------------------
+    def start(self, interval=SYNC_INTERVAL):
+        def run():
+            while not self._stop.wait(interval):
+                self.measure()
+
+        if interval > 0:
+            self._thread = threading.Thread(target=run, name="clock-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def describe(self):
+        rtt_min, rtt_median, _ = self.rtt_summary()
+        offset = self.points[-1][1] if self.points else 0
+        return (f"offset {offset / 1e6:+.3f} ms, drift {self.drift() * 1e6:+.2f} ppm, "
+                f"RTT min/trung vị {rtt_min:.3f}/{rtt_median:.3f} ms ({len(self.points)} lần đo)")
+
+    def save(self, path=CLOCK_FILE):
+        rtt_min, rtt_median, rtt_max = self.rtt_summary()
+        record = {
+            "server": f"{self.address[0]}:{self.address[1]}",
+            "offset_ns": self.points[-1][1] if self.points else 0,
+            "drift_ppm": self.drift() * 1e6,
+            "rtt_ms": {"min": rtt_min, "median": rtt_median, "max": rtt_max, "samples": len(self.rtts)},
+            "points": [{"time_ns": t, "offset_ns": o, "rtt_ns": r} for t, o, r in self.points],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        return record
+
+
+def load_clock(path):
+    """Đọc file clock_sync.json do client ghi"""
+    with open(path, encoding="utf-8") as f:
+        record = json.load(f)
+    if "offset_ns" not in record or "rtt_ms" not in record:
+        raise ValueError(f"{path}: khong phai file dong bo dong ho")
+    return record
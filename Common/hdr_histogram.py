@@ -0,0 +1,142 @@
+# Histogram log-tuyến tính kiểu HDR (High Dynamic Range)
+# - Ghi giá trị nguyên (VD: độ trễ tính bằng ns) với sai số tương đối cố định
+# - Bộ nhớ chỉ phụ thuộc khoảng giá trị, không phụ thuộc số mẫu
+# - Gộp (merge) được: cộng count theo từng bucket
+#
+# Cách chia bucket với S = 2^precision_bits:
+#   v < S          -> bucket v (chính xác tuyệt đối)
+#   v >= S         -> e = bit_length(v) - precision_bits, m = v >> e (S/2 <= m < S)
+#                     bucket = S + (e - 1) * S/2 + (m - S/2), rộng 2^e
+# Sai số tương đối tối đa ~ 1 / 2^(precision_bits - 1)
+PRECISION_BITS = 8        # 256 sub-bucket -> sai số < 0.8%, thường ~0.4% khi lấy điểm giữa
+
+
+class HdrHistogram:
+    def __init__(self, precision_bits=PRECISION_BITS):
+        self.precision_bits = precision_bits
+        self.sub_count = 1 << precision_bits
+        self.half_count = self.sub_count >> 1
+        self.counts = [0] * self.sub_count
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    # ------------------------------------------------------------------
+    # Ánh xạ giá trị <-> bucket
+    # ------------------------------------------------------------------
+    def index_of(self, value):
+        if value < self.sub_count:
+            return value if value > 0 else 0
+        e = value.bit_length() - self.precision_bits
+        return self.sub_count + (e - 1) * self.half_count + ((value >> e) - self.half_count)
+
+    def bucket_bounds(self, index):
+        """Khoảng giá trị [lo, hi) của một bucket"""
+        if index < self.sub_count:
+            return index, index + 1
+        e = (index - self.sub_count) // self.half_count + 1
+        m = (index - self.sub_count) % self.half_count + self.half_count
+        return m << e, (m + 1) << e
+
+    def _grow(self, index):
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+
+    # ------------------------------------------------------------------
+    # Ghi dữ liệu
+    # ------------------------------------------------------------------
+    def record(self, value, n=1):
+        value = int(value)
+        if value < 0:
+            value = 0
+        index = self.index_of(value)
+        if index >= len(self.counts):
+            self._grow(index)
+        self.counts[index] += n
+        self.count += n
+        self.total += value * n
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def record_array(self, values):
+        """Ghi cả một mảng numpy số nguyên bằng bincount (dùng cho analyzer)"""
+        import numpy as np
+
+        v = np.maximum(np.asarray(values, dtype=np.int64), 0)
+        if v.size == 0:
+            return
+        # frexp trả về số mũ = bit_length với số nguyên dương < 2^53
+        bit_length = np.frexp(v.astype(np.float64))[1].astype(np.int64)
+        e = np.maximum(bit_length - self.precision_bits, 0)
+        index = np.where(v < self.sub_count, v,
+                         self.sub_count + (e - 1) * self.half_count + ((v >> e) - self.half_count))
+        binned = np.bincount(index)
+        self._grow(len(binned) - 1)
+        for i in np.flatnonzero(binned):
+            self.counts[i] += int(binned[i])
+
+        self.count += int(v.size)
+        self.total += int(v.sum())
+        vmin, vmax = int(v.min()), int(v.max())
+        self.min = vmin if self.min is None else min(self.min, vmin)
+        self.max = vmax if self.max is None else max(self.max, vmax)
+
+    def merge(self, other):
+        """Cộng dồn một histogram khác (cùng precision_bits) vào histogram này"""
+        if other.precision_bits != self.precision_bits:
+            raise ValueError("khong the gop 2 histogram khac precision_bits")
+        self._grow(len(other.counts) - 1)
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+
+    # ------------------------------------------------------------------
+    # Truy vấn
+    # ------------------------------------------------------------------
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    def value_at_quantile(self, q):
+        """Giá trị tại phân vị q (0..1): điểm giữa bucket, kẹp trong [min, max]"""
+        return self.values_at_quantiles((q,))[0]
+
+    def values_at_quantiles(self, quantiles):
+        """Nhiều phân vị trong một lần duyệt các bucket (quantiles tăng dần)"""
+        if not self.count:
+            return [0 for _ in quantiles]
+        targets = [max(1, min(self.count, int(q * self.count + 0.5))) for q in quantiles]
+        results = []
+        seen = 0
+        t = 0
+        for index, c in enumerate(self.counts):
+            if not c:
+                continue
+            seen += c
+            while t < len(targets) and seen >= targets[t]:
+                lo, hi = self.bucket_bounds(index)
+                results.append(min(max((lo + hi - 1) / 2, self.min), self.max))
+                t += 1
+            if t == len(targets):
+                break
+        return results
+
+    def buckets(self):
+        """Duyệt các bucket khác 0: (lo, hi, count)"""
+        for index, c in enumerate(self.counts):
+            if c:
+                lo, hi = self.bucket_bounds(index)
+                yield lo, hi, c
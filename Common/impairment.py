@@ -0,0 +1,238 @@
+# Mô hình suy giảm mạng cho relay giả lập (Server/impairment_relay.py)
+# - Hồ sơ = tên có sẵn trong PROFILES hoặc file JSON ({"profile": "<gốc>", "loss_pct": 2, ...});
+#   tham số dòng lệnh (--delay-ms, --loss-pct, ...) ghi đè lên hồ sơ (giống socket_tuning)
+# - Mỗi gói đi qua lần lượt (như netem):
+#     mất gói: ngẫu nhiên độc lập (loss_pct) và/hoặc theo chùm Gilbert-Elliott
+#              (ge_p: % tốt -> xấu, ge_r: % xấu -> tốt, ge_bad_loss / ge_good_loss: % mất ở từng trạng thái)
+#     băng thông: hàng đợi FIFO tốc độ rate_mbit, đầy queue_kb thì bỏ gói ở đuôi
+#     độ trễ: delay_ms + jitter theo phân bố uniform / normal / pareto (đuôi dài)
+#     đảo thứ tự: reorder_pct % gói bị giữ thêm reorder_ms (các gói sau vượt lên)
+#     trùng gói: duplicate_pct % gói được gửi hai lần
+# - Jitter không tự gây đảo thứ tự (thời điểm phát không lùi so với gói trước - đường truyền FIFO, khác netem);
+#   đảo thứ tự chỉ đến từ reorder_pct để hai hiệu ứng đo tách bạch được. Hệ quả: khi khoảng cách giữa các gói
+#   nhỏ hơn jitter, độ trễ dồn về phía đuôi trên của phân bố (như hàng đợi thật).
+#   jitter_reorder = true: jitter độc lập từng gói, gói sau được vượt gói trước (giống netem)
+# - Bản ghi hồ sơ + bộ đếm của relay (impairment.json) để bench_e2e.py / analyze_results.py
+#   biết lần chạy dùng điều kiện mạng nào
+import json
+import random
+import time
+
+FORMAT_NAME = "udp-impairment"
+FORMAT_VERSION = 1
+RECORD_FILE = "impairment.json"
+
+DISTRIBUTIONS = ("uniform", "normal", "pareto")
+PARETO_ALPHA = 3.0          # đuôi dài vừa phải; phần thêm được chuẩn hóa để trung bình = jitter_ms
+JITTER_TABLE = 65536        # mẫu jitter tính sẵn (như bảng phân bố của netem): mỗi gói chỉ tra bảng
+NS_PER_MS = 1_000_000
+
+# Nguyên nhân bỏ gói (khóa của bộ đếm, in và ghi vào bản ghi)
+DROP_CAUSES = ("ngau nhien", "chum", "hang doi", "tran relay")
+
+OPTIONS = ("delay_ms", "jitter_ms", "distribution", "loss_pct", "ge_p", "ge_r", "ge_bad_loss", "ge_good_loss",
+           "rate_mbit", "queue_kb", "reorder_pct", "reorder_ms", "duplicate_pct", "jitter_reorder")
+DEFAULTS = {"delay_ms": 0.0, "jitter_ms": 0.0, "distribution": "uniform", "loss_pct": 0.0,
+            "ge_p": 0.0, "ge_r": 100.0, "ge_bad_loss": 100.0, "ge_good_loss": 0.0,
+            "rate_mbit": 0.0, "queue_kb": 256, "reorder_pct": 0.0, "reorder_ms": 1.0, "duplicate_pct": 0.0,
+            "jitter_reorder": False}
+
+PROFILES = {
+    "none": {},                                                          # chỉ chuyển tiếp
+    "lan": {"delay_ms": 0.2, "jitter_ms": 0.05},
+    "wan": {"delay_ms": 20, "jitter_ms": 2, "distribution": "normal", "loss_pct": 0.1},
+    "intercontinental": {"delay_ms": 80, "jitter_ms": 5, "distribution": "pareto", "loss_pct": 0.5},
+    # Wi-Fi: mất theo chùm (trung bình 3 gói liên tiếp), jitter đuôi dài, đôi khi đảo/trùng
+    "wifi": {"delay_ms": 3, "jitter_ms": 3, "distribution": "pareto", "ge_p": 1, "ge_r": 33,
+             "reorder_pct": 0.5, "reorder_ms": 2, "duplicate_pct": 0.1},
+    # Đường truyền 20 Mbit/s, hàng đợi 128 KB: tốc độ gửi vượt băng thông -> trễ hàng đợi rồi mất gói
+    "congested": {"delay_ms": 10, "jitter_ms": 1, "rate_mbit": 20, "queue_kb": 128},
+}
+
+
+def load_impairment(spec):
+    """Tên hồ sơ hoặc đường dẫn file JSON -> dict {"name": ..., <tùy chọn>: giá trị} (đủ mọi tùy chọn)"""
+    if spec in PROFILES:
+        return {"name": spec, **DEFAULTS, **PROFILES[spec]}
+    with open(spec, encoding="utf-8") as f:
+        config = json.load(f)
+    base = config.pop("profile", "none")
+    if base not in PROFILES:
+        raise ValueError(f"{spec}: ho so goc '{base}' khong ton tai")
+    unknown = set(config) - set(OPTIONS) - {"name"}
+    if unknown:
+        raise ValueError(f"{spec}: tuy chon khong ho tro: {', '.join(sorted(unknown))}")
+    return {**DEFAULTS, **PROFILES[base], "name": spec, **config}
+
+
+def _ge_list(value):
+    """'1,30' hoặc '1,30,100,0' -> [p, r, mất ở trạng thái xấu, mất ở trạng thái tốt] (%)"""
+    values = [float(x) for x in value.split(",")]
+    if not 2 <= len(values) <= 4:
+        raise ValueError("can P,R[,MAT_XAU[,MAT_TOT]]")
+    return values
+
+
+def add_impairment_arguments(parser, default="none"):
+    """Thêm --profile và các tham số ghi đè từng tùy chọn vào argparse parser"""
+    group = parser.add_argument_group("suy giảm mạng")
+    group.add_argument("--profile", default=default,
+                       help=f"hồ sơ ({', '.join(PROFILES)}) hoặc file JSON; mặc định {default}")
+    group.add_argument("--delay-ms", type=float, help="độ trễ cố định (ms)")
+    group.add_argument("--jitter-ms", type=float, help="độ lệch của độ trễ (ms): nửa khoảng / độ lệch chuẩn / TB đuôi")
+    group.add_argument("--distribution", choices=DISTRIBUTIONS, help="phân bố jitter")
+    group.add_argument("--jitter-reorder", action="store_true", default=None,
+                       help="jitter độc lập từng gói, cho phép gói sau vượt gói trước (như netem)")
+    group.add_argument("--loss-pct", type=float, help="%% mất gói ngẫu nhiên độc lập")
+    group.add_argument("--ge", type=_ge_list, metavar="P,R[,XAU[,TOT]]",
+                       help="mất gói theo chùm Gilbert-Elliott: %% tốt->xấu, %% xấu->tốt, %% mất ở xấu (100), ở tốt (0)")
+    group.add_argument("--rate-mbit", type=float, help="giới hạn băng thông (Mbit/s, 0 = không giới hạn)")
+    group.add_argument("--queue-kb", type=int, help="hàng đợi của giới hạn băng thông (KB)")
+    group.add_argument("--reorder-pct", type=float, help="%% gói bị giữ lại để gói sau vượt lên")
+    group.add_argument("--reorder-ms", type=float, help="thời gian giữ thêm của gói bị đảo (ms)")
+    group.add_argument("--duplicate-pct", type=float, help="%% gói bị nhân đôi")
+    return group
+
+
+def impairment_from_args(args):
+    """Hồ sơ --profile + các giá trị ghi đè trên dòng lệnh"""
+    config = load_impairment(args.profile)
+    for option in OPTIONS:
+        value = getattr(args, option, None)
+        if value is not None:
+            config[option] = value
+    if getattr(args, "ge", None):
+        for option, value in zip(("ge_p", "ge_r", "ge_bad_loss", "ge_good_loss"), args.ge):
+            config[option] = value
+    return config
+
+
+def describe(config):
+    """Một dòng: tên hồ sơ + các tùy chọn khác mặc định"""
+    config = {**DEFAULTS, **config}   # bản ghi cũ có thể thiếu tùy chọn mới
+    parts = [f"{option} {config[option]}" for option in OPTIONS if config[option] != DEFAULTS[option]]
+    return f"{config['name']}: " + (", ".join(parts) if parts else "chi chuyen tiep")
+
+
+class GilbertElliott:
+    """Xích Markov hai trạng thái (tốt/xấu): mất gói theo chùm, độ dài chùm TB = 100 / r gói"""
+
+    def __init__(self, p, r, bad_loss=100.0, good_loss=0.0, rng=random):
+        self.p = p / 100
+        self.r = r / 100
+        self.bad_loss = bad_loss / 100
+        self.good_loss = good_loss / 100
+        self.bad = False
+        self._random = rng.random
+
+    def lose(self):
+        if self.bad:
+            if self._random() < self.r:
+                self.bad = False
+        elif self._random() < self.p:
+            self.bad = True
+        return self._random() < (self.bad_loss if self.bad else self.good_loss)
+
+
+class Impairment:
+    """
+    Quyết định số phận từng gói: schedule(now_ns, size) -> tuple thời điểm phát (ns, cùng đồng hồ với now_ns);
+    () = bỏ, hai phần tử = trùng gói. Bộ đếm: dropped (theo DROP_CAUSES), duplicated, reordered.
+    """
+
+    def __init__(self, config, seed=None):
+        self.config = config
+        rng = random.Random(seed)
+        self._random = rng.random
+        self._gauss = rng.gauss
+        self._pareto = rng.paretovariate
+        self.loss = config["loss_pct"] / 100
+        self.ge = GilbertElliott(config["ge_p"], config["ge_r"], config["ge_bad_loss"], config["ge_good_loss"],
+                                 rng) if config["ge_p"] > 0 else None
+        self.delay_ns = int(config["delay_ms"] * NS_PER_MS)
+        self.jitter_ns = int(config["jitter_ms"] * NS_PER_MS)
+        self.distribution = config["distribution"]
+        self.keep_order = not config["jitter_reorder"]
+        self._jitter_table = [int(self._jitter()) for _ in range(JITTER_TABLE)] if self.jitter_ns else None
+        # Băng thông: ns để phát một byte; hàng đợi giới hạn theo byte còn chờ phát
+        self.ns_per_byte = 8000 / config["rate_mbit"] if config["rate_mbit"] > 0 else 0
+        self.queue_bytes = config["queue_kb"] * 1024
+        self.link_free_ns = 0
+        self.reorder = config["reorder_pct"] / 100
+        self.reorder_ns = int(config["reorder_ms"] * NS_PER_MS)
+        self.duplicate = config["duplicate_pct"] / 100
+        self.last_release = 0
+        self.dropped = dict.fromkeys(DROP_CAUSES, 0)
+        self.duplicated = 0
+        self.reordered = 0
+        # Không có tùy chọn nào: relay chuyển tiếp ngay, không qua bộ lập lịch
+        self.passthrough = all(config.get(option) == DEFAULTS[option] for option in OPTIONS
+                               if option not in ("distribution", "queue_kb", "reorder_ms", "jitter_reorder"))
+
+    def _jitter(self):
+        if self.distribution == "normal":
+            return self._gauss(0, self.jitter_ns)
+        if self.distribution == "pareto":
+            return self.jitter_ns * (PARETO_ALPHA - 1) * (self._pareto(PARETO_ALPHA) - 1)
+        return (self._random() * 2 - 1) * self.jitter_ns
+
+    def schedule(self, now_ns, size):
+        if self.loss and self._random() < self.loss:
+            self.dropped["ngau nhien"] += 1
+            return ()
+        if self.ge is not None and self.ge.lose():
+            self.dropped["chum"] += 1
+            return ()
+        start = now_ns
+        if self.ns_per_byte:
+            backlog = max(0, self.link_free_ns - now_ns) / self.ns_per_byte
+            if backlog + size > self.queue_bytes:
+                self.dropped["hang doi"] += 1
+                return ()
+            self.link_free_ns = max(self.link_free_ns, now_ns) + size * self.ns_per_byte
+            start = int(self.link_free_ns)
+        release = start + self.delay_ns
+        if self._jitter_table is not None:
+            release += self._jitter_table[int(self._random() * JITTER_TABLE)]
+            if release < now_ns:
+                release = now_ns
+        if self.keep_order:
+            if release < self.last_release:
+                release = self.last_release
+            self.last_release = release
+        if self.reorder and self._random() < self.reorder:
+            self.reordered += 1
+            release += self.reorder_ns     # không cập nhật last_release: gói sau được vượt
+        if self.duplicate and self._random() < self.duplicate:
+            self.duplicated += 1
+            return release, release
+        return (release,)
+
+
+def make_record(config, counters, **info):
+    """Bản ghi JSON: hồ sơ + bộ đếm của relay + thông tin lần chạy"""
+    return {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "name": config["name"],
+        "config": {k: v for k, v in config.items() if k != "name"},
+        **info,
+        **counters,
+        "recorded": time.time(),
+    }
+
+
+def save_record(path, record):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    return path
+
+
+def load_record(path):
+    """Bản ghi suy giảm mạng, None nếu không có / không đúng định dạng"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return record if record.get("format") == FORMAT_NAME else None
@@ -0,0 +1,158 @@
+# Bộ đếm mất gói của kernel cho socket nhận của server (Linux)
+# - /proc/net/udp{,6}: rx_queue (byte đang chờ trong buffer nhận) và drops của từng socket;
+#   lọc theo cổng lắng nghe nên cộng được mọi socket SO_REUSEPORT của các worker
+#   (drops nhớ theo inode nên socket đã đóng vẫn được tính)
+# - /proc/net/snmp (dòng "Udp:"): InDatagrams, RcvbufErrors, InErrors - toàn hệ thống (mọi socket
+#   UDP của máy/namespace), ghi theo chênh lệch so với lúc bắt đầu
+# - SO_RXQ_OVFL (tùy chọn): mỗi datagram nhận kèm ancillary data = số gói socket đã bỏ tới lúc đó
+# - app_dropped: số dòng tầng ghi của server bỏ vì hàng đợi đầy (gói đã nhận nhưng ứng dụng không kịp ghi)
+#
+# Chuỗi thời gian ghi cạnh file kết quả: <file kết quả>.kernel.csv, analyzer đọc để tách mất gói
+# do tràn buffer nhận của kernel / do ứng dụng / ngoài server (mạng, client)
+import csv
+import os
+import socket
+import struct
+import threading
+import time
+
+SAMPLE_INTERVAL = 0.5      # giây giữa hai lần lấy mẫu
+SUFFIX = ".kernel.csv"
+PROC_UDP = ("/proc/net/udp", "/proc/net/udp6")
+PROC_SNMP = "/proc/net/snmp"
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)   # Linux, chưa có trong module socket của Python
+RXQ_OVFL = struct.Struct("=I")
+
+HAS_PROC = os.path.exists(PROC_UDP[0])
+COLUMNS = ["time", "rx_queue", "drops", "rxq_ovfl", "app_dropped",
+           "udp_in", "udp_rcvbuf_errors", "udp_in_errors"]
+
+
+def read_udp_sockets(port):
+    """{inode: (rx_queue byte, drops)} của mọi socket UDP có cổng cục bộ `port`"""
+    suffix = f":{port:04X}"
+    sockets = {}
+    for path in PROC_UDP:
+        try:
+            with open(path) as f:
+                next(f)   # dòng tiêu đề
+                for line in f:
+                    fields = line.split()
+                    if not fields[1].endswith(suffix):
+                        continue
+                    sockets[int(fields[9])] = (int(fields[4].split(":")[1], 16), int(fields[-1]))
+        except OSError:
+            continue
+    return sockets
+
+
+def read_snmp_udp():
+    """Bộ đếm Udp của /proc/net/snmp: {tên: giá trị}, rỗng nếu không đọc được"""
+    try:
+        with open(PROC_SNMP) as f:
+            rows = [line.split() for line in f if line.startswith("Udp:")]
+    except OSError:
+        return {}
+    if len(rows) < 2:
+        return {}
+    return dict(zip(rows[0][1:], map(int, rows[1][1:])))
+
+
+def enable_rxq_ovfl(sock):
+    """Bật SO_RXQ_OVFL; False nếu nền tảng không hỗ trợ"""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+        return True
+    except OSError:
+        return False
+
+
+def parse_rxq_ovfl(ancdata):
+    """Số gói bị bỏ từ ancillary data của socket.recvmsg, None nếu không có"""
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= RXQ_OVFL.size:
+            return RXQ_OVFL.unpack_from(data)[0]
+    return None
+
+
+class KernelSampler:
+    """
+    Luồng nền lấy mẫu bộ đếm kernel của cổng `port` mỗi `interval` giây và ghi CSV.
+    Vòng nhận cập nhật `rxq_ovfl` (nếu bật SO_RXQ_OVFL); `writer` (AsyncResultWriter) cho app_dropped.
+    """
+
+    def __init__(self, path, port, interval=SAMPLE_INTERVAL, writer=None):
+        self.path = path
+        self.port = port
+        self.interval = interval
+        self.writer = writer
+        self.rxq_ovfl = 0
+        self.samples = 0
+        self.peak_rx_queue = 0
+        self.last = None
+        self._drops = {}        # inode -> drops lần cuối thấy (giữ cả socket worker đã đóng)
+        self._base = read_snmp_udp()
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(COLUMNS)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="kernel-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def sample(self):
+        sockets = read_udp_sockets(self.port)
+        for inode, (_, drops) in sockets.items():
+            self._drops[inode] = drops
+        rx_queue = sum(queue for queue, _ in sockets.values())
+        snmp = read_snmp_udp()
+        base = self._base
+        row = [round(time.time(), 3), rx_queue, sum(self._drops.values()), self.rxq_ovfl,
+               self.writer.dropped if self.writer is not None else 0,
+               snmp.get("InDatagrams", 0) - base.get("InDatagrams", 0),
+               snmp.get("RcvbufErrors", 0) - base.get("RcvbufErrors", 0),
+               snmp.get("InErrors", 0) - base.get("InErrors", 0)]
+        self._csv.writerow(row)
+        self.samples += 1
+        self.peak_rx_queue = max(self.peak_rx_queue, rx_queue)
+        self.last = dict(zip(COLUMNS, row))
+        return self.last
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def close(self):
+        """Dừng luồng, lấy mẫu cuối (sau khi socket đã rút hết) và đóng file"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        last = self.sample()
+        self._file.close()
+        return last
+
+    def describe(self):
+        last = self.last or {}
+        return (f"socket drops {max(last.get('drops', 0), last.get('rxq_ovfl', 0))}, "
+                f"rx_queue đỉnh {self.peak_rx_queue} byte, RcvbufErrors (toàn máy) +{last.get('udp_rcvbuf_errors', 0)}, "
+                f"ứng dụng bỏ {last.get('app_dropped', 0)} ({self.samples} mẫu)")
+
+
+def counters_path(result_path):
+    return result_path.rstrip("/\\") + SUFFIX
+
+
+def load_series(result_path):
+    """Chuỗi mẫu của một file kết quả: dict cột -> list, None nếu không có"""
+    try:
+        with open(counters_path(result_path), newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = [list(map(float, row)) for row in reader]
+    except (OSError, StopIteration, ValueError):
+        return None
+    if header != COLUMNS or not rows:
+        return None
+    return {name: [row[i] for row in rows] for i, name in enumerate(header)}
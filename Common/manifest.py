@@ -0,0 +1,34 @@
+# Manifest của một lần chạy tải (Client/load_generator.py)
+# Ghi lại mỗi flow: session_id, cổng nguồn, dải packet_id [first_id, first_id + sent)
+# và số gói thực gửi -> analyzer tính mất gói thật theo từng flow thay vì đoán từ khoảng trống id
+#
+# {
+#   "format": "udp-load-manifest", "version": 1,
+#   "server": "127.0.0.1:5005", "started": <unix>, "duration": <s>, "packet_size": 256,
+#   "target_rate": 2000, "total_sent": 12345,
+#   "tuning": {<bản ghi socket_tuning của các sender: hồ sơ + giá trị hiệu lực>},
+#   "flows": [{"worker": 0, "session_id": 7, "source_port": 40001, "first_id": 0,
+#              "sent": 6170, "elapsed": 3.0, "rate": 2056.6, "target_rate": 1000}, ...]
+# }
+import json
+
+FORMAT_NAME = "udp-load-manifest"
+FORMAT_VERSION = 1
+
+
+def write_manifest(path, flows, **info):
+    """Ghi manifest: danh sách flow (dict) + thông tin chung của lần chạy"""
+    flows = sorted(flows, key=lambda f: f["worker"])
+    manifest = {"format": FORMAT_NAME, "version": FORMAT_VERSION, **info,
+                "total_sent": sum(f["sent"] for f in flows), "flows": flows}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(path):
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_NAME or manifest.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: khong phai manifest tai v{FORMAT_VERSION}")
+    return manifest
@@ -0,0 +1,138 @@
+# Cấu trúc C dùng chung cho recvmmsg/sendmmsg (Linux) qua ctypes
+# - Server/batch_receiver.py: recvmmsg rút nhiều datagram mỗi syscall
+# - Client/batch_send.py: sendmmsg đẩy nhiều datagram mỗi syscall
+import ctypes
+import ctypes.util
+import socket
+import sys
+
+SOCKADDR_SIZE = 28         # sizeof(sockaddr_in6), đủ cho cả sockaddr_in
+
+
+class IOVec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", MsgHdr), ("msg_len", ctypes.c_uint)]
+
+
+class CMsgHdr(ctypes.Structure):
+    # Dữ liệu ancillary nằm ngay sau header (sizeof đã căn theo size_t trên Linux)
+    _fields_ = [("cmsg_len", ctypes.c_size_t), ("cmsg_level", ctypes.c_int), ("cmsg_type", ctypes.c_int)]
+
+
+def load_libc(name, argtypes):
+    """Lấy hàm `name` từ libc (None nếu không phải Linux hoặc libc không có)"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        func = getattr(libc, name)
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = argtypes
+    func.restype = ctypes.c_int
+    return func
+
+
+def build_msgs(buffer, count, slot_size, lengths=None):
+    """
+    Dựng mảng mmsghdr/iovec trỏ thẳng vào các ô của bytearray `buffer`
+    (ô i bắt đầu tại i * slot_size, dài lengths[i] hoặc slot_size).
+    Trả về (c_buffer, iovecs, msgs) - giữ tham chiếu c_buffer/iovecs còn sống.
+    """
+    c_buffer = (ctypes.c_char * len(buffer)).from_buffer(buffer)
+    base = ctypes.addressof(c_buffer)
+    iovecs = (IOVec * count)()
+    msgs = (MMsgHdr * count)()
+    for i in range(count):
+        iovecs[i].iov_base = base + i * slot_size
+        iovecs[i].iov_len = lengths[i] if lengths is not None else slot_size
+        hdr = msgs[i].msg_hdr
+        hdr.msg_iov = ctypes.pointer(iovecs[i])
+        hdr.msg_iovlen = 1
+    return c_buffer, iovecs, msgs
+
+
+def attach_control(msgs, count, size):
+    """
+    Cấp cho mỗi mmsghdr một vùng ancillary data `size` byte (VD socket.CMSG_SPACE(4)).
+    Kernel ghi đè msg_controllen bằng độ dài thực -> đặt lại bằng reset_control trước lần gọi sau.
+    Trả về buffer ctypes (giữ tham chiếu còn sống).
+    """
+    control = (ctypes.c_char * (count * size))()
+    base = ctypes.addressof(control)
+    for i in range(count):
+        msgs[i].msg_hdr.msg_control = base + i * size
+        msgs[i].msg_hdr.msg_controllen = size
+    return control
+
+
+def reset_control(msgs, count, size):
+    for i in range(count):
+        msgs[i].msg_hdr.msg_controllen = size
+
+
+def attach_names(msgs, count, size=SOCKADDR_SIZE):
+    """
+    Cấp cho mỗi mmsghdr một vùng nhận địa chỉ nguồn (msg_name) để đọc bằng read_sockaddr.
+    Kernel ghi đè msg_namelen -> đặt lại bằng reset_names trước lần gọi sau.
+    Trả về buffer ctypes (giữ tham chiếu còn sống).
+    """
+    names = (ctypes.c_char * (count * size))()
+    base = ctypes.addressof(names)
+    for i in range(count):
+        msgs[i].msg_hdr.msg_name = base + i * size
+        msgs[i].msg_hdr.msg_namelen = size
+    return names
+
+
+def reset_names(msgs, count, size=SOCKADDR_SIZE):
+    for i in range(count):
+        msgs[i].msg_hdr.msg_namelen = size
+
+
+def read_sockaddr(hdr):
+    """(host, port) từ msg_name (sockaddr_in / sockaddr_in6) của msghdr, None nếu không có"""
+    if not hdr.msg_name or hdr.msg_namelen < 8:
+        return None
+    raw = ctypes.string_at(hdr.msg_name, hdr.msg_namelen)
+    family = int.from_bytes(raw[:2], sys.byteorder)
+    port = int.from_bytes(raw[2:4], "big")
+    if family == socket.AF_INET:
+        return socket.inet_ntop(socket.AF_INET, raw[4:8]), port
+    if family == socket.AF_INET6 and len(raw) >= 24:
+        return socket.inet_ntop(socket.AF_INET6, raw[8:24]), port
+    return None
+
+
+def read_cmsg_u32(hdr, level, kind):
+    """
+    Giá trị uint32 của cmsg level/kind trong msghdr, None nếu không có.
+    Duyệt mọi cmsg (VD SO_RXQ_OVFL và UDP_GRO cùng lúc) như CMSG_NXTHDR: mỗi cmsg căn theo size_t.
+    """
+    header = ctypes.sizeof(CMsgHdr)
+    align = ctypes.sizeof(ctypes.c_size_t)
+    address = hdr.msg_control
+    end = address + hdr.msg_controllen
+    while address + header <= end:
+        cmsg = CMsgHdr.from_address(address)
+        if cmsg.cmsg_len < header:
+            return None
+        if cmsg.cmsg_level == level and cmsg.cmsg_type == kind and cmsg.cmsg_len >= header + 4:
+            return ctypes.c_uint32.from_address(address + header).value
+        address += (cmsg.cmsg_len + align - 1) & ~(align - 1)
+    return None
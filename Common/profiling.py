@@ -0,0 +1,212 @@
+# Đo chi phí đường nóng (opt-in) của server và client
+# - StageProfiler: bấm giờ từng công đoạn của vòng lặp bằng perf_counter_ns vào một HdrHistogram
+#   mỗi công đoạn; chỉ bấm giờ 1/sample_every vòng (tick() trả về False ở các vòng còn lại)
+#   nên bật vẫn rẻ, tắt (profiler = None) chỉ tốn một phép kiểm tra bool mỗi vòng
+#     timed = stages is not None and stages.tick()   # đầu vòng, đặt mốc
+#     ... if timed: stages.lap("parse")               # thời gian từ mốc trước tới đây
+# - Công đoạn "chờ" (recvfrom chặn, pacer.wait) gồm cả thời gian rảnh: vẫn in phân vị
+#   nhưng không tính vào tỷ lệ chi phí / ngân sách mỗi vòng
+# - CProfileRun: cProfile cho luồng chính, ghi file .pstats (snakeviz, python -m pstats)
+# - StackSampler: luồng nền chụp stack luồng chính mỗi vài ms (sys._current_frames), ghi dạng
+#   "collapsed" (hàm (file:dòng);...;hàm count) cho flamegraph.pl / speedscope; theo dòng nên
+#   tách được dòng recvfrom với dòng print trong cùng một hàm
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+from time import perf_counter_ns
+
+from hdr_histogram import HdrHistogram
+
+SAMPLE_EVERY = 64          # bấm giờ 1 trên 64 vòng
+STACK_INTERVAL = 0.005     # giây giữa hai lần chụp stack
+TOP_FUNCTIONS = 15         # số dòng in từ cProfile / stack sampling
+
+
+class StageProfiler:
+    def __init__(self, stages, waits=(), sample_every=SAMPLE_EVERY):
+        self.stages = tuple(stages)
+        self.waits = frozenset(waits)
+        self.sample_every = max(1, sample_every)
+        self.histograms = {stage: HdrHistogram() for stage in self.stages}
+        self.iterations = 0
+        self.samples = 0
+        self._countdown = 1
+        self._mark = 0
+
+    def tick(self):
+        """Gọi đầu mỗi vòng; True = vòng này được bấm giờ (đã đặt mốc)"""
+        self.iterations += 1
+        self._countdown -= 1
+        if self._countdown:
+            return False
+        self._countdown = self.sample_every
+        self.samples += 1
+        self._mark = perf_counter_ns()
+        return True
+
+    def mark(self):
+        """Đặt lại mốc: bỏ qua đoạn vừa chạy (không thuộc công đoạn nào)"""
+        self._mark = perf_counter_ns()
+
+    def lap(self, stage):
+        """Ghi thời gian từ mốc trước vào công đoạn `stage` rồi đặt mốc mới (không tính thời gian ghi)"""
+        self.histograms[stage].record(perf_counter_ns() - self._mark)
+        self._mark = perf_counter_ns()
+
+    def report(self, items=None, unit="vòng"):
+        """
+        Bảng chi phí từng công đoạn (list dòng). Chi phí mỗi vòng của một công đoạn = tổng thời gian
+        đo được / số vòng được bấm giờ (công đoạn không chạy ở mọi vòng, VD flush, tính đúng tần suất).
+        items: số gói đã xử lý (khi một vòng xử lý nhiều gói, VD một lô) -> thêm µs/gói.
+        """
+        if not self.samples:
+            return [f"Chi phí từng công đoạn: chưa có mẫu ({self.iterations} {unit})"]
+        busy = {stage: h.total / self.samples for stage, h in self.histograms.items()
+                if h.count and stage not in self.waits}
+        per_iteration = sum(busy.values())
+        lines = [f"Chi phí từng công đoạn (bấm giờ 1/{self.sample_every} {unit}, "
+                 f"{self.samples} mẫu / {self.iterations} {unit}):",
+                 f"   {'Công đoạn':<16} {'Mẫu':>8} {'TB µs':>9} {'p50 µs':>9} {'p99 µs':>9} {'max µs':>10} {'Tỷ lệ':>7}"]
+        for stage in self.stages:
+            h = self.histograms[stage]
+            if not h.count:
+                continue
+            p50, p99 = h.values_at_quantiles((0.5, 0.99))
+            share = f"{busy[stage] / per_iteration * 100:.1f}%" if stage in busy and per_iteration else "-"
+            name = stage + ("*" if stage in self.waits else "")
+            lines.append(f"   {name:<16} {h.count:>8} {h.mean / 1e3:>9.2f} {p50 / 1e3:>9.2f} {p99 / 1e3:>9.2f} "
+                         f"{h.max / 1e3:>10.1f} {share:>7}")
+        if self.waits & set(s for s, h in self.histograms.items() if h.count):
+            lines.append("   * gồm thời gian chờ (rảnh), không tính vào tỷ lệ")
+        if per_iteration:
+            budget = f"Đường nóng ~{per_iteration / 1e3:.2f} µs/{unit}"
+            if items and self.iterations:
+                per_item = per_iteration * self.iterations / items
+                budget += f" = {per_item / 1e3:.2f} µs/gói -> tối đa ~{1e9 / per_item:.0f} gói/giây trên một lõi"
+            else:
+                budget += f" -> tối đa ~{1e9 / per_iteration:.0f} {unit}/giây trên một lõi"
+            lines.append(f"{budget}; tốn nhất: {max(busy, key=busy.get)}")
+        return lines
+
+
+class CProfileRun:
+    """cProfile cho luồng gọi start() (luồng nhận/gửi chính)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+        return self
+
+    def stop(self, top=TOP_FUNCTIONS):
+        """Ghi .pstats, trả về các dòng top hàm theo thời gian tự thân (tottime)"""
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).sort_stats("tottime").print_stats(top)
+        lines = [line for line in out.getvalue().splitlines() if line.strip()]
+        # Bỏ phần đầu (tổng số lời gọi, thứ tự sắp xếp), giữ từ dòng tiêu đề cột
+        start = next((i for i, line in enumerate(lines) if line.lstrip().startswith("ncalls")), 0)
+        return [f"cProfile -> {self.path} (top {top} theo tottime):"] + ["   " + line for line in lines[start:]]
+
+
+class StackSampler:
+    """Luồng nền chụp stack của một luồng mỗi `interval` giây, gộp các stack giống nhau"""
+
+    def __init__(self, path, interval=STACK_INTERVAL, thread_id=None):
+        self.path = path
+        self.interval = interval
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.counts = {}
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        labels = {}     # (code, dòng) -> nhãn, tránh dựng lại chuỗi mỗi lần chụp
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                key = (frame.f_code, frame.f_lineno)
+                label = labels.get(key)
+                if label is None:
+                    code = frame.f_code
+                    label = labels[key] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+                stack.append(label)
+                frame = frame.f_back
+            stack.reverse()
+            collapsed = ";".join(stack)
+            self.counts[collapsed] = self.counts.get(collapsed, 0) + 1
+            self.samples += 1
+
+    def stop(self, top=TOP_FUNCTIONS):
+        """Dừng, ghi file collapsed, trả về các dòng top vị trí (đỉnh stack) theo số mẫu"""
+        self._stop.set()
+        self._thread.join()
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items(), key=lambda x: -x[1]):
+                f.write(f"{stack} {count}\n")
+        leaves = {}
+        for stack, count in self.counts.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            leaves[leaf] = leaves.get(leaf, 0) + count
+        lines = [f"Stack sampling -> {self.path} ({self.samples} mẫu, mỗi {self.interval * 1e3:g} ms), "
+                 f"top {top} vị trí đang chạy:"]
+        for leaf, count in sorted(leaves.items(), key=lambda x: -x[1])[:top]:
+            lines.append(f"   {count / max(1, self.samples) * 100:>6.1f}%  {leaf}")
+        return lines
+
+
+def add_profiling_arguments(parser):
+    """Thêm --profile-stages, --cprofile, --stack-sample vào argparse parser"""
+    group = parser.add_argument_group("đo chi phí đường nóng")
+    group.add_argument("--profile-stages", type=int, nargs="?", const=SAMPLE_EVERY, metavar="N",
+                       help=f"bấm giờ từng công đoạn của vòng lặp 1 trên N vòng (mặc định {SAMPLE_EVERY}), "
+                            f"in bảng chi phí khi dừng")
+    group.add_argument("--cprofile", metavar="FILE", help="chạy dưới cProfile, ghi FILE (.pstats) và in top hàm")
+    group.add_argument("--stack-sample", metavar="FILE",
+                       help="chụp stack luồng chính định kỳ, ghi FILE dạng collapsed (flamegraph)")
+    group.add_argument("--stack-interval-ms", type=float, default=STACK_INTERVAL * 1e3,
+                       help="--stack-sample: khoảng giữa hai lần chụp (ms)")
+    return group
+
+
+class Profiling:
+    """
+    Gom các công cụ đã bật trên dòng lệnh: stages (StageProfiler hoặc None; None cả khi vòng lặp
+    không khai báo công đoạn nào) dùng trong vòng lặp, finish() dừng tất cả và trả về các dòng báo cáo
+    """
+
+    def __init__(self, args, stages, waits=()):
+        self.stages = StageProfiler(stages, waits, args.profile_stages) if args.profile_stages and stages else None
+        self.cprofile = CProfileRun(args.cprofile).start() if args.cprofile else None
+        self.sampler = StackSampler(args.stack_sample, args.stack_interval_ms / 1e3).start() \
+            if args.stack_sample else None
+
+    @property
+    def enabled(self):
+        return self.stages is not None or self.cprofile is not None or self.sampler is not None
+
+    def finish(self, items=None, unit="vòng"):
+        lines = []
+        if self.cprofile is not None:
+            lines += self.cprofile.stop()
+            self.cprofile = None
+        if self.sampler is not None:
+            lines += self.sampler.stop()
+            self.sampler = None
+        if self.stages is not None:
+            lines += self.stages.report(items, unit)
+        return lines
@@ -0,0 +1,47 @@
+# Nhật ký quỹ đạo tốc độ của client --adaptive (Client/rate_control.py)
+# - Mỗi phản hồi của server (hoặc mỗi lần hết hạn chờ phản hồi) một dòng CSV:
+#   tốc độ mục tiêu sau quyết định, tốc độ client gửi thật, tốc độ server nhận được,
+#   mất gói / p50 / p99 / độ trễ xếp hàng của khoảng đó và hành động của bộ điều khiển
+# - analyze_results.py --rate-log vẽ thông lượng và độ trễ theo thời gian
+import csv
+
+RATE_LOG_FILE = "rate_log.csv"
+COLUMNS = ["time", "target_rate", "sent_pps", "delivered_pps", "loss_pct", "p50_ms", "p99_ms", "queue_ms",
+           "action"]
+
+
+class RateLog:
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._file = open(path, "w", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._file)
+        self._csv.writerow(COLUMNS)
+
+    def write(self, row):
+        """row: dict theo COLUMNS (số đã làm tròn sẵn)"""
+        self._csv.writerow([row[name] for name in COLUMNS])
+        self.rows += 1
+
+    def close(self):
+        self._file.close()
+
+
+def load_rate_log(path):
+    """Nhật ký tốc độ -> dict cột -> list (action là chuỗi, còn lại float); None nếu không đọc được"""
+    try:
+        with open(path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            rows = list(reader)
+    except (OSError, StopIteration):
+        return None
+    if header != COLUMNS or not rows:
+        return None
+    series = {name: [row[i] for row in rows] for i, name in enumerate(header)}
+    try:
+        for name in COLUMNS[:-1]:
+            series[name] = list(map(float, series[name]))
+    except ValueError:
+        return None
+    return series
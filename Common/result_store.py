@@ -0,0 +1,170 @@
+# Kho kết quả dạng cột nhị phân (thay cho results.csv với các lần chạy lớn)
+#
+# Một "file" kết quả là một thư mục *.col gồm:
+#   meta.json            mô tả định dạng, byte order và danh sách cột
+#   packet_id.bin        int64   (mảng liền, chỉ ghi nối thêm)
+#   send_time.bin        float64
+#   receive_time.bin     float64
+#   delay_ms.bin         float64
+# Server ghi bằng array.array (không cần numpy); analyzer mở từng cột
+# bằng numpy.memmap trong O(1), số dòng suy ra từ kích thước file.
+#
+# Chuyển CSV cũ sang dạng cột:
+#   python result_store.py ../Data/results.csv ../Data/results.col
+import argparse
+import csv
+import json
+import os
+import sys
+from array import array
+
+FORMAT_NAME = "udp-columnar"
+FORMAT_VERSION = 1
+EXTENSION = ".col"
+META_FILE = "meta.json"
+
+# (tên cột, typecode của array.array) - cùng thứ tự với dòng CSV
+COLUMNS = (
+    ("packet_id", "q"),
+    ("send_time", "d"),
+    ("receive_time", "d"),
+    ("delay_ms", "d"),
+)
+_NUMPY_KIND = {"q": "i8", "d": "f8"}
+
+CONVERT_CHUNK_ROWS = 100000
+
+
+def is_columnar(path):
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, META_FILE))
+
+
+def column_path(path, name):
+    return os.path.join(path, name + ".bin")
+
+
+class ColumnarSink:
+    """Đích ghi dạng cột: cùng giao diện write_rows/flush/close với CsvSink"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        prefix = "<" if sys.byteorder == "little" else ">"
+        meta = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "columns": [{"name": name, "dtype": prefix + _NUMPY_KIND[code]} for name, code in COLUMNS],
+        }
+        with open(os.path.join(path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+        self._files = [open(column_path(path, name), "wb") for name, _ in COLUMNS]
+
+    def write_rows(self, rows):
+        """Tách lô dòng thành các cột và nối thêm vào từng file cột"""
+        if not rows:
+            return
+        for (_, code), values, f in zip(COLUMNS, zip(*rows), self._files):
+            array(code, values).tofile(f)
+
+    def flush(self):
+        for f in self._files:
+            f.flush()
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+
+def read_meta(path):
+    with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("format") != FORMAT_NAME or meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"{path}: khong phai kho ket qua dang cot v{FORMAT_VERSION}")
+    return meta
+
+
+def open_columns(path):
+    """
+    Mở các cột bằng numpy.memmap (chỉ đọc, không parse) -> dict tên cột -> mảng.
+    Nếu đang bị ghi dở, các cột được cắt về cùng số dòng đầy đủ nhỏ nhất.
+    """
+    import numpy as np
+
+    meta = read_meta(path)
+    dtypes = [(c["name"], np.dtype(c["dtype"])) for c in meta["columns"]]
+    rows = min(os.path.getsize(column_path(path, name)) // dtype.itemsize for name, dtype in dtypes)
+
+    columns = {}
+    for name, dtype in dtypes:
+        if rows == 0:
+            columns[name] = np.empty(0, dtype=dtype)  # mmap không mở được file rỗng
+        else:
+            columns[name] = np.memmap(column_path(path, name), dtype=dtype, mode="r", shape=(rows,))
+    return columns
+
+
+def iter_rows(path, chunk_rows=CONVERT_CHUNK_ROWS):
+    """Duyệt từng dòng (packet_id, send_time, receive_time, delay_ms) không cần numpy"""
+    meta = read_meta(path)
+    native = "<" if sys.byteorder == "little" else ">"
+    swap = meta["columns"][0]["dtype"][0] != native
+    itemsize = array("q").itemsize
+    rows = min(os.path.getsize(column_path(path, name)) // itemsize for name, _ in COLUMNS)
+
+    files = [open(column_path(path, name), "rb") for name, _ in COLUMNS]
+    try:
+        done = 0
+        while done < rows:
+            n = min(chunk_rows, rows - done)
+            columns = []
+            for (_, code), f in zip(COLUMNS, files):
+                values = array(code)
+                values.fromfile(f, n)
+                if swap:
+                    values.byteswap()
+                columns.append(values)
+            yield from zip(*columns)
+            done += n
+    finally:
+        for f in files:
+            f.close()
+
+
+def convert_csv(csv_path, out_path, chunk_rows=CONVERT_CHUNK_ROWS):
+    """Chuyển một file results.csv sang kho dạng cột, trả về số dòng đã ghi"""
+    sink = ColumnarSink(out_path)
+    total = 0
+    try:
+        with open(csv_path, "r", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # bỏ dòng tiêu đề
+            chunk = []
+            for row in reader:
+                chunk.append((int(row[0]), float(row[1]), float(row[2]), float(row[3])))
+                if len(chunk) >= chunk_rows:
+                    sink.write_rows(chunk)
+                    total += len(chunk)
+                    chunk = []
+            sink.write_rows(chunk)
+            total += len(chunk)
+    finally:
+        sink.close()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chuyen file ket qua CSV sang dinh dang cot (*.col)")
+    parser.add_argument("csv_path", help="file CSV ket qua (packet_id,send_time,receive_time,delay_ms)")
+    parser.add_argument("out_path", nargs="?",
+                        help=f"thu muc dich (mac dinh: cung ten voi file CSV, duoi {EXTENSION})")
+    args = parser.parse_args()
+    out_path = args.out_path or os.path.splitext(args.csv_path)[0] + EXTENSION
+    try:
+        rows = convert_csv(args.csv_path, out_path)
+    except (OSError, ValueError) as e:
+        parser.error(f"khong chuyen duoc {args.csv_path}: {e}")
+    print(f"Da chuyen {rows} dong: {args.csv_path} -> {out_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# Kênh metrics trực tiếp qua shared memory (multiprocessing.shared_memory), không file, không khóa
+# - Server (MetricsPublisher) ghi vào một segment bố cục cố định:
+#     header    : magic, phiên bản, dung lượng vòng, slack, thời điểm bắt đầu, trạng thái, pid server
+#     snapshot  : bộ đếm (đã nhận, byte, lỗi parse, cắt cụt, hàng đợi ghi, bỏ, rxq_ovfl) bảo vệ bằng seqlock:
+#                 seq lẻ = đang ghi; reader đọc seq -> chép -> đọc lại seq, khác nhau/lẻ thì đọc lại
+#     vòng gói  : RING_CAPACITY bản ghi (packet_id, send_ns, receive_ns, delay_ns) 32 byte, chỉ số head
+#                 (tổng số bản ghi đã công bố) ghi sau dữ liệu
+# - Writer không bao giờ chờ reader: reader chậm bị ghi đè, tự phát hiện và đếm số bản ghi bị lỡ
+#   Writer ghi trước tối đa `slack` bản ghi chưa công bố, nên sau khi chép reader chỉ giữ bản ghi
+#   có chỉ số >= head + slack - capacity (đọc lại head sau khi chép)
+# - Thứ tự ghi dựa vào việc các lần ghi bộ nhớ hiện ra theo đúng thứ tự chương trình (x86);
+#   CPU sắp xếp lại lần ghi (ARM) có thể hiếm khi làm lọt một snapshot/bản ghi bị rách
+# - Reader (MetricsReader) gắn vào segment theo tên, không đăng ký với resource_tracker
+#   (nếu không, reader thoát sẽ xóa segment của server)
+# - Tên đã có segment: chỉ tạo lại khi segment đó đã cũ (server đã dừng / tiến trình không còn / không
+#   phải kênh metrics phiên bản này); server khác đang chạy thì báo lỗi, dùng --shm tên khác
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+SHM_NAME = "udp_metrics"
+RING_CAPACITY = 1 << 16      # số bản ghi gói gần nhất (lũy thừa 2), 2 MB
+COMMIT_EVERY = 64            # slack: số bản ghi tối đa ghi trước khi công bố head
+PUBLISH_INTERVAL = 0.5       # giây giữa hai snapshot bộ đếm
+MAGIC = b"UDPM"
+VERSION = 2
+
+STATE_RUNNING = 1
+STATE_STOPPED = 2
+
+SNAPSHOT_FIELDS = ("updated_ns", "received", "received_bytes", "errors", "truncated",
+                   "writer_queue", "writer_dropped", "rxq_ovfl")
+RECORD_FIELDS = ("packet_id", "send_ns", "receive_ns", "delay_ns")
+RECORD_DTYPE = [("packet_id", "<u8"), ("send_ns", "<i8"), ("receive_ns", "<i8"), ("delay_ns", "<i8")]
+
+_HEADER = struct.Struct("<4sIQQqQQ")  # magic, version, capacity, slack, started_ns, state, pid
+_U64 = struct.Struct("<Q")
+_SNAPSHOT = struct.Struct("<" + "q" * len(SNAPSHOT_FIELDS))
+_RECORD = struct.Struct("<Qqqq")
+RECORD_SIZE = _RECORD.size   # 32
+STATE_OFFSET = 32
+SEQ_OFFSET = 64
+SNAPSHOT_OFFSET = SEQ_OFFSET + 8
+HEAD_OFFSET = 192            # dòng cache riêng, tách khỏi snapshot
+RING_OFFSET = 256
+SPIN_RETRIES = 100           # số lần đọc lại snapshot trước khi nhường CPU
+
+
+def segment_size(capacity):
+    return RING_OFFSET + capacity * RECORD_SIZE
+
+
+class MetricsPublisher:
+    """Phía server: ghi bản ghi từng gói vào vòng và snapshot bộ đếm định kỳ (chỉ một luồng ghi)"""
+
+    def __init__(self, name=SHM_NAME, capacity=RING_CAPACITY, slack=COMMIT_EVERY, interval=PUBLISH_INTERVAL):
+        if capacity & (capacity - 1):
+            raise ValueError("capacity phải là lũy thừa của 2")
+        size = segment_size(capacity)
+        try:
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            owner = _owner(name)
+            if owner is not None:
+                raise FileExistsError(f"shared memory '{name}' đang được server pid {owner} dùng - "
+                                      f"chọn tên khác với --shm TÊN") from None
+            # Segment còn lại từ lần chạy bị kill: gỡ rồi tạo lại
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name, create=True, size=size)
+        self.name = name
+        self.buf = self.shm.buf
+        self.capacity = capacity
+        self.slack = slack
+        self.interval_ns = int(interval * 1e9)
+        self.next_publish = 0       # receive_ns của lần công bố snapshot kế tiếp
+        self.head = 0
+        self._published = 0
+        self._seq = 0
+        self._mask = capacity - 1
+        _HEADER.pack_into(self.buf, 0, MAGIC, VERSION, capacity, slack, time.time_ns(), STATE_RUNNING, os.getpid())
+
+    def record(self, packet_id, send_ns, receive_ns, delay_ns):
+        """Ghi một gói vào vòng (tự công bố sau mỗi `slack` bản ghi)"""
+        head = self.head
+        _RECORD.pack_into(self.buf, RING_OFFSET + (head & self._mask) * RECORD_SIZE,
+                          packet_id, send_ns, receive_ns, delay_ns)
+        self.head = head = head + 1
+        if head - self._published >= self.slack:
+            self.commit()
+
+    def commit(self):
+        """Công bố mọi bản ghi đã ghi (reader thấy tới head)"""
+        _U64.pack_into(self.buf, HEAD_OFFSET, self.head)
+        self._published = self.head
+
+    def publish(self, now_ns, **counters):
+        """Ghi snapshot bộ đếm (tên trong SNAPSHOT_FIELDS, thiếu = 0) theo seqlock, hẹn lần kế tiếp"""
+        self.commit()
+        self._seq += 1
+        _U64.pack_into(self.buf, SEQ_OFFSET, self._seq)           # lẻ: đang ghi
+        _SNAPSHOT.pack_into(self.buf, SNAPSHOT_OFFSET, now_ns,
+                            *(counters.get(field, 0) for field in SNAPSHOT_FIELDS[1:]))
+        self._seq += 1
+        _U64.pack_into(self.buf, SEQ_OFFSET, self._seq)           # chẵn: xong
+        self.next_publish = now_ns + self.interval_ns
+
+    def close(self):
+        """Đánh dấu đã dừng (reader đang gắn biết để kết thúc) rồi gỡ segment"""
+        self.commit()
+        _U64.pack_into(self.buf, STATE_OFFSET, STATE_STOPPED)
+        self.buf = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _attach(name):
+    """Gắn vào segment có sẵn mà không để resource_tracker của tiến trình này xóa nó khi thoát"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)   # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True     # tồn tại nhưng thuộc người dùng khác (hoặc không kiểm tra được): coi như còn
+    return True
+
+
+def _owner(name):
+    """pid của server đang dùng segment `name`, None nếu segment đã cũ (có thể gỡ)"""
+    shm = _attach(name)
+    try:
+        if shm.size < _HEADER.size:
+            return None
+        magic, version, _, _, _, state, pid = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION or state != STATE_RUNNING or not _pid_alive(pid):
+            return None
+        return pid
+    finally:
+        shm.close()
+
+
+class MetricsReader:
+    """Phía tiêu thụ (analyzer, live viewer): đọc snapshot và các bản ghi mới, không bao giờ chặn server"""
+
+    def __init__(self, name=SHM_NAME):
+        self.shm = _attach(name)
+        self.name = name
+        self.buf = self.shm.buf
+        magic, version, capacity, slack, started_ns, _, _ = _HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"segment {name} không phải kênh metrics phiên bản {VERSION}")
+        self.capacity = capacity
+        self.slack = slack
+        self.started_ns = started_ns
+        self.missed = 0         # số bản ghi bị ghi đè trước khi kịp đọc (tích lũy)
+
+    @property
+    def running(self):
+        return _U64.unpack_from(self.buf, STATE_OFFSET)[0] == STATE_RUNNING
+
+    def head(self):
+        return _U64.unpack_from(self.buf, HEAD_OFFSET)[0]
+
+    def oldest(self):
+        """Chỉ số bản ghi cũ nhất còn đọc được an toàn"""
+        return max(0, self.head() + self.slack - self.capacity)
+
+    def snapshot(self):
+        """dict theo SNAPSHOT_FIELDS (None nếu server chưa công bố lần nào)"""
+        tries = 0
+        while True:
+            before = _U64.unpack_from(self.buf, SEQ_OFFSET)[0]
+            if not before & 1:
+                values = _SNAPSHOT.unpack_from(self.buf, SNAPSHOT_OFFSET)
+                if _U64.unpack_from(self.buf, SEQ_OFFSET)[0] == before:
+                    return dict(zip(SNAPSHOT_FIELDS, values)) if before else None
+            tries += 1
+            if tries % SPIN_RETRIES == 0:
+                time.sleep(0)
+
+    def read(self, since):
+        """
+        Các bản ghi từ chỉ số `since` tới head hiện tại -> (records, next_since).
+        records: mảng numpy có cấu trúc (trường RECORD_FIELDS) nếu có numpy, ngược lại list tuple.
+        Bản ghi đã bị ghi đè (reader chậm hơn server) bị bỏ và cộng vào self.missed.
+        """
+        head = self.head()
+        start = max(since, head + self.slack - self.capacity)
+        if start >= head:
+            return self._decode(b""), head
+        # Chép một lần (tối đa 2 đoạn khi vòng quay lại đầu) rồi mới kiểm tra ghi đè
+        first = start & (self.capacity - 1)
+        count = head - start
+        end = first + count
+        if end <= self.capacity:
+            raw = bytes(self.buf[RING_OFFSET + first * RECORD_SIZE:RING_OFFSET + end * RECORD_SIZE])
+        else:
+            raw = bytes(self.buf[RING_OFFSET + first * RECORD_SIZE:]) + \
+                  bytes(self.buf[RING_OFFSET:RING_OFFSET + (end - self.capacity) * RECORD_SIZE])
+        valid_from = self.head() + self.slack - self.capacity
+        skip = max(0, valid_from - start)
+        self.missed += start - since + min(skip, count)
+        return self._decode(raw[skip * RECORD_SIZE:]), head
+
+    @staticmethod
+    def _decode(raw):
+        try:
+            import numpy as np
+        except ImportError:
+            return list(_RECORD.iter_unpack(raw))
+        return np.frombuffer(raw, dtype=RECORD_DTYPE)
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+
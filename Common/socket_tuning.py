@@ -0,0 +1,165 @@
+# Hồ sơ tinh chỉnh socket dùng chung cho server và client
+# - Hồ sơ = tên có sẵn trong PROFILES hoặc file JSON ({"profile": "<gốc>", "rcvbuf": ..., ...});
+#   các tham số dòng lệnh (--rcvbuf, --busy-poll, ...) ghi đè lên hồ sơ
+# - apply_tuning() đặt từng tùy chọn rồi đọc lại bằng getsockopt: kernel có thể làm tròn/nhân đôi
+#   (Linux nhân đôi SO_RCVBUF/SO_SNDBUF) hoặc cắt theo net.core.rmem_max/wmem_max, và tùy chọn cần
+#   quyền (SO_BUSY_POLL, SO_PRIORITY > 6) có thể bị từ chối -> ghi lại lỗi thay vì dừng chương trình
+# - Bản ghi (hồ sơ yêu cầu + giá trị hiệu lực) lưu cạnh file kết quả: <file kết quả>.tuning.json
+#   để analyze_results.py / bench_e2e.py nhóm và so sánh các lần chạy theo cấu hình
+import json
+import platform
+import socket
+import sys
+import time
+
+FORMAT_NAME = "udp-socket-tuning"
+FORMAT_VERSION = 1
+SUFFIX = ".tuning.json"
+
+POLLERS = ("select", "poll", "epoll")   # cách chờ socket không chặn sẵn sàng (server batch/workers)
+
+# Tùy chọn socket: tên -> (level, optname); None = không có trên nền tảng này
+# SO_BUSY_POLL (46) chưa có trong module socket của Python
+SOCKET_OPTIONS = {
+    "sndbuf": (socket.SOL_SOCKET, socket.SO_SNDBUF),
+    "rcvbuf": (socket.SOL_SOCKET, socket.SO_RCVBUF),
+    "busy_poll": (socket.SOL_SOCKET, getattr(socket, "SO_BUSY_POLL", 46)) if sys.platform.startswith("linux") else None,
+    "priority": (socket.SOL_SOCKET, socket.SO_PRIORITY) if hasattr(socket, "SO_PRIORITY") else None,
+    "tos": (socket.IPPROTO_IP, socket.IP_TOS) if hasattr(socket, "IP_TOS") else None,
+    "rcvlowat": (socket.SOL_SOCKET, socket.SO_RCVLOWAT) if hasattr(socket, "SO_RCVLOWAT") else None,
+}
+OPTIONS = tuple(SOCKET_OPTIONS) + ("poller",)
+
+PROFILES = {
+    "default": {},                                              # giữ mặc định của hệ điều hành
+    "buffers-64k": {"sndbuf": 65536, "rcvbuf": 65536},          # cấu hình cũ của client_optimized.py
+    "buffers-1m": {"sndbuf": 1 << 20, "rcvbuf": 1 << 20},
+    # server chịu burst: buffer nhận lớn (cần net.core.rmem_max đủ lớn), epoll
+    "throughput": {"sndbuf": 4 << 20, "rcvbuf": 8 << 20, "poller": "epoll"},
+    # busy-poll 50 µs (cần CAP_NET_ADMIN nếu lớn hơn net.core.busy_read), DSCP EF, ưu tiên hàng đợi 6
+    "low-latency": {"busy_poll": 50, "priority": 6, "tos": 0xB8, "poller": "poll"},
+}
+
+
+def load_tuning(spec):
+    """Tên hồ sơ hoặc đường dẫn file JSON -> dict {"name": ..., <tùy chọn>: giá trị}"""
+    if spec in PROFILES:
+        return {"name": spec, **PROFILES[spec]}
+    with open(spec, encoding="utf-8") as f:
+        config = json.load(f)
+    base = config.pop("profile", "default")
+    if base not in PROFILES:
+        raise ValueError(f"{spec}: ho so goc '{base}' khong ton tai")
+    unknown = set(config) - set(OPTIONS) - {"name"}
+    if unknown:
+        raise ValueError(f"{spec}: tuy chon khong ho tro: {', '.join(sorted(unknown))}")
+    return {**PROFILES[base], "name": spec, **config}
+
+
+def add_tuning_arguments(parser, default="default"):
+    """Thêm --tuning và các tham số ghi đè từng tùy chọn vào argparse parser"""
+    group = parser.add_argument_group("tinh chỉnh socket")
+    group.add_argument("--tuning", default=default,
+                       help=f"hồ sơ ({', '.join(PROFILES)}) hoặc file JSON; mặc định {default}")
+    group.add_argument("--sndbuf", type=int, help="SO_SNDBUF (byte)")
+    group.add_argument("--rcvbuf", type=int, help="SO_RCVBUF (byte)")
+    group.add_argument("--busy-poll", type=int, help="SO_BUSY_POLL (µs, Linux)")
+    group.add_argument("--priority", type=int, help="SO_PRIORITY (0-6 không cần quyền)")
+    group.add_argument("--tos", type=lambda v: int(v, 0), help="IP_TOS, VD 0xB8 (DSCP EF)")
+    group.add_argument("--rcvlowat", type=int, help="SO_RCVLOWAT (byte)")
+    group.add_argument("--poller", choices=POLLERS, help="chờ socket bằng select/poll/epoll (server batch)")
+    return group
+
+
+def tuning_from_args(args):
+    """Hồ sơ --tuning + các giá trị ghi đè trên dòng lệnh"""
+    tuning = load_tuning(args.tuning)
+    for option in OPTIONS:
+        value = getattr(args, option, None)
+        if value is not None:
+            tuning[option] = value
+    return tuning
+
+
+def apply_tuning(sock, tuning):
+    """
+    Đặt các tùy chọn của hồ sơ lên socket (gọi trước bind/connect), đọc lại giá trị hiệu lực.
+    Trả về {"effective": {tùy chọn: giá trị}, "errors": {tùy chọn: lý do}}.
+    sndbuf/rcvbuf luôn được đọc lại kể cả khi hồ sơ không đặt (để biết mặc định của kernel).
+    """
+    effective = {}
+    errors = {}
+    for option, spec in SOCKET_OPTIONS.items():
+        requested = tuning.get(option)
+        if requested is None and option not in ("sndbuf", "rcvbuf"):
+            continue
+        if spec is None:
+            errors[option] = "khong ho tro tren nen tang nay"
+            continue
+        level, name = spec
+        if requested is not None:
+            try:
+                sock.setsockopt(level, name, requested)
+            except OSError as e:
+                errors[option] = e.strerror or str(e)
+        try:
+            effective[option] = sock.getsockopt(level, name)
+        except OSError as e:
+            errors.setdefault(option, e.strerror or str(e))
+    if tuning.get("poller"):
+        effective["poller"] = tuning["poller"]
+    return {"effective": effective, "errors": errors}
+
+
+def describe(tuning, applied):
+    """Một dòng: tên hồ sơ, yêu cầu -> hiệu lực, lỗi"""
+    parts = []
+    for option in OPTIONS:
+        value = applied["effective"].get(option)
+        if value is None and option not in applied["errors"]:
+            continue
+        requested = tuning.get(option)
+        if option in applied["errors"]:
+            parts.append(f"{option} {requested} LỖI ({applied['errors'][option]})")
+        elif requested is None or requested == value:
+            parts.append(f"{option} {value}")
+        else:
+            parts.append(f"{option} {requested}->{value}")
+    return f"{tuning['name']}: " + (", ".join(parts) if parts else "mặc định")
+
+
+def make_record(role, tuning, applied):
+    """Bản ghi JSON: hồ sơ yêu cầu + giá trị hiệu lực + thông tin máy"""
+    return {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "role": role,
+        "name": tuning["name"],
+        "requested": {k: v for k, v in tuning.items() if k != "name"},
+        "effective": applied["effective"],
+        "errors": applied["errors"],
+        "platform": platform.platform(),
+        "recorded": time.time(),
+    }
+
+
+def tuning_path(result_path):
+    return result_path.rstrip("/\\") + SUFFIX
+
+
+def save_record(result_path, record):
+    """Ghi bản ghi cạnh file kết quả, trả về đường dẫn"""
+    path = tuning_path(result_path)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, indent=2)
+    return path
+
+
+def load_record(result_path):
+    """Bản ghi tinh chỉnh của một file kết quả, None nếu không có"""
+    try:
+        with open(tuning_path(result_path), encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return record if record.get("format") == FORMAT_NAME else None
@@ -0,0 +1,80 @@
+# Gói lớn và UDP segmentation offload (Linux)
+# - Kích thước payload: số byte hoặc tên (small 256, mtu 1472 = 1500 - IP - UDP, jumbo 8972, max 65507
+#   = datagram IPv4 lớn nhất); gói lớn hơn MTU của đường đi bị IP phân mảnh
+# - GSO (UDP_SEGMENT, Linux 4.18+): sender ghi một "siêu datagram" gồm nhiều gói liền nhau cùng kích thước,
+#   kernel cắt thành từng datagram -> một syscall / một lượt qua network stack cho cả lô
+#   Giới hạn: tối đa GSO_MAX_SEGMENTS đoạn, tổng <= MAX_DATAGRAM, mỗi đoạn + header <= MTU của đường đi
+# - GRO (UDP_GRO, Linux 5.0+): receiver nhận nhiều datagram liên tiếp của cùng flow gộp thành một,
+#   kích thước mỗi đoạn đọc từ ancillary data (SOL_UDP, UDP_GRO); đoạn cuối có thể ngắn hơn
+#   Trên loopback, siêu datagram GSO tới socket bật GRO được giao nguyên khối
+# - Kernel/nền tảng không hỗ trợ: enable_* trả về False, nơi gọi quay về gửi/nhận từng datagram
+import socket
+import struct
+
+SOL_UDP = getattr(socket, "SOL_UDP", 17)
+UDP_SEGMENT = getattr(socket, "UDP_SEGMENT", 103)   # linux/udp.h
+UDP_GRO = getattr(socket, "UDP_GRO", 104)
+
+MAX_DATAGRAM = 65507       # 65535 - 20 (IPv4) - 8 (UDP)
+MTU_PAYLOAD = 1472         # Ethernet MTU 1500 - 20 - 8
+GSO_MAX_SEGMENTS = 64      # UDP_MAX_SEGMENTS của kernel (128 từ Linux 6.x, 64 là mức an toàn)
+SIZE_PRESETS = {"small": 256, "mtu": MTU_PAYLOAD, "jumbo": 8972, "max": MAX_DATAGRAM}
+
+_INT = struct.Struct("@i")
+GRO_CONTROL_SIZE = socket.CMSG_SPACE(_INT.size) if hasattr(socket, "CMSG_SPACE") else 0
+
+
+def parse_size(value):
+    """Kích thước payload từ dòng lệnh: số byte, hậu tố k (1024) hoặc tên trong SIZE_PRESETS"""
+    text = str(value).strip().lower()
+    if text in SIZE_PRESETS:
+        return SIZE_PRESETS[text]
+    size = int(text[:-1]) * 1024 if text.endswith("k") else int(text)
+    # "64k" nghĩa là datagram lớn nhất có thể, không phải 65536 (vượt giới hạn IPv4)
+    return min(size, MAX_DATAGRAM)
+
+
+def enable_gso(sock, segment_size):
+    """Đặt UDP_SEGMENT cho socket: mỗi lần send được kernel cắt thành đoạn segment_size byte"""
+    try:
+        sock.setsockopt(SOL_UDP, UDP_SEGMENT, segment_size)
+    except OSError:
+        return False
+    return True
+
+
+def disable_gso(sock):
+    try:
+        sock.setsockopt(SOL_UDP, UDP_SEGMENT, 0)
+    except OSError:
+        pass
+
+
+def enable_gro(sock):
+    """Bật UDP_GRO: kernel gộp datagram cùng flow, báo kích thước đoạn qua ancillary data"""
+    try:
+        sock.setsockopt(SOL_UDP, UDP_GRO, 1)
+    except OSError:
+        return False
+    return True
+
+
+def gso_segments(segment_size, max_segments=GSO_MAX_SEGMENTS):
+    """Số gói tối đa trong một siêu datagram GSO với gói segment_size byte (1 = GSO không có ích)"""
+    return max(1, min(max_segments, MAX_DATAGRAM // segment_size))
+
+
+def parse_gro(ancdata):
+    """Kích thước đoạn GRO từ ancdata của recvmsg (None nếu datagram không bị gộp)"""
+    for level, kind, data in ancdata:
+        if level == SOL_UDP and kind == UDP_GRO and len(data) >= _INT.size:
+            return _INT.unpack_from(data)[0]
+    return None
+
+
+def throughput(total_bytes, seconds):
+    """
+    MB/s (10^6 byte) theo kích thước datagram UDP: gồm header đo của wire_format (HEADER_SIZE byte mỗi gói),
+    không gồm header IP/UDP - không phải goodput của payload ứng dụng
+    """
+    return total_bytes / seconds / 1e6 if seconds > 0 else 0.0
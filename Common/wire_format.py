@@ -0,0 +1,178 @@
+# Định dạng gói tin giữa client và server
+# - binary (mặc định): header nhị phân cố định, có phiên bản, timestamp nanosecond
+# - text (cũ): "packet_id,send_time" (client tối ưu đệm thêm '-' cho đủ kích thước)
+#
+# Layout header v1 (network byte order, 36 bytes):
+#   magic        H   0x5544 ("UD") - phân biệt với gói text (bắt đầu bằng chữ số)
+#   version      B   1
+#   flags        B   FLAG_ECHO_REQUEST / FLAG_ECHO_REPLY / FLAG_SYNCED
+#   session_id   I   id phiên của sender
+#   packet_id    Q   số thứ tự gói trong phiên
+#   send_wall_ns q   time.time_ns() lúc gửi
+#   send_mono_ns q   time.monotonic_ns() lúc gửi (chỉ so sánh được trên cùng máy)
+#   payload_len  I   số byte payload phía sau header
+#
+# Gói echo (đo lệch đồng hồ, xem Common/clock_sync.py): client gửi header với
+# FLAG_ECHO_REQUEST tới cổng echo; server trả lại nguyên header với FLAG_ECHO_REPLY
+# kèm payload ECHO = (server_receive_ns, server_send_ns) theo đồng hồ wall của server
+#
+# Gói phản hồi (server.py --feedback, xem Server/feedback.py): server gửi định kỳ về đúng
+# địa chỉ nguồn của từng flow một header FLAG_FEEDBACK (session_id của flow, packet_id = số thứ
+# tự phản hồi, timestamp = lúc server gửi) kèm payload FEEDBACK của khoảng vừa qua:
+#   highest_id Q, received I, expected I (số id mới phủ thêm), min/p50/p99 delay q (ns), interval_us I
+import struct
+import time
+
+MAGIC = 0x5544
+VERSION = 1
+HEADER = struct.Struct("!HBBIQqqI")
+HEADER_SIZE = HEADER.size
+_MAGIC_HI, _MAGIC_LO = MAGIC >> 8, MAGIC & 0xFF
+
+# Phần thay đổi theo từng gói (packet_id, send_wall_ns, send_mono_ns) nằm liền nhau
+# sau 8 byte đầu -> gói dựng sẵn chỉ cần ghi lại 24 byte này
+STAMP = struct.Struct("!Qqq")
+STAMP_OFFSET = struct.calcsize("!HBBI")
+
+FLAG_ECHO_REQUEST = 0x01
+FLAG_ECHO_REPLY = 0x02
+FLAG_SYNCED = 0x04        # send_wall_ns đã được client quy đổi sang đồng hồ của server
+FLAG_FEEDBACK = 0x08      # gói phản hồi server -> client (điều khiển tốc độ)
+
+ECHO = struct.Struct("!qq")
+FEEDBACK = struct.Struct("!QIIqqqI")
+FEEDBACK_FIELDS = ("highest_id", "received", "expected", "min_delay_ns", "p50_delay_ns", "p99_delay_ns",
+                   "interval_us")
+
+# Đồng hồ server dùng để tính độ trễ
+CLOCK_WALL = "wall"       # time.time_ns() hai phía (khác máy cần client --sync)
+CLOCK_MONO = "mono"       # time.monotonic_ns() hai phía (chỉ cùng máy, không bị NTP chỉnh)
+CLOCKS = (CLOCK_WALL, CLOCK_MONO)
+
+FORMAT_BINARY = "binary"
+FORMAT_TEXT = "text"
+FORMATS = (FORMAT_BINARY, FORMAT_TEXT)
+
+_unpack_from = HEADER.unpack_from
+
+
+def new_packet(size=HEADER_SIZE):
+    """Cấp phát sẵn một bộ đệm gói (payload đệm 0) để ghi header vào chỗ"""
+    return bytearray(max(size, HEADER_SIZE))
+
+
+def pack_header(buf, packet_id, session_id=0, wall_ns=None, mono_ns=None, flags=0, offset=0):
+    """Ghi header vào buf tại offset (không cấp phát); payload là phần còn lại của buf"""
+    if wall_ns is None:
+        wall_ns = time.time_ns()
+    if mono_ns is None:
+        mono_ns = time.monotonic_ns()
+    HEADER.pack_into(buf, offset, MAGIC, VERSION, flags, session_id, packet_id,
+                     wall_ns, mono_ns, len(buf) - offset - HEADER_SIZE)
+
+
+def stamp_header(buf, packet_id, wall_ns, mono_ns, offset=0):
+    """Chỉ ghi lại packet_id + timestamp của một header đã dựng sẵn bằng pack_header"""
+    STAMP.pack_into(buf, offset + STAMP_OFFSET, packet_id, wall_ns, mono_ns)
+
+
+def encode_text(packet_id, send_time, size=0):
+    """Gói text cũ: 'id,send_time', đệm '-' cho đủ size byte nếu có"""
+    return f"{packet_id},{send_time}".encode().ljust(size, b'-')
+
+
+def is_binary(buf, offset=0):
+    """So 2 byte magic bằng chỉ số nguyên (không cắt lát, không cấp phát)"""
+    return len(buf) - offset >= HEADER_SIZE and buf[offset] == _MAGIC_HI and buf[offset + 1] == _MAGIC_LO
+
+
+def parse_binary(buf, offset=0):
+    """
+    Đọc header nhị phân trực tiếp từ bytearray/memoryview (không copy).
+    Trả về (packet_id, send_wall_ns, session_id, send_mono_ns)
+    """
+    magic, version, _, session_id, packet_id, wall_ns, mono_ns, _ = _unpack_from(buf, offset)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"header khong hop le (magic={magic:#x}, version={version})")
+    return packet_id, wall_ns, session_id, mono_ns
+
+
+def send_mono_ns(buf, start, end):
+    """send_mono_ns của gói nhị phân, None với gói text (không có đồng hồ monotonic)"""
+    if end - start >= HEADER_SIZE and buf[start] == _MAGIC_HI and buf[start + 1] == _MAGIC_LO:
+        return _unpack_from(buf, start)[6]
+    return None
+
+
+def echo_reply(request, receive_ns):
+    """Dựng gói trả lời echo: header của yêu cầu + (thời điểm server nhận, thời điểm server gửi)"""
+    _, _, flags, session_id, packet_id, wall_ns, mono_ns, _ = parse_header(request)
+    reply = bytearray(HEADER_SIZE + ECHO.size)
+    HEADER.pack_into(reply, 0, MAGIC, VERSION, (flags & ~FLAG_ECHO_REQUEST) | FLAG_ECHO_REPLY,
+                     session_id, packet_id, wall_ns, mono_ns, ECHO.size)
+    ECHO.pack_into(reply, HEADER_SIZE, receive_ns, time.time_ns())
+    return reply
+
+
+def parse_echo_reply(buf):
+    """Trả về (packet_id, client_send_ns, server_receive_ns, server_send_ns)"""
+    _, _, flags, _, packet_id, wall_ns, _, _ = parse_header(buf)
+    if not flags & FLAG_ECHO_REPLY or len(buf) < HEADER_SIZE + ECHO.size:
+        raise ValueError("khong phai goi tra loi echo")
+    server_receive_ns, server_send_ns = ECHO.unpack_from(buf, HEADER_SIZE)
+    return packet_id, wall_ns, server_receive_ns, server_send_ns
+
+
+def feedback_packet(session_id, seq, highest_id, received, expected, min_ns, p50_ns, p99_ns, interval_us):
+    """Dựng gói phản hồi của một flow cho khoảng vừa qua"""
+    packet = bytearray(HEADER_SIZE + FEEDBACK.size)
+    HEADER.pack_into(packet, 0, MAGIC, VERSION, FLAG_FEEDBACK, session_id, seq,
+                     time.time_ns(), time.monotonic_ns(), FEEDBACK.size)
+    FEEDBACK.pack_into(packet, HEADER_SIZE, highest_id, received, expected, min_ns, p50_ns, p99_ns, interval_us)
+    return packet
+
+
+def parse_feedback(buf):
+    """Gói phản hồi -> dict (session_id, seq, server_send_ns + các trường FEEDBACK_FIELDS)"""
+    _, _, flags, session_id, seq, wall_ns, _, _ = parse_header(buf)
+    if not flags & FLAG_FEEDBACK or len(buf) < HEADER_SIZE + FEEDBACK.size:
+        raise ValueError("khong phai goi phan hoi")
+    feedback = dict(zip(FEEDBACK_FIELDS, FEEDBACK.unpack_from(buf, HEADER_SIZE)))
+    feedback.update(session_id=session_id, seq=seq, server_send_ns=wall_ns)
+    return feedback
+
+
+def parse_header(buf, offset=0):
+    """Đọc toàn bộ các trường header nhị phân (kiểm tra magic/version)"""
+    if len(buf) - offset < HEADER_SIZE:
+        raise ValueError("goi qua ngan cho header nhi phan")
+    fields = _unpack_from(buf, offset)
+    if fields[0] != MAGIC or fields[1] != VERSION:
+        raise ValueError(f"header khong hop le (magic={fields[0]:#x}, version={fields[1]})")
+    return fields
+
+
+def parse_text(buf, start, end):
+    """
+    Đọc packet_id và send_time từ gói dạng text "id,send_time[----]"
+    mà không decode() hay split() (chỉ cắt lát bytes nhỏ cho int/float)
+    """
+    comma = buf.find(b",", start, end)
+    if comma < 0:
+        raise ValueError("goi tin khong dung dinh dang 'id,send_time'")
+    stop = buf.find(b"-", comma + 1, end)  # bỏ phần đệm '-' của client tối ưu
+    if stop < 0:
+        stop = end
+    return int(buf[start:comma]), float(buf[comma + 1:stop])
+
+
+def parse_packet(buf, start, end):
+    """
+    Tự nhận dạng định dạng và trả về (packet_id, send_wall_ns, session_id).
+    Gói text không có session nên session_id = 0.
+    """
+    if end - start >= HEADER_SIZE and buf[start] == _MAGIC_HI and buf[start + 1] == _MAGIC_LO:
+        packet_id, wall_ns, session_id, _ = parse_binary(buf, start)
+        return packet_id, wall_ns, session_id
+    packet_id, send_time = parse_text(buf, start, end)
+    return packet_id, int(send_time * 1e9), 0
@@ -0,0 +1,243 @@
+# Server asyncio (DatagramProtocol) đo nhiều client đồng thời
+# - Mỗi phiên được xác định bởi (địa chỉ client, session_id trong header nhị phân)
+# - Trạng thái mỗi phiên gọn: bộ đếm + bitmap trượt các packet_id gần nhất
+#   để phân biệt gói đảo thứ tự / trùng lặp và tính mất gói
+# - Phiên không nhận gói quá SESSION_IDLE_TIMEOUT giây thì đóng (ghi nốt file),
+#   server vẫn chạy tiếp cho tới khi Ctrl+C
+# - Kết quả mỗi phiên ghi vào data/sessions/<ip>_<port>_<session_id>.csv (hoặc .col)
+# - feedback: gửi phản hồi định kỳ (Server/feedback.py) về từng phiên qua transport
+# - live: thống kê trực tiếp gộp mọi phiên (Server/live_metrics.py), in thêm bên cạnh bảng phiên
+import asyncio
+import os
+import time
+
+from feedback import FeedbackSender
+from result_store import EXTENSION, ColumnarSink
+from result_writer import AsyncResultWriter, CsvSink
+from wire_format import CLOCK_MONO, CLOCK_WALL, parse_packet, send_mono_ns
+
+SESSION_IDLE_TIMEOUT = 10     # giây không có gói thì coi phiên đã kết thúc
+CHECK_INTERVAL = 1            # chu kỳ kiểm tra phiên hết hạn + đẩy bộ đệm dòng
+REPORT_INTERVAL = 5           # in bảng các phiên đang hoạt động mỗi 5 giây
+ROW_BUFFER = 256              # gom bao nhiêu dòng mới đẩy sang luồng ghi
+REORDER_WINDOW = 4096         # số packet_id gần nhất được nhớ trong bitmap
+SESSIONS_DIR = os.path.join("data", "sessions")
+
+_WINDOW_MASK = (1 << REORDER_WINDOW) - 1
+
+
+class Session:
+    """Trạng thái một phiên gửi"""
+    __slots__ = ("key", "path", "writer", "rows", "first_id", "highest", "recent",
+                 "received", "duplicates", "reordered", "late", "delay_sum_ns",
+                 "created", "last_seen")
+
+    def __init__(self, key, path, sink):
+        self.key = key
+        self.path = path
+        self.writer = AsyncResultWriter(sink)
+        self.rows = []
+        self.first_id = None
+        self.highest = None
+        self.recent = 0          # bit i = đã nhận packet_id (highest - i)
+        self.received = 0
+        self.duplicates = 0
+        self.reordered = 0
+        self.late = 0            # đến muộn hơn cửa sổ bitmap (không phân biệt được trùng)
+        self.delay_sum_ns = 0
+        self.created = self.last_seen = time.monotonic()
+
+    def record(self, packet_id, send_ns, receive_ns, delay_ns):
+        self.received += 1
+        self.last_seen = time.monotonic()
+        self.delay_sum_ns += delay_ns
+
+        if self.highest is None:
+            self.first_id = self.highest = packet_id
+            self.recent = 1
+        elif packet_id > self.highest:
+            shift = packet_id - self.highest
+            self.recent = ((self.recent << shift) | 1) & _WINDOW_MASK if shift < REORDER_WINDOW else 1
+            self.highest = packet_id
+        else:
+            back = self.highest - packet_id
+            if back >= REORDER_WINDOW:
+                self.late += 1
+            elif (self.recent >> back) & 1:
+                self.duplicates += 1
+            else:
+                self.recent |= 1 << back
+                self.reordered += 1
+            if packet_id < self.first_id:
+                self.first_id = packet_id
+
+        self.rows.append((packet_id, send_ns / 1e9, receive_ns / 1e9, round(delay_ns / 1e6, 6)))
+        if len(self.rows) >= ROW_BUFFER:
+            self.flush_rows()
+
+    def flush_rows(self):
+        if self.rows:
+            self.writer.writerows(self.rows)
+            self.rows = []
+
+    @property
+    def lost(self):
+        if self.highest is None:
+            return 0
+        return max(0, (self.highest - self.first_id + 1) - (self.received - self.duplicates))
+
+    def summary(self):
+        expected = self.highest - self.first_id + 1 if self.highest is not None else 0
+        duration = max(self.last_seen - self.created, 1e-9)
+        return (f"{self.key[0][0]}:{self.key[0][1]} sid={self.key[1]} | nhận {self.received} "
+                f"({self.received / duration:.0f}/s) | delay TB "
+                f"{self.delay_sum_ns / self.received / 1e6 if self.received else 0:.3f} ms | "
+                f"mất {self.lost} ({self.lost / expected * 100 if expected else 0:.2f}%) | "
+                f"đảo {self.reordered} | trùng {self.duplicates} | muộn {self.late}")
+
+    def close(self):
+        self.flush_rows()
+        self.writer.close()
+
+
+class SessionServer(asyncio.DatagramProtocol):
+    def __init__(self, output="csv", sessions_dir=SESSIONS_DIR, idle_timeout=SESSION_IDLE_TIMEOUT,
+                 clock=CLOCK_WALL, feedback=None, live=None):
+        self.output = output
+        self.live = live           # LiveMetrics hoặc None
+        self.feedback_interval = feedback
+        self.feedback = None       # FeedbackSender, tạo khi có transport
+        self.mono = clock == CLOCK_MONO
+        self.sessions_dir = sessions_dir
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.finished = 0
+        self.errors = 0
+        os.makedirs(sessions_dir, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # DatagramProtocol
+    # ------------------------------------------------------------------
+    def connection_made(self, transport):
+        if self.feedback_interval:
+            self.feedback = FeedbackSender(transport.sendto, self.feedback_interval)
+
+    def datagram_received(self, data, addr):
+        receive_ns = time.time_ns()
+        try:
+            packet_id, send_ns, session_id = parse_packet(data, 0, len(data))
+        except ValueError:
+            self.errors += 1
+            return
+        delay_ns = receive_ns - send_ns
+        if self.mono:
+            send_mono = send_mono_ns(data, 0, len(data))
+            if send_mono is not None:
+                delay_ns = time.monotonic_ns() - send_mono
+
+        key = (addr, session_id)
+        session = self.sessions.get(key)
+        if session is None:
+            session = self._open_session(key)
+        session.record(packet_id, send_ns, receive_ns, delay_ns)
+
+        live = self.live
+        if live is not None:
+            live.record(packet_id, delay_ns, receive_ns, session_id)
+            live.maybe_report(receive_ns)
+
+        feedback = self.feedback
+        if feedback is not None:
+            if key not in feedback:
+                feedback.open(key, addr)
+            feedback.record(key, packet_id, delay_ns, receive_ns)
+            feedback.maybe_send(receive_ns)
+
+    def error_received(self, exc):
+        print(f"[LỖI] {exc}")
+
+    # ------------------------------------------------------------------
+    # Quản lý phiên
+    # ------------------------------------------------------------------
+    def _open_session(self, key):
+        (host, port), session_id = key
+        name = f"{host.replace(':', '-')}_{port}_{session_id}"
+        if self.output == "columnar":
+            path = os.path.join(self.sessions_dir, name + EXTENSION)
+            sink = ColumnarSink(path)
+        else:
+            path = os.path.join(self.sessions_dir, name + ".csv")
+            sink = CsvSink(path)
+        session = self.sessions[key] = Session(key, path, sink)
+        print(f"[SESSION+] {host}:{port} sid={session_id} -> {path}")
+        return session
+
+    def close_session(self, key, reason):
+        session = self.sessions.pop(key)
+        session.close()
+        self.finished += 1
+        print(f"[SESSION-] ({reason}) {session.summary()}")
+
+    def tick(self):
+        """Đẩy bộ đệm dòng sang luồng ghi và đóng các phiên đã nhàn rỗi quá lâu"""
+        now = time.monotonic()
+        for key, session in list(self.sessions.items()):
+            if now - session.last_seen >= self.idle_timeout:
+                self.close_session(key, "het han")
+            else:
+                session.flush_rows()
+
+    def report(self):
+        if not self.sessions:
+            return
+        print(f"[ASYNC] {len(self.sessions)} phiên đang hoạt động, {self.finished} đã kết thúc, "
+              f"lỗi parse: {self.errors}")
+        for session in self.sessions.values():
+            print(f"   {session.summary()}")
+
+    def close_all(self):
+        for key in list(self.sessions):
+            self.close_session(key, "dung server")
+        if self.live is not None:
+            self.live.final_report()
+        if self.feedback is not None:
+            print(f"[FEEDBACK] Đã gửi {self.feedback.sent} gói phản hồi, lỗi gửi {self.feedback.errors}")
+
+
+async def serve(host, port, output="csv", idle_timeout=SESSION_IDLE_TIMEOUT, clock=CLOCK_WALL, sock=None,
+                feedback=None, live=None):
+    """
+    sock: socket đã bind (và tinh chỉnh) sẵn; None thì tự bind host:port. feedback: chu kỳ phản hồi (giây).
+    live: LiveMetrics nhận mọi gói (None = tắt)
+    """
+    loop = asyncio.get_running_loop()
+
+    def factory():
+        return SessionServer(output, idle_timeout=idle_timeout, clock=clock, feedback=feedback, live=live)
+
+    if sock is not None:
+        transport, server = await loop.create_datagram_endpoint(factory, sock=sock)
+    else:
+        transport, server = await loop.create_datagram_endpoint(factory, local_addr=(host, port))
+    print(f"[SERVER] asyncio lắng nghe {host}:{port}, phiên hết hạn sau {idle_timeout}s nhàn rỗi")
+
+    try:
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(CHECK_INTERVAL)
+            server.tick()
+            if time.monotonic() - last_report >= REPORT_INTERVAL:
+                server.report()
+                last_report = time.monotonic()
+    finally:
+        transport.close()
+        server.close_all()
+
+
+def run(host, port, output="csv", idle_timeout=SESSION_IDLE_TIMEOUT, clock=CLOCK_WALL, sock=None, feedback=None,
+        live=None):
+    """Chạy server asyncio tới khi Ctrl+C"""
+    try:
+        asyncio.run(serve(host, port, output, idle_timeout, clock, sock, feedback, live))
+    except KeyboardInterrupt:
+        print("\n[SERVER] Nhận Ctrl+C, đã đóng tất cả phiên.")
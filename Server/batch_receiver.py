@@ -0,0 +1,222 @@
+# Nhận gói theo lô (batch) vào vùng đệm cấp phát sẵn
+# - Linux: dùng recvmmsg qua ctypes (1 syscall lấy nhiều datagram)
+# - Nền tảng khác: vòng lặp recv_into không chặn trên cùng vùng đệm
+# - Chờ socket sẵn sàng bằng select (mặc định), poll hoặc epoll (hồ sơ tinh chỉnh "poller")
+# - rxq_ovfl=True: bật SO_RXQ_OVFL, đọc số gói kernel đã bỏ từ ancillary data của gói cuối mỗi lô
+# - addresses=True: giữ địa chỉ nguồn từng gói, đọc khi cần bằng address(i) (phản hồi về client)
+#   hoặc address_key(i) (khóa thô, tra bảng theo từng gói ở relay)
+# - gro=True: bật UDP_GRO, ô thứ i có thể chứa nhiều gói cùng kích thước segments[i] nối liền nhau
+#   (0 = một datagram); ô được nới tới GRO_SLOT_SIZE để không cắt mất gói đã gộp
+# - truncated: số datagram dài hơn ô (bị cắt cụt): cờ MSG_TRUNC của recvmmsg/recvmsg; vòng recv_into
+#   nhận với MSG_TRUNC (Linux) để kernel trả về độ dài thật. Datagram dài đúng slot_size là nguyên vẹn
+import ctypes
+import errno
+import os
+import select
+import socket
+import sys
+
+from kernel_counters import SO_RXQ_OVFL, enable_rxq_ovfl, parse_rxq_ovfl
+from mmsg import (SOCKADDR_SIZE, MMsgHdr, attach_control, attach_names, build_msgs, load_libc, read_cmsg_u32,
+                  read_sockaddr, reset_control, reset_names)
+from udp_offload import GRO_CONTROL_SIZE, SOL_UDP, UDP_GRO, enable_gro, parse_gro
+
+BATCH_SIZE = 64        # số datagram tối đa mỗi lần rút socket
+SLOT_SIZE = 2048       # kích thước mỗi ô trong vùng đệm (đủ cho 1 gói MTU 1500)
+GRO_SLOT_SIZE = 65536  # GRO gộp tối đa 64 KB mỗi lần nhận
+
+_MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+_MSG_TRUNC = getattr(socket, "MSG_TRUNC", 0x20)
+# recv(MSG_TRUNC) trả về độ dài thật của datagram chỉ trên Linux (nơi khác: không phát hiện được)
+_RECV_TRUNC = _MSG_TRUNC if sys.platform.startswith("linux") else 0
+_RETRY_ERRNOS = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+_recvmmsg = load_libc("recvmmsg", [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint,
+                                    ctypes.c_int, ctypes.c_void_p])
+HAS_RECVMMSG = _recvmmsg is not None
+
+
+class BatchReceiver:
+    """
+    Rút socket theo lô vào một bytearray cấp phát sẵn (vòng ô cố định).
+    Gói thứ i của lô nằm ở buffer[i * slot_size : i * slot_size + lengths[i]].
+    """
+
+    def __init__(self, sock, batch_size=BATCH_SIZE, slot_size=SLOT_SIZE, use_recvmmsg=True, poller="select",
+                 rxq_ovfl=False, addresses=False, gro=False):
+        self.sock = sock
+        self.gro = gro and enable_gro(sock)
+        if self.gro:
+            slot_size = max(slot_size, GRO_SLOT_SIZE)
+        self.batch_size = batch_size
+        self.slot_size = slot_size
+        self.buffer = bytearray(batch_size * slot_size)
+        self.view = memoryview(self.buffer)
+        self.lengths = [0] * batch_size
+        self.segments = [0] * batch_size   # kích thước đoạn GRO của từng ô (0 = không gộp)
+        self.truncated = 0
+        self._slots = [self.view[i * slot_size:(i + 1) * slot_size] for i in range(batch_size)]
+
+        # Socket tự quản lý việc chờ bằng select/poll/epoll -> chuyển sang không chặn
+        sock.setblocking(False)
+        self._poll = None
+        self.poller = "select"
+        if poller == "epoll" and hasattr(select, "epoll"):
+            self._poll = select.epoll()
+            self._poll.register(sock.fileno(), select.EPOLLIN)
+            self._poll_scale = 1         # epoll.poll nhận giây
+            self.poller = "epoll"
+        elif poller in ("poll", "epoll") and hasattr(select, "poll"):
+            self._poll = select.poll()
+            self._poll.register(sock.fileno(), select.POLLIN)
+            self._poll_scale = 1000      # poll.poll nhận mili giây
+            self.poller = "poll"
+
+        self.rxq_ovfl = 0       # số gói kernel đã bỏ (SO_RXQ_OVFL, tích lũy)
+        self._rxq_ovfl = rxq_ovfl and enable_rxq_ovfl(sock)
+        self._control_size = (socket.CMSG_SPACE(4) if self._rxq_ovfl else 0) + (GRO_CONTROL_SIZE if self.gro else 0)
+        self.addresses = addresses
+        self._addresses = [None] * batch_size   # địa chỉ nguồn (vòng recv_into/recvmsg_into)
+
+        self.use_recvmmsg = use_recvmmsg and HAS_RECVMMSG
+        if self.use_recvmmsg:
+            self._setup_mmsg()
+
+    def _setup_mmsg(self):
+        """Dựng mảng mmsghdr/iovec trỏ thẳng vào các ô của vùng đệm"""
+        self._c_buffer, self._iovecs, self._msgs = build_msgs(self.buffer, self.batch_size, self.slot_size)
+        if self._control_size:
+            self._control = attach_control(self._msgs, self.batch_size, self._control_size)
+        if self.addresses:
+            self._names = attach_names(self._msgs, self.batch_size)
+            self._names_view = memoryview(self._names).cast("B")
+
+    def wait(self, timeout):
+        """Chờ socket có dữ liệu; ném socket.timeout nếu hết thời gian"""
+        if self._poll is not None:
+            ready = self._poll.poll(None if timeout is None else timeout * self._poll_scale)
+        else:
+            ready, _, _ = select.select([self.sock], [], [], timeout)
+        if not ready:
+            raise socket.timeout("timed out")
+
+    def recv_batch(self, timeout=None):
+        """
+        Chờ tối đa `timeout` giây rồi rút hết (tối đa batch_size) gói đang chờ.
+        Trả về số gói nhận được; ném socket.timeout nếu không có gói nào.
+        """
+        self.wait(timeout)
+        if self.use_recvmmsg:
+            return self._recv_mmsg()
+        return self._recv_loop()
+
+    def _recv_mmsg(self):
+        n = _recvmmsg(self.sock.fileno(), self._msgs, self.batch_size, _MSG_DONTWAIT, None)
+        if n < 0:
+            err = ctypes.get_errno()
+            if err in _RETRY_ERRNOS:
+                return 0
+            raise OSError(err, os.strerror(err))
+        msgs = self._msgs
+        lengths = self.lengths
+        for i in range(n):
+            lengths[i] = msgs[i].msg_len
+            if msgs[i].msg_hdr.msg_flags & _MSG_TRUNC:
+                self.truncated += 1
+        if self._control_size and n:
+            if self._rxq_ovfl:
+                dropped = read_cmsg_u32(msgs[n - 1].msg_hdr, socket.SOL_SOCKET, SO_RXQ_OVFL)
+                if dropped is not None:
+                    self.rxq_ovfl = dropped
+            if self.gro:
+                segments = self.segments
+                for i in range(n):
+                    segments[i] = read_cmsg_u32(msgs[i].msg_hdr, SOL_UDP, UDP_GRO) or 0
+            reset_control(msgs, n, self._control_size)
+        if self.addresses:
+            reset_names(msgs, n)
+        return n
+
+    def _recv_loop(self):
+        if self._control_size:
+            return self._recv_loop_ancillary()
+        if self.addresses:
+            return self._recv_loop_from()
+        recv_into = self.sock.recv_into
+        slots = self._slots
+        lengths = self.lengths
+        slot_size = self.slot_size
+        n = 0
+        while n < self.batch_size:
+            try:
+                length = recv_into(slots[n], 0, _RECV_TRUNC)
+            except (BlockingIOError, InterruptedError):
+                break
+            if length > slot_size:
+                self.truncated += 1
+                length = slot_size
+            lengths[n] = length
+            n += 1
+        return n
+
+    def _recv_loop_from(self):
+        recvfrom_into = self.sock.recvfrom_into
+        slots = self._slots
+        lengths = self.lengths
+        addresses = self._addresses
+        slot_size = self.slot_size
+        n = 0
+        while n < self.batch_size:
+            try:
+                length, addresses[n] = recvfrom_into(slots[n], 0, _RECV_TRUNC)
+            except (BlockingIOError, InterruptedError):
+                break
+            if length > slot_size:
+                self.truncated += 1
+                length = slot_size
+            lengths[n] = length
+            n += 1
+        return n
+
+    def _recv_loop_ancillary(self):
+        recvmsg_into = self.sock.recvmsg_into
+        slots = self._slots
+        lengths = self.lengths
+        segments = self.segments
+        addresses = self._addresses
+        n = 0
+        while n < self.batch_size:
+            try:
+                lengths[n], ancdata, flags, addresses[n] = recvmsg_into([slots[n]], self._control_size)
+            except (BlockingIOError, InterruptedError):
+                break
+            if flags & socket.MSG_TRUNC:
+                self.truncated += 1
+            if self._rxq_ovfl:
+                dropped = parse_rxq_ovfl(ancdata)
+                if dropped is not None:
+                    self.rxq_ovfl = dropped
+            if self.gro:
+                segments[n] = parse_gro(ancdata) or 0
+            n += 1
+        return n
+
+    def address(self, i):
+        """Địa chỉ nguồn (host, port) của gói thứ i trong lô vừa nhận (cần addresses=True)"""
+        if self.use_recvmmsg:
+            return read_sockaddr(self._msgs[i].msg_hdr)
+        return self._addresses[i]
+
+    def address_key(self, i):
+        """
+        Khóa băm được của địa chỉ nguồn gói thứ i, rẻ hơn address(i) (không giải mã sockaddr):
+        dùng để tra bảng theo từng gói, gọi address(i) chỉ khi gặp khóa mới
+        """
+        if self.use_recvmmsg:
+            return self._names_view[i * SOCKADDR_SIZE:(i + 1) * SOCKADDR_SIZE].tobytes()
+        return self._addresses[i]
+
+    def close(self):
+        """Giải phóng epoll (socket do nơi gọi quản lý)"""
+        if self.poller == "epoll":
+            self._poll.close()
@@ -0,0 +1,55 @@
+# Dịch vụ echo đo lệch đồng hồ (bật bằng server.py --echo)
+# - Socket riêng trên cổng PORT + ECHO_PORT_OFFSET, chạy trên luồng nền nên dùng được
+#   với mọi chế độ nhận (classic/batch/workers/async) mà không chạm vào vòng nhận chính
+# - Mỗi yêu cầu FLAG_ECHO_REQUEST được trả lại ngay với (thời điểm nhận, thời điểm gửi)
+#   theo đồng hồ của server -> client tính offset/RTT kiểu NTP (Common/clock_sync.py)
+import socket
+import threading
+import time
+
+from clock_sync import ECHO_PORT_OFFSET
+from wire_format import FLAG_ECHO_REQUEST, HEADER_SIZE, echo_reply, is_binary
+
+POLL_INTERVAL = 0.5     # chu kỳ kiểm tra yêu cầu dừng
+
+
+class EchoResponder:
+    def __init__(self, host, port):
+        self.address = (host, port + ECHO_PORT_OFFSET)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(self.address)
+        self.sock.settimeout(POLL_INTERVAL)
+        self.replies = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="echo-responder", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        print(f"[ECHO] Trả lời đo đồng hồ trên {self.address[0]}:{self.address[1]}")
+        return self
+
+    def _run(self):
+        recvfrom = self.sock.recvfrom
+        sendto = self.sock.sendto
+        while not self._stop.is_set():
+            try:
+                data, addr = recvfrom(HEADER_SIZE + 64)
+            except socket.timeout:
+                continue
+            except OSError:
+                break  # socket đã đóng
+            receive_ns = time.time_ns()
+            if not (is_binary(data) and data[3] & FLAG_ECHO_REQUEST):
+                self.errors += 1
+                continue
+            try:
+                sendto(echo_reply(data, receive_ns), addr)
+                self.replies += 1
+            except (OSError, ValueError):
+                self.errors += 1
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
@@ -0,0 +1,100 @@
+# Phản hồi định kỳ cho sender (bật bằng server.py --feedback)
+# - Mỗi flow (địa chỉ nguồn, session_id) - như phiên của async_server - giữ thống kê của khoảng hiện tại: số gói, packet_id cao nhất,
+#   histogram độ trễ (HDR, ns) -> min/p50/p99
+# - Hết mỗi `interval` giây: gửi một gói FLAG_FEEDBACK (wire_format.feedback_packet) về địa chỉ
+#   nguồn của flow qua chính socket nhận, rồi bắt đầu khoảng mới
+# - expected = số packet_id mới phủ thêm trong khoảng (highest - highest của khoảng trước),
+#   client suy ra mất gói = expected - received (gói đảo thứ tự qua ranh giới khoảng gây sai số nhỏ)
+# - Hai client trùng session_id (pid trên hai máy) là hai flow riêng; client đổi cổng nguồn thành flow mới
+# - Flow không có gói trong FLOW_IDLE giây thì bỏ (client dừng, đã đổi phiên hoặc đổi cổng)
+from hdr_histogram import HdrHistogram
+from wire_format import feedback_packet
+
+FEEDBACK_INTERVAL = 0.1     # giây giữa hai lần phản hồi
+FLOW_IDLE = 2.0             # giây không có gói thì quên flow
+NS_PER_SEC = 1_000_000_000
+
+
+class _Flow:
+    __slots__ = ("session_id", "address", "seq", "highest", "reported_highest", "received", "hist", "last_ns")
+
+    def __init__(self, session_id, address):
+        self.session_id = session_id
+        self.address = address
+        self.seq = 0
+        self.highest = None
+        self.reported_highest = None
+        self.received = 0
+        self.hist = HdrHistogram()
+        self.last_ns = 0
+
+
+class FeedbackSender:
+    """
+    send(data, address): hàm gửi của socket nhận (sock.sendto hoặc transport.sendto).
+    Vòng nhận gọi record() cho mỗi gói và maybe_send() sau mỗi gói / mỗi lô.
+    Khóa flow: (địa chỉ nguồn, session_id); vòng batch có thể dùng khóa địa chỉ thô
+    (BatchReceiver.address_key) thay cho địa chỉ, địa chỉ thật chỉ cần khi open().
+    """
+
+    def __init__(self, send, interval=FEEDBACK_INTERVAL):
+        self.send = send
+        self.interval_ns = int(interval * NS_PER_SEC)
+        self.flows = {}
+        self.sent = 0
+        self.errors = 0
+        self._window_start = None
+        self._next_ns = None
+
+    def __contains__(self, key):
+        return key in self.flows
+
+    def open(self, key, address):
+        """Flow mới `key` = (địa chỉ/khóa địa chỉ, session_id): phản hồi về `address`"""
+        self.flows[key] = _Flow(key[1], address)
+
+    def record(self, key, packet_id, delay_ns, now_ns):
+        flow = self.flows[key]
+        flow.received += 1
+        flow.last_ns = now_ns
+        flow.hist.record(delay_ns)
+        if flow.highest is None or packet_id > flow.highest:
+            flow.highest = packet_id
+
+    def maybe_send(self, now_ns):
+        """Hết khoảng thì gửi phản hồi cho mọi flow còn hoạt động; trả về số gói đã gửi"""
+        if self._next_ns is None:
+            self._window_start = now_ns
+            self._next_ns = now_ns + self.interval_ns
+            return 0
+        if now_ns < self._next_ns:
+            return 0
+        interval_us = (now_ns - self._window_start) // 1000
+        sent = 0
+        for key, flow in list(self.flows.items()):
+            if now_ns - flow.last_ns > FLOW_IDLE * NS_PER_SEC:
+                del self.flows[key]
+                continue
+            if flow.highest is None:
+                continue
+            if flow.reported_highest is None:
+                expected = flow.received
+            else:
+                expected = max(0, flow.highest - flow.reported_highest)
+            hist = flow.hist
+            p50, p99 = hist.values_at_quantiles((0.5, 0.99)) if flow.received else (0, 0)
+            packet = feedback_packet(flow.session_id, flow.seq, flow.highest, flow.received, expected,
+                                     hist.min or 0, int(p50), int(p99), interval_us)
+            try:
+                self.send(packet, flow.address)
+                sent += 1
+            except OSError:
+                self.errors += 1   # buffer gửi đầy / client đã đóng cổng: bỏ lần này
+            flow.seq += 1
+            flow.reported_highest = flow.highest
+            flow.received = 0
+            hist.reset()
+        self.sent += sent
+        self._window_start = now_ns
+        self._next_ns = now_ns + self.interval_ns
+        return sent
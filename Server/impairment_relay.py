@@ -0,0 +1,356 @@
+# Relay UDP giả lập điều kiện mạng thật giữa client và server (loopback gần như không trễ/mất/đảo)
+# - Nghe ở cổng client gửi tới (mặc định 5005), chuyển tiếp tới server chạy ở cổng khác (mặc định 5105)
+# - Mỗi client (địa chỉ nguồn) một socket upstream riêng kiểu NAT: server thấy mỗi flow một cổng nguồn
+#   (SO_REUSEPORT ở server vẫn chia được theo flow) và gói server trả về (phản hồi --feedback)
+#   được chuyển ngược đúng client trên luồng nền, không bị suy giảm
+# - Suy giảm theo hồ sơ Common/impairment.py: độ trễ + jitter, mất gói ngẫu nhiên / theo chùm
+#   (Gilbert-Elliott), giới hạn băng thông + hàng đợi, đảo thứ tự, trùng gói
+# - Nhận theo lô (recvmmsg, BatchReceiver), lập lịch theo thời điểm phát: gói đúng thứ tự (thời điểm phát
+#   không nhỏ hơn gói cuối hàng) vào hàng FIFO (deque, O(1)), chỉ gói bị đảo thứ tự vào heap (heapq);
+#   phát theo lô: các gói đến hạn gom theo socket upstream, chép vào vùng đệm dựng sẵn, một sendmmsg mỗi lô;
+#   bộ nhớ có giới hạn: giữ tối đa --max-pending gói, vượt quá thì bỏ (đếm "tran relay")
+# - Chờ lai như Client/pacing.py: ngủ (select) tới sát hạn phát kế tiếp, --spin-us cuối thì thăm dò
+#   không chặn để không phát muộn theo độ trễ đánh thức của bộ định thời
+# - Hồ sơ "none": chuyển tiếp ngay từ vùng đệm, không qua bộ lập lịch
+# - Kết thúc (Ctrl+C hoặc --timeout giây nhàn rỗi): ghi impairment.json (hồ sơ + bộ đếm)
+#   cho analyze_results.py --impairment / bench_e2e.py --impairments
+#
+# Chạy: python server.py --port 5105
+#       python impairment_relay.py --profile wan --loss-pct 1
+#       python client_optimized.py                      (gửi tới 5005 như bình thường)
+import argparse
+import ctypes
+import errno
+import heapq
+import itertools
+import os
+import select
+import socket
+import sys
+import threading
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+
+from batch_receiver import BATCH_SIZE, SLOT_SIZE, BatchReceiver
+from impairment import (RECORD_FILE, Impairment, add_impairment_arguments, describe,
+                        impairment_from_args, make_record, save_record)
+from mmsg import MMsgHdr, build_msgs, load_libc
+from socket_tuning import add_tuning_arguments, apply_tuning, describe as describe_tuning, tuning_from_args
+
+HOST = "127.0.0.1"
+LISTEN_PORT = 5005
+SERVER_PORT = 5105
+MAX_PENDING = 200000     # gói tối đa đang chờ phát (FIFO + heap)
+REPORT_INTERVAL = 2      # giây giữa hai dòng thống kê
+POLL_INTERVAL = 0.5      # giây chờ tối đa mỗi vòng khi không có gói chờ phát
+SPIN_NS = 200_000        # trước hạn phát bao nhiêu ns thì chuyển từ ngủ sang thăm dò không chặn
+REPLY_SIZE = 2048
+
+_sendmmsg = load_libc("sendmmsg", [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int])
+
+
+class StagedSender:
+    """
+    Phát lại các gói (bytes / memoryview) qua socket upstream đã connect: chép vào vùng đệm dựng sẵn,
+    mỗi lô một sendmmsg (nền tảng khác: vòng send). Buffer gửi đầy / server chưa chạy -> bỏ, đếm errors.
+    """
+
+    def __init__(self, batch_size=BATCH_SIZE, slot_size=SLOT_SIZE, use_sendmmsg=True):
+        self.batch_size = batch_size
+        self.slot_size = slot_size
+        self.buffer = bytearray(batch_size * slot_size)
+        self.view = memoryview(self.buffer)
+        self.sent = 0
+        self.errors = 0
+        self.refused = 0
+        self.use_sendmmsg = use_sendmmsg and _sendmmsg is not None
+        if self.use_sendmmsg:
+            self._c_buffer, self._iovecs, self._msgs = build_msgs(self.buffer, batch_size, slot_size)
+
+    def send(self, sock, packets):
+        if not self.use_sendmmsg:
+            send = sock.send
+            for data in packets:
+                try:
+                    send(data)
+                    self.sent += 1
+                except ConnectionRefusedError:
+                    self.refused += 1
+                except OSError:
+                    self.errors += 1
+            return
+        fd = sock.fileno()
+        view = self.view
+        iovecs = self._iovecs
+        slot = self.slot_size
+        for start in range(0, len(packets), self.batch_size):
+            chunk = packets[start:start + self.batch_size]
+            offset = 0
+            for i, data in enumerate(chunk):
+                length = len(data)
+                view[offset:offset + length] = data
+                iovecs[i].iov_len = length
+                offset += slot
+            self._flush(fd, len(chunk))
+
+    def _flush(self, fd, count):
+        done = 0
+        while done < count:
+            n = _sendmmsg(fd, ctypes.byref(self._msgs[done]), count - done, 0)
+            if n >= 0:
+                self.sent += n
+                done += n
+                continue
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err == errno.ECONNREFUSED:
+                self.refused += 1      # lỗi ICMP của lần gửi trước (server chưa chạy), gói này chưa đi: gửi lại
+                continue
+            self.errors += count - done
+            return
+
+
+class ReplyPath:
+    """Luồng nền: gói server gửi về các socket upstream -> sendto client tương ứng qua socket nghe"""
+
+    def __init__(self, listen):
+        self.listen = listen
+        self.clients = {}          # fileno upstream -> (socket, địa chỉ client)
+        self.replies = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="relay-replies", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def add(self, upstream, client):
+        self.clients[upstream.fileno()] = (upstream, client)
+
+    def _run(self):
+        sendto = self.listen.sendto
+        while not self._stop.is_set():
+            sockets = [up for up, _ in list(self.clients.values())]
+            if not sockets:
+                self._stop.wait(POLL_INTERVAL)
+                continue
+            ready, _, _ = select.select(sockets, [], [], POLL_INTERVAL)
+            for up in ready:
+                try:
+                    data = up.recv(REPLY_SIZE)
+                    sendto(data, self.clients[up.fileno()][1])
+                    self.replies += 1
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    self.errors += 1   # ICMP port unreachable (server chưa chạy) báo qua recv
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def relay(listen, server, impairment, tuning=None, timeout=0, max_pending=MAX_PENDING, batch_size=BATCH_SIZE,
+          use_recvmmsg=True, poller="select", spin_ns=SPIN_NS):
+    """
+    Vòng chính: nhận theo lô, quyết định số phận từng gói, phát các gói đến hạn.
+    timeout > 0: dừng sau `timeout` giây không nhận gói nào và không còn gói chờ phát. Trả về dict bộ đếm.
+    """
+    receiver = BatchReceiver(listen, batch_size, use_recvmmsg=use_recvmmsg, poller=poller, addresses=True)
+    view = receiver.view
+    lengths = receiver.lengths
+    slot_size = receiver.slot_size
+    replies = ReplyPath(listen).start()
+    sender = StagedSender(batch_size, slot_size)
+    upstreams = {}             # khóa địa chỉ client -> socket upstream (đã connect tới server)
+    fifo = deque()             # (thời điểm phát, dữ liệu, upstream), thời điểm phát không giảm
+    heap = []                  # gói bị đảo thứ tự: (thời điểm phát, số thứ tự, dữ liệu, upstream)
+    order = itertools.count()  # phá hòa thời điểm phát trong heap, giữ thứ tự đến
+    schedule = impairment.schedule
+    passthrough = impairment.passthrough
+    push = heapq.heappush
+    pop = heapq.heappop
+    append = fifo.append
+    popleft = fifo.popleft
+    print(f"[RELAY] {listen.getsockname()[0]}:{listen.getsockname()[1]} -> {server[0]}:{server[1]} | "
+          f"{describe(impairment.config)} | {'recvmmsg' if receiver.use_recvmmsg else 'recvfrom_into'}")
+
+    def open_upstream(key, i):
+        up = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if tuning is not None:
+            apply_tuning(up, tuning)
+        up.connect(server)
+        up.setblocking(False)
+        upstreams[key] = up
+        replies.add(up, receiver.address(i))
+        return up
+
+    received = released = overflow = peak = 0
+    late_total = late_max = 0
+    start = last_report = last_packet = time.monotonic()
+    cpu_start = time.process_time()
+    try:
+        while True:
+            now_ns = time.monotonic_ns()
+            # 1. Phát các gói đến hạn, gom theo socket upstream (thứ tự trong từng flow giữ nguyên)
+            if (fifo and fifo[0][0] <= now_ns) or (heap and heap[0][0] <= now_ns):
+                due_by_upstream = {}
+                if fifo and now_ns - fifo[0][0] > late_max:
+                    late_max = now_ns - fifo[0][0]       # gói đầu hàng là gói muộn nhất
+                while fifo and fifo[0][0] <= now_ns:
+                    due, data, up = popleft()
+                    late_total += now_ns - due
+                    packets = due_by_upstream.get(up)
+                    if packets is None:
+                        due_by_upstream[up] = [data]
+                    else:
+                        packets.append(data)
+                    released += 1
+                while heap and heap[0][0] <= now_ns:
+                    due, _, data, up = pop(heap)
+                    late_total += now_ns - due
+                    late_max = max(late_max, now_ns - due)
+                    due_by_upstream.setdefault(up, []).append(data)
+                    released += 1
+                for up, packets in due_by_upstream.items():
+                    sender.send(up, packets)
+
+            # 2. Chờ gói mới tới tối đa đến hạn phát kế tiếp
+            if fifo or heap:
+                next_due = min(fifo[0][0] if fifo else heap[0][0], heap[0][0] if heap else fifo[0][0])
+                wait = min(POLL_INTERVAL, (next_due - now_ns - spin_ns) / 1e9)
+            else:
+                wait = POLL_INTERVAL
+            try:
+                n = receiver.recv_batch(max(0.0, wait))
+            except socket.timeout:
+                n = 0
+            now = time.monotonic()
+            if n:
+                now_ns = time.monotonic_ns()
+                last_packet = now
+                received += n
+                passed = {}
+                for i in range(n):
+                    key = receiver.address_key(i)
+                    up = upstreams.get(key) or open_upstream(key, i)
+                    offset = i * slot_size
+                    length = lengths[i]
+                    if passthrough:
+                        packets = passed.get(up)
+                        if packets is None:
+                            passed[up] = [view[offset:offset + length]]
+                        else:
+                            packets.append(view[offset:offset + length])
+                        continue
+                    releases = schedule(now_ns, length)
+                    if not releases:
+                        continue
+                    if len(fifo) + len(heap) >= max_pending:
+                        overflow += 1
+                        continue
+                    data = bytes(view[offset:offset + length])
+                    for due in releases:
+                        if not fifo or due >= fifo[-1][0]:
+                            append((due, data, up))
+                        else:
+                            push(heap, (due, next(order), data, up))
+                for up, packets in passed.items():
+                    sender.send(up, packets)
+                if len(fifo) + len(heap) > peak:
+                    peak = len(fifo) + len(heap)
+            elif timeout and not fifo and not heap and now - last_packet > timeout:
+                print("\n[RELAY] Hết dữ liệu, dừng relay.")
+                break
+
+            if now - last_report >= REPORT_INTERVAL:
+                dropped = ", ".join(f"{k} {v}" for k, v in impairment.dropped.items() if v)
+                print(f"[RELAY] Nhận {received} ({received / (now - start):.0f} gói/giây), chuyển {sender.sent}, "
+                      f"bỏ: {dropped or 0}{f', tran relay {overflow}' if overflow else ''}, "
+                      f"đang giữ {len(fifo) + len(heap)}, trễ phát max {late_max / 1000:.0f} µs")
+                last_report = now
+    except KeyboardInterrupt:
+        print("\n[RELAY] Dừng theo yêu cầu (Ctrl+C)")
+    finally:
+        replies.stop()
+        receiver.close()
+        for up in upstreams.values():
+            up.close()
+
+    impairment.dropped["tran relay"] += overflow
+    return {
+        "elapsed": round(time.monotonic() - start, 3),
+        # CPU của relay (mọi luồng): CPU / gói cho biết relay còn theo kịp tốc độ nào
+        "cpu_s": round(time.process_time() - cpu_start, 3),
+        "flows": len(upstreams),
+        "received": received,
+        "forwarded": sender.sent,
+        "dropped": dict(impairment.dropped),
+        "duplicated": impairment.duplicated,
+        "reordered": impairment.reordered,
+        "pending_left": len(fifo) + len(heap),
+        "peak_pending": peak,
+        "send_errors": sender.errors,
+        "refused": sender.refused,
+        "replies": replies.replies,
+        # Độ trễ phát so với lịch (độ chính xác của bộ lập lịch, µs)
+        "release_late_avg_us": round(late_total / released / 1000, 1) if released and not passthrough else 0,
+        "release_late_max_us": round(late_max / 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Relay UDP giả lập trễ/jitter/mất gói/đảo thứ tự/băng thông")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--listen-port", type=int, default=LISTEN_PORT, help="cổng client gửi tới")
+    parser.add_argument("--server", default=HOST, help="địa chỉ server thật")
+    parser.add_argument("--server-port", type=int, default=SERVER_PORT, help="cổng server thật (server.py --port)")
+    parser.add_argument("--timeout", type=float, default=0,
+                        help="dừng sau N giây không có gói (0 = chạy tới Ctrl+C)")
+    parser.add_argument("--seed", type=int, help="hạt giống ngẫu nhiên (lặp lại đúng chuỗi mất/trễ)")
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="số gói tối đa đang giữ chờ phát")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="số gói tối đa mỗi lần nhận")
+    parser.add_argument("--no-recvmmsg", action="store_true", help="nhận bằng vòng recvfrom_into")
+    parser.add_argument("--spin-us", type=float, default=SPIN_NS / 1000,
+                        help="thăm dò không chặn bao nhiêu µs cuối trước hạn phát (0 = chỉ ngủ)")
+    parser.add_argument("--record", default=RECORD_FILE, help="file JSON ghi hồ sơ + bộ đếm khi kết thúc")
+    add_impairment_arguments(parser)
+    add_tuning_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        config = impairment_from_args(args)
+        tuning = tuning_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    impairment = Impairment(config, seed=args.seed)
+
+    listen = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    applied = apply_tuning(listen, tuning)
+    listen.bind((args.host, args.listen_port))
+    print(f"[RELAY] Tinh chỉnh socket: {describe_tuning(tuning, applied)}")
+
+    counters = relay(listen, (args.server, args.server_port), impairment, tuning, args.timeout, args.max_pending,
+                     args.batch, not args.no_recvmmsg, tuning.get("poller") or "select", int(args.spin_us * 1000))
+    listen.close()
+
+    dropped = sum(counters["dropped"].values())
+    print(f"[RELAY] Nhận {counters['received']} gói, chuyển {counters['forwarded']}, bỏ {dropped} "
+          f"({', '.join(f'{k} {v}' for k, v in counters['dropped'].items())}), "
+          f"trùng {counters['duplicated']}, đảo {counters['reordered']}, phản hồi về client {counters['replies']}")
+    print(f"[RELAY] Giữ cao nhất {counters['peak_pending']} gói, trễ phát so với lịch: "
+          f"TB {counters['release_late_avg_us']} µs, max {counters['release_late_max_us']} µs")
+    if counters["received"]:
+        print(f"[RELAY] CPU {counters['cpu_s']}s = {counters['cpu_s'] / counters['received'] * 1e6:.2f} µs/gói "
+              f"(~{counters['received'] / counters['cpu_s'] if counters['cpu_s'] else 0:.0f} gói/giây trên một lõi)")
+    record = make_record(config, counters, seed=args.seed, listen=f"{args.host}:{args.listen_port}",
+                         server=f"{args.server}:{args.server_port}")
+    print(f"[RELAY] Đã ghi {save_record(args.record, record)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# Thống kê trực tiếp trong server: histogram HDR + cửa sổ trượt 1s/10s/60s
+# - Mỗi giây một "ô" (slot) giữ histogram độ trễ (ns), jitter, số gói, đảo thứ tự
+# - Cửa sổ N giây = gộp N ô đã hoàn tất gần nhất -> p50/p95/p99/p99.9, mất gói
+# - Mất gói / đảo thứ tự theo dõi riêng từng session (mỗi flow một dải packet_id riêng),
+#   cửa sổ cộng số gói kỳ vọng của mọi session; độ trễ / jitter gộp chung
+# - Chi phí mỗi gói chỉ là vài phép cộng + 1 lần ghi histogram, không in, không I/O
+from hdr_histogram import HdrHistogram
+
+WINDOWS = (1, 10, 60)                     # các cửa sổ trượt (giây)
+QUANTILES = (0.5, 0.95, 0.99, 0.999)
+REPORT_INTERVAL = 2                       # in thống kê mỗi 2 giây
+NS_PER_SEC = 1_000_000_000
+NS_PER_MS = 1_000_000
+
+
+class _Slot:
+    """Thống kê của một giây"""
+    __slots__ = ("second", "hist", "count", "jitter_sum", "jitter_max", "reordered", "ranges")
+
+    def __init__(self):
+        self.hist = HdrHistogram()
+        self.reset(None)
+
+    def reset(self, second):
+        self.second = second
+        self.hist.reset()
+        self.count = 0
+        self.jitter_sum = 0
+        self.jitter_max = 0
+        self.reordered = 0
+        # session_id -> [packet_id cao nhất trước giây này, packet_id cao nhất cuối giây này]
+        self.ranges = {}
+
+
+class LiveMetrics:
+    def __init__(self, windows=WINDOWS, report_interval=REPORT_INTERVAL, out=print):
+        self.windows = windows
+        self.report_interval = report_interval
+        self.out = out
+        self.horizon = max(windows) + 1           # +1 ô cho giây hiện tại (chưa hoàn tất)
+        self.slots = [_Slot() for _ in range(self.horizon)]
+        self.highest = {}                         # session_id -> packet_id cao nhất
+        self.last_delay = None
+        self.total = 0
+        self.last_ns = None
+        self._slot = None
+        self._second = None
+        self._start_second = None
+        self._last_report = None
+
+    def _rotate(self, second):
+        if self._second is not None and second < self._second:
+            return  # đồng hồ lùi (NTP): tiếp tục ghi vào ô hiện tại
+        if self._start_second is None:
+            self._start_second = second
+        self._second = second
+        self._slot = self.slots[second % self.horizon]
+        self._slot.reset(second)
+
+    def record(self, packet_id, delay_ns, now_ns, session_id=0):
+        """Ghi một gói: gọi trên luồng nhận cho mỗi gói"""
+        second = now_ns // NS_PER_SEC
+        if second != self._second:
+            self._rotate(second)
+        self.last_ns = now_ns
+        slot = self._slot
+
+        slot.hist.record(delay_ns)
+        slot.count += 1
+        self.total += 1
+
+        if self.last_delay is not None:
+            jitter = abs(delay_ns - self.last_delay)
+            slot.jitter_sum += jitter
+            if jitter > slot.jitter_max:
+                slot.jitter_max = jitter
+        self.last_delay = delay_ns
+
+        highest = self.highest.get(session_id)
+        span = slot.ranges.get(session_id)
+        if span is None:
+            # Gói đầu tiên của session trong giây này (session mới: coi như bắt đầu ngay trước nó)
+            start = packet_id - 1 if highest is None else highest
+            span = slot.ranges[session_id] = [start, start]
+        if highest is None or packet_id > highest:
+            self.highest[session_id] = span[1] = packet_id
+        else:
+            slot.reordered += 1  # đến muộn / đảo thứ tự / trùng
+
+    def window(self, seconds, now_ns):
+        """Gộp các giây đã hoàn tất trong cửa sổ `seconds` giây gần nhất"""
+        now_second = now_ns // NS_PER_SEC
+        hist = HdrHistogram()
+        count = reordered = jitter_sum = jitter_max = 0
+        ranges = {}       # session_id -> [start, end] gộp qua các giây trong cửa sổ
+        for slot in self.slots:
+            if slot.second is None or not (now_second - seconds <= slot.second < now_second):
+                continue
+            if not slot.count:
+                continue
+            hist.merge(slot.hist)
+            count += slot.count
+            reordered += slot.reordered
+            jitter_sum += slot.jitter_sum
+            jitter_max = max(jitter_max, slot.jitter_max)
+            for session_id, (start, end) in slot.ranges.items():
+                span = ranges.get(session_id)
+                if span is None:
+                    ranges[session_id] = [start, end]
+                else:
+                    span[0] = min(span[0], start)
+                    span[1] = max(span[1], end)
+
+        expected = sum(end - start for start, end in ranges.values())
+        covered = max(1, min(seconds, now_second - (self._start_second or now_second)))
+        return {
+            'seconds': seconds,
+            'count': count,
+            'rate': count / covered,
+            'quantiles_ms': [v / NS_PER_MS for v in hist.values_at_quantiles(QUANTILES)],
+            'avg_jitter_ms': jitter_sum / count / NS_PER_MS if count else 0,
+            'max_jitter_ms': jitter_max / NS_PER_MS,
+            'loss_pct': max(0, expected - count) / expected * 100 if expected > 0 else 0,
+            'reordered': reordered,
+        }
+
+    def maybe_report(self, now_ns):
+        """In thống kê nếu đã đến kỳ (gọi định kỳ từ vòng nhận)"""
+        if self._last_report is None:
+            self._last_report = now_ns
+        elif now_ns - self._last_report >= self.report_interval * NS_PER_SEC:
+            self.report(now_ns)
+            self._last_report = now_ns
+
+    def final_report(self):
+        """Thống kê lúc dừng: tính đến hết giây của gói cuối cùng (bỏ qua thời gian chờ timeout)"""
+        if self.last_ns is not None:
+            self.out("[LIVE] Tổng kết:")
+            self.report(self.last_ns + NS_PER_SEC)
+
+    def report(self, now_ns):
+        for seconds in self.windows:
+            w = self.window(seconds, now_ns)
+            p50, p95, p99, p999 = w['quantiles_ms']
+            self.out(f"[LIVE] {seconds:>3}s: {w['count']:>8} gói ({w['rate']:>9.0f}/s) | "
+                     f"p50 {p50:.3f} p95 {p95:.3f} p99 {p99:.3f} p99.9 {p999:.3f} ms | "
+                     f"jitter TB {w['avg_jitter_ms']:.3f} ms | mất {w['loss_pct']:.2f}% | "
+                     f"đảo thứ tự {w['reordered']}")
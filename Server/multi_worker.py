@@ -0,0 +1,152 @@
+# Nhận đa tiến trình với SO_REUSEPORT
+# - N worker cùng bind HOST:PORT, kernel chia luồng gói theo 4-tuple (mỗi flow -> 1 worker)
+# - Mỗi worker có parser và file shard riêng: data/results.w<i>.csv (hoặc .col)
+# - Kết thúc: trộn k-way các shard theo receive_time thành một file kết quả duy nhất
+#   (data/results.csv hoặc data/results.col) để UDPOptimizerAnalyzer đọc như bình thường
+#
+# Lưu ý: 1 client = 1 flow = 1 worker; muốn tận dụng nhiều core cần nhiều client/cổng nguồn.
+import csv
+import heapq
+import multiprocessing
+import os
+import queue
+import shutil
+import socket
+import time
+from operator import itemgetter
+
+from batch_receiver import BATCH_SIZE, SLOT_SIZE
+from feedback import FeedbackSender
+from result_store import EXTENSION, ColumnarSink, is_columnar, iter_rows
+from result_writer import AsyncResultWriter, CsvSink
+from server import SOCKET_TIMEOUT, receive_batch
+from socket_tuning import apply_tuning
+from wire_format import CLOCK_WALL
+
+MERGE_BATCH = 10000        # số dòng mỗi lần ghi khi trộn shard
+
+HAS_REUSEPORT = hasattr(socket, "SO_REUSEPORT")
+
+
+def shard_path(data_dir, index, output):
+    return os.path.join(data_dir, f"results.w{index}" + (EXTENSION if output == "columnar" else ".csv"))
+
+
+def _open_sink(path, output):
+    return ColumnarSink(path) if output == "columnar" else CsvSink(path)
+
+
+def _worker(index, host, port, path, output, batch_size, timeout, clock, tuning, feedback_interval, slot_size, gro,
+            results):
+    """Tiến trình worker: 1 socket SO_REUSEPORT + vòng nhận batch + shard riêng (+ phản hồi các flow của nó)"""
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    applied = apply_tuning(s, tuning or {})
+    s.bind((host, port))
+    writer = AsyncResultWriter(_open_sink(path, output))
+    feedback = FeedbackSender(s.sendto, feedback_interval) if feedback_interval else None
+    try:
+        receive_batch(s, writer, timeout=timeout, batch_size=batch_size, clock=clock,
+                      poller=(tuning or {}).get("poller", "select"), feedback=feedback, slot_size=slot_size, gro=gro)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        writer.close()
+        s.close()
+        stats = writer.stats()
+        results.put((index, stats["written"], stats["dropped"], applied))
+
+
+def _iter_shard(path):
+    """Duyệt các dòng của một shard (đã theo thứ tự receive_time của worker đó)"""
+    if is_columnar(path):
+        yield from iter_rows(path)
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            yield int(row[0]), float(row[1]), float(row[2]), float(row[3])
+
+
+def merge_shards(paths, out_path, output):
+    """Trộn k-way các shard theo receive_time -> 1 file kết quả, trả về số dòng"""
+    sink = _open_sink(out_path, output)
+    total = 0
+    batch = []
+    try:
+        for row in heapq.merge(*(_iter_shard(p) for p in paths), key=itemgetter(2)):
+            batch.append(row)
+            if len(batch) >= MERGE_BATCH:
+                sink.write_rows(batch)
+                total += len(batch)
+                batch = []
+        sink.write_rows(batch)
+        total += len(batch)
+    finally:
+        sink.close()
+    return total
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def run_workers(workers, host, port, data_dir, out_path, output="csv", batch_size=BATCH_SIZE,
+                timeout=SOCKET_TIMEOUT, keep_shards=False, clock=CLOCK_WALL, tuning=None, feedback=None,
+                slot_size=SLOT_SIZE, gro=False):
+    """
+    Chạy N worker tới khi tất cả hết dữ liệu (timeout) hoặc Ctrl+C, rồi trộn shard.
+    tuning: hồ sơ socket_tuning áp dụng cho socket của mọi worker.
+    feedback: chu kỳ phản hồi (giây) - mỗi worker phản hồi các flow kernel chia cho nó.
+    slot_size / gro: như receive_batch (gói lớn, UDP_GRO).
+    Trả về dict thống kê: số dòng mỗi worker, tổng, thời gian nhận, giá trị tinh chỉnh hiệu lực (worker 0).
+    """
+    if not HAS_REUSEPORT:
+        raise OSError("He dieu hanh khong ho tro SO_REUSEPORT - hay dung --workers 1")
+
+    results = multiprocessing.Queue()
+    paths = [shard_path(data_dir, i, output) for i in range(workers)]
+    procs = [multiprocessing.Process(target=_worker, name=f"udp-worker-{i}",
+                                     args=(i, host, port, paths[i], output, batch_size, timeout, clock, tuning,
+                                           feedback, slot_size, gro, results))
+             for i in range(workers)]
+
+    print(f"[SERVER] {workers} worker SO_REUSEPORT trên {host}:{port}")
+    started = time.perf_counter()
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        print("\n[SERVER] Nhận Ctrl+C, chờ các worker ghi nốt dữ liệu.")
+        for p in procs:
+            p.join()
+    elapsed = time.perf_counter() - started
+
+    per_worker = [0] * workers
+    dropped = 0
+    applied = {}
+    for _ in range(workers):
+        try:
+            index, written, lost, applied[index] = results.get(timeout=1)
+        except queue.Empty:
+            break  # worker lỗi, không gửi được thống kê
+        per_worker[index] = written
+        dropped += lost
+    for i, count in enumerate(per_worker):
+        print(f"[W{i}] {count} gói -> {paths[i]}")
+
+    merged = merge_shards(paths, out_path, output)
+    print(f"[SERVER] Đã trộn {merged} dòng theo receive_time vào {out_path}, bỏ {dropped} dòng")
+    if not keep_shards:
+        for path in paths:
+            _remove(path)
+
+    # Các worker cùng hồ sơ nên kernel cho cùng giá trị hiệu lực -> lấy của worker nhỏ nhất còn báo về
+    return {"per_worker": per_worker, "total": merged, "dropped": dropped, "elapsed": elapsed,
+            "applied": applied[min(applied)] if applied else None}
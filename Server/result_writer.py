@@ -0,0 +1,141 @@
+# Tầng ghi kết quả bất đồng bộ: luồng nhận chỉ đẩy dòng vào hàng đợi,
+# một luồng nền gom lại và ghi/flush xuống file theo ngưỡng số dòng hoặc thời gian
+# - stages (StageProfiler, --profile-stages): bấm giờ write_rows / flush trên luồng nền (mọi lô)
+import csv
+import queue
+import threading
+import time
+
+QUEUE_SIZE = 1024          # số phần tử tối đa trong hàng đợi (mỗi phần tử = 1 lô dòng)
+FLUSH_ROWS = 5000          # flush khi đã gom đủ số dòng này
+FLUSH_INTERVAL = 1.0       # hoặc khi đã quá 1 giây kể từ lần flush trước
+
+RESULT_HEADER = ["packet_id", "send_time", "receive_time", "delay_ms"]
+
+_STOP = object()
+
+
+class CsvSink:
+    """Đích ghi dạng CSV (định dạng results.csv hiện có)"""
+
+    def __init__(self, path, header=RESULT_HEADER):
+        self.path = path
+        self._file = open(path, mode="w", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(header)
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class AsyncResultWriter:
+    """
+    Ghi kết quả qua hàng đợi có giới hạn + luồng nền.
+    Có giao diện writerow/writerows giống csv.writer để vòng nhận dùng trực tiếp;
+    khi hàng đợi đầy thì bỏ lô đó và tăng bộ đếm dropped thay vì chặn luồng nhận.
+    """
+
+    def __init__(self, sink, queue_size=QUEUE_SIZE, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 stages=None):
+        self.sink = sink
+        self.stages = stages
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=queue_size)
+
+        # Bộ đếm (chỉ luồng nhận ghi dropped/max_depth, chỉ luồng nền ghi written/flushes)
+        self.dropped = 0
+        self.max_depth = 0
+        self.written = 0
+        self.flushes = 0
+
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def writerow(self, row):
+        self.writerows((row,))
+
+    def writerows(self, rows):
+        """Đẩy một lô dòng vào hàng đợi (không bao giờ chặn)"""
+        if not rows:
+            return
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            self.dropped += len(rows)
+            return
+        depth = self._queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_depth,
+            "flushes": self.flushes,
+        }
+
+    def _run(self):
+        pending = 0
+        last_flush = time.monotonic()
+        stages = self.stages
+        while True:
+            timeout = max(0.0, last_flush + self.flush_interval - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                break
+            timed = stages is not None and stages.tick()
+            if item is not None:
+                self.sink.write_rows(item)
+                pending += len(item)
+                if timed:
+                    stages.lap("write_rows")
+
+            now = time.monotonic()
+            if pending and (pending >= self.flush_rows or now - last_flush >= self.flush_interval):
+                if timed:
+                    stages.mark()
+                self.sink.flush()
+                if timed:
+                    stages.lap("flush")
+                self.written += pending
+                self.flushes += 1
+                pending = 0
+            if not pending:
+                last_flush = now
+
+        # Flush cuối cùng: ghi nốt những gì còn trong hàng đợi
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                self.sink.write_rows(item)
+                pending += len(item)
+        self.sink.flush()
+        self.written += pending
+        self.flushes += 1
+
+    def close(self):
+        """Dừng luồng nền, đảm bảo flush lần cuối rồi đóng file"""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)  # chặn tới khi có chỗ: lúc đóng thì được phép chờ
+            self._thread.join()
+        self.sink.close()
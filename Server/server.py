@@ -1,46 +1,508 @@
 # Server nhận gói, đo độ trễ, đếm gói
+import argparse
 import socket
-import csv
 import os
+import sys
 import time
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Common"))
+
+from async_server import SESSION_IDLE_TIMEOUT
+from batch_receiver import BATCH_SIZE, SLOT_SIZE, BatchReceiver
+from echo_responder import EchoResponder
+from feedback import FEEDBACK_INTERVAL, FeedbackSender
+from kernel_counters import HAS_PROC, SAMPLE_INTERVAL, KernelSampler, counters_path, enable_rxq_ovfl, parse_rxq_ovfl
+from live_metrics import LiveMetrics
+from profiling import Profiling, StageProfiler, add_profiling_arguments
+from result_store import ColumnarSink
+from result_writer import QUEUE_SIZE, AsyncResultWriter, CsvSink
+from shm_metrics import SHM_NAME, MetricsPublisher
+from socket_tuning import add_tuning_arguments, apply_tuning, describe, make_record, save_record, tuning_from_args
+from udp_offload import MAX_DATAGRAM, parse_size, throughput
+from wire_format import CLOCK_MONO, CLOCK_WALL, CLOCKS, parse_packet, send_mono_ns
+
 HOST = "127.0.0.1"
 PORT = 5005
 DATA_FILE = os.path.join("data", "results.csv")
+COLUMNAR_FILE = os.path.join("data", "results.col")   # kho dạng cột (--output columnar)
+SOCKET_TIMEOUT = 5       # Dừng server nếu không nhận thêm gói nào sau 5s
+REPORT_INTERVAL = 2      # Chế độ batch: in thống kê mỗi 2 giây thay vì in từng gói
+WRITE_ROWS = 256         # Chế độ classic: gom từng này dòng thành một lô cho luồng ghi
+WRITE_INTERVAL = 0.2     # hoặc đẩy lô đang gom sau 0.2 giây (cả khi socket rảnh)
 
-# Tạo thư mục data nếu chưa có
-os.makedirs("data", exist_ok=True)
+# Công đoạn bấm giờ (--profile-stages); * = gồm thời gian chờ gói
+CLASSIC_STAGES = ("recvfrom", "time_ns", "parse", "feedback", "print", "live", "writerow", "shm")
+BATCH_STAGES = ("recv_batch", "parse", "writerows", "feedback", "shm", "report")
+WRITER_STAGES = ("write_rows", "flush")
 
-# Tạo socket UDP
-with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
-    s.bind((HOST, PORT))
-    print(f"[SERVER] Listening on {HOST}:{PORT}")
 
-    # Mở file CSV để ghi kết quả
-    with open(DATA_FILE, mode="w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["packet_id", "send_time", "receive_time", "delay_ms"])
-
-        s.settimeout(5)  # Dừng server nếu không nhận thêm gói nào sau 5s
+def receive_classic(s, writer, timeout=SOCKET_TIMEOUT, live=None, clock=CLOCK_WALL, kernel=None, rxq_ovfl=False,
+                    feedback=None, stages=None, shm=None):
+    """
+    Vòng nhận gốc: recvfrom từng gói, in từng gói; dòng kết quả gom tại chỗ rồi chuyển cho tầng ghi
+    theo lô (WRITE_ROWS dòng hoặc WRITE_INTERVAL giây) - hàng đợi của tầng ghi tính theo lô.
+    Có `live` thì thay dòng in từng gói bằng thống kê trực tiếp định kỳ.
+    clock=CLOCK_MONO: độ trễ tính từ đồng hồ monotonic (không bị NTP chỉnh, chỉ cùng máy).
+    kernel + rxq_ovfl: nhận bằng recvmsg để đọc SO_RXQ_OVFL, cập nhật kernel.rxq_ovfl.
+    feedback (FeedbackSender): gửi phản hồi định kỳ về địa chỉ nguồn của từng flow.
+    stages (StageProfiler với CLASSIC_STAGES): bấm giờ từng công đoạn ở các vòng được lấy mẫu.
+    shm (MetricsPublisher): công bố từng gói + bộ đếm định kỳ vào shared memory cho reader trực tiếp.
+    """
+    # Chờ theo nhịp WRITE_INTERVAL để đẩy lô đang gom khi rảnh; hết `timeout` giây không có gói thì dừng
+    tick = min(timeout, WRITE_INTERVAL)
+    s.settimeout(tick)
+    idle = 0.0
+    rows = []
+    write_interval_ns = int(WRITE_INTERVAL * 1e9)
+    last_write = time.time_ns()
+    received = 0
+    received_bytes = 0
+    start = None
+    control_size = socket.CMSG_SPACE(4) if kernel is not None and rxq_ovfl and enable_rxq_ovfl(s) else 0
 
+    try:
         while True:
+            timed = stages is not None and stages.tick()
             try:
-                data, addr = s.recvfrom(1024)
-                receive_time = time.time()
+                if control_size:
+                    data, ancdata, _, addr = s.recvmsg(MAX_DATAGRAM, control_size)
+                    dropped = parse_rxq_ovfl(ancdata)
+                    if dropped is not None:
+                        kernel.rxq_ovfl = dropped
+                else:
+                    data, addr = s.recvfrom(MAX_DATAGRAM)   # đủ cho datagram lớn nhất, không cắt cụt
+                if timed:
+                    stages.lap("recvfrom")
+                idle = 0.0
+                receive_ns = time.time_ns()
+                receive_mono = time.monotonic_ns() if clock == CLOCK_MONO else 0
+                if timed:
+                    stages.lap("time_ns")
+
+                # Tự nhận dạng gói nhị phân hoặc text cũ "id,send_time"
+                packet_id, send_ns, session_id = parse_packet(data, 0, len(data))
+                delay_ns = receive_ns - send_ns
+                if clock == CLOCK_MONO:
+                    send_mono = send_mono_ns(data, 0, len(data))
+                    if send_mono is not None:
+                        delay_ns = receive_mono - send_mono
+                delay_ms = delay_ns / 1e6
+                if timed:
+                    stages.lap("parse")
 
-                decoded = data.decode().strip().split(",")
-                packet_id = int(decoded[0])
-                send_time = float(decoded[1])
-                delay_ms = (receive_time - send_time) * 1000
+                if feedback is not None:
+                    flow = (addr, session_id)
+                    if flow not in feedback:
+                        feedback.open(flow, addr)
+                    feedback.record(flow, packet_id, delay_ns, receive_ns)
+                    feedback.maybe_send(receive_ns)
+                    if timed:
+                        stages.lap("feedback")
 
-                print(f"[RECV] Gói {packet_id} từ {addr} | Độ trễ: {delay_ms:.2f} ms")
+                if live is None:
+                    print(f"[RECV] Gói {packet_id} từ {addr} | Độ trễ: {delay_ms:.2f} ms")
+                    if timed:
+                        stages.lap("print")
+                else:
+                    live.record(packet_id, delay_ns, receive_ns, session_id)
+                    live.maybe_report(receive_ns)
+                    if timed:
+                        stages.lap("live")
 
-                # Ghi log vào CSV
-                writer.writerow([packet_id, send_time, receive_time, round(delay_ms, 3)])
-                f.flush()
+                # Gom dòng kết quả, đẩy cả lô sang luồng ghi (không flush trên luồng nhận)
+                rows.append((packet_id, send_ns / 1e9, receive_ns / 1e9, round(delay_ms, 6)))
+                if len(rows) >= WRITE_ROWS or receive_ns - last_write >= write_interval_ns:
+                    writer.writerows(rows)
+                    rows = []
+                    last_write = receive_ns
+                received += 1
+                received_bytes += len(data)
+                if start is None:
+                    start = receive_ns
+                if timed:
+                    stages.lap("writerow")
+
+                if shm is not None:
+                    shm.record(packet_id, send_ns, receive_ns, delay_ns)
+                    shm.commit()
+                    if receive_ns >= shm.next_publish:
+                        publish_counters(shm, receive_ns, writer, received, received_bytes,
+                                         rxq_ovfl=kernel.rxq_ovfl if kernel is not None else 0)
+                    if timed:
+                        stages.lap("shm")
 
             except socket.timeout:
-                print("\n[SERVER] Hết dữ liệu, kết thúc ghi log.")
-                break
+                if rows:
+                    writer.writerows(rows)
+                    rows = []
+                    last_write = time.time_ns()
+                idle += tick
+                if idle >= timeout:
+                    print("\n[SERVER] Hết dữ liệu, kết thúc ghi log.")
+                    break
             except Exception as e:
                 print(f"[LỖI] {e}")
+    finally:
+        # Cả khi dừng bằng Ctrl+C
+        writer.writerows(rows)
+        if received:
+            report_throughput("SERVER", received, received_bytes, (receive_ns - start) / 1e9)
+        if shm is not None:
+            publish_counters(shm, time.time_ns(), writer, received, received_bytes,
+                             rxq_ovfl=kernel.rxq_ovfl if kernel is not None else 0)
+    return received
+
+
+def report_throughput(tag, packets, total_bytes, seconds, extra=""):
+    """Tổng kết gói/giây và MB/s datagram (udp_offload.throughput, gồm header đo) của một lần nhận"""
+    rate = packets / seconds if seconds > 0 else 0
+    print(f"[{tag}] Tổng {packets} gói, {total_bytes / 1e6:.2f} MB trong {seconds:.2f}s: "
+          f"{rate:.0f} gói/giây, {throughput(total_bytes, seconds):.2f} MB/s datagram{extra}")
+
+
+def publish_counters(shm, now_ns, writer, received, received_bytes, errors=0, truncated=0, rxq_ovfl=0):
+    """Snapshot bộ đếm của vòng nhận vào kênh shared memory"""
+    shm.publish(now_ns, received=received, received_bytes=received_bytes, errors=errors, truncated=truncated,
+                writer_queue=writer.queue_depth, writer_dropped=writer.dropped, rxq_ovfl=rxq_ovfl)
+
+
+def receive_batch(s, writer, timeout=SOCKET_TIMEOUT, batch_size=BATCH_SIZE, use_recvmmsg=True,
+                  live=None, clock=CLOCK_WALL, poller="select", kernel=None, rxq_ovfl=False, feedback=None,
+                  stages=None, slot_size=SLOT_SIZE, gro=False, shm=None):
+    """
+    Vòng nhận thông lượng cao: rút socket theo lô vào vùng đệm cấp phát sẵn,
+    parse không tạo chuỗi, chuyển kết quả cho tầng ghi theo lô và chỉ in thống kê định kỳ.
+    feedback (FeedbackSender): địa chỉ nguồn chỉ được đọc khi gặp flow mới.
+    stages (StageProfiler với BATCH_STAGES): bấm giờ theo lô (parse gồm cả ghi live/feedback/shm từng gói).
+    slot_size: datagram dài hơn bị cắt cụt (đếm và báo); gro=True: nhận gói đã gộp (UDP_GRO), tách theo
+    kích thước đoạn trong ancillary data, không bật được thì nhận từng datagram như cũ.
+    """
+    receiver = BatchReceiver(s, batch_size, slot_size, use_recvmmsg=use_recvmmsg, poller=poller,
+                             rxq_ovfl=kernel is not None and rxq_ovfl, addresses=feedback is not None, gro=gro)
+    buf = receiver.buffer
+    lengths = receiver.lengths
+    segments = receiver.segments
+    slot_size = receiver.slot_size
+    mono = clock == CLOCK_MONO
+    if gro and not receiver.gro:
+        print("[SERVER] Kernel không hỗ trợ UDP_GRO - nhận từng datagram")
+    print(f"[SERVER] Chế độ batch: {batch_size} ô x {slot_size} byte/lần, "
+          f"{'recvmmsg' if receiver.use_recvmmsg else 'recv_into'}{' + GRO' if receiver.gro else ''}, "
+          f"chờ bằng {receiver.poller}")
+
+    received = 0
+    received_bytes = 0
+    datagrams = 0           # số lần kernel giao (một ô), GRO gộp nhiều gói vào một
+    errors = 0
+    start = last_report = time.time()
+    first_receive = last_receive = None
+
+    try:
+        while True:
+            timed = stages is not None and stages.tick()
+            try:
+                n = receiver.recv_batch(timeout)
+            except socket.timeout:
+                print("\n[SERVER] Hết dữ liệu, kết thúc ghi log.")
+                break
+            if timed:
+                stages.lap("recv_batch")
+
+            # Một mốc thời gian cho cả lô: các gói này cùng được lấy ra khỏi socket
+            receive_ns = time.time_ns()
+            receive_time = receive_ns / 1e9
+            receive_mono = time.monotonic_ns() if mono else 0
+            if first_receive is None:
+                first_receive = receive_time
+            last_receive = receive_time
+            rows = []
+            for i in range(n):
+                start_offset = i * slot_size
+                length = lengths[i]
+                end = start_offset + length
+                received_bytes += length
+                # Ô GRO chứa nhiều gói kích thước segments[i] nối liền (gói cuối có thể ngắn hơn)
+                step = segments[i] or length or 1
+                for offset in range(start_offset, end, step):
+                    stop = min(offset + step, end)
+                    try:
+                        packet_id, send_ns, session_id = parse_packet(buf, offset, stop)
+                    except ValueError:
+                        errors += 1
+                        continue
+                    delay_ns = receive_ns - send_ns
+                    if mono:
+                        send_mono = send_mono_ns(buf, offset, stop)
+                        if send_mono is not None:
+                            delay_ns = receive_mono - send_mono
+                    rows.append((packet_id, send_ns / 1e9, receive_time, round(delay_ns / 1e6, 6)))
+                    if live is not None:
+                        live.record(packet_id, delay_ns, receive_ns, session_id)
+                    if shm is not None:
+                        shm.record(packet_id, send_ns, receive_ns, delay_ns)
+                    if feedback is not None:
+                        flow = (receiver.address_key(i), session_id)
+                        if flow not in feedback:
+                            feedback.open(flow, receiver.address(i))
+                        feedback.record(flow, packet_id, delay_ns, receive_ns)
+            datagrams += n
+            if timed:
+                stages.lap("parse")
+
+            writer.writerows(rows)
+            received += len(rows)
+            if timed:
+                stages.lap("writerows")
+            if kernel is not None:
+                kernel.rxq_ovfl = receiver.rxq_ovfl
+            if feedback is not None:
+                feedback.maybe_send(receive_ns)
+                if timed:
+                    stages.lap("feedback")
+            if shm is not None:
+                shm.commit()
+                if receive_ns >= shm.next_publish:
+                    publish_counters(shm, receive_ns, writer, received, received_bytes, errors, receiver.truncated,
+                                     receiver.rxq_ovfl)
+                if timed:
+                    stages.lap("shm")
+
+            if live is not None:
+                live.maybe_report(receive_ns)
+            elif receive_time - last_report >= REPORT_INTERVAL:
+                rate = received / (receive_time - start)
+                print(f"[BATCH] Đã nhận {received} gói ({rate:.0f} gói/giây, "
+                      f"{throughput(received_bytes, receive_time - start):.2f} MB/s datagram), lỗi parse: {errors}, "
+                      f"cắt cụt: {receiver.truncated}, hàng đợi ghi: {writer.queue_depth}, bỏ: {writer.dropped}")
+                last_report = receive_time
+            if timed:
+                stages.lap("report")
+    finally:
+        receiver.close()
+        if received:
+            # Thời gian tính tới lần nhận cuối (không gồm khoảng chờ timeout)
+            extra = f", {received / datagrams:.1f} gói/lần nhận (GRO)" if receiver.gro else ""
+            if receiver.truncated:
+                extra += f", {receiver.truncated} datagram bị cắt cụt (> {slot_size} byte, tăng --max-size)"
+            report_throughput("BATCH", received, received_bytes, last_receive - first_receive, extra)
+        if shm is not None:
+            publish_counters(shm, time.time_ns(), writer, received, received_bytes, errors, receiver.truncated,
+                             receiver.rxq_ovfl)
+    return received
+
+
+def main():
+    parser = argparse.ArgumentParser(description="UDP server nhận gói và đo độ trễ")
+    parser.add_argument("--port", type=int, default=PORT, help="cổng UDP lắng nghe")
+    parser.add_argument("--timeout", type=float, default=SOCKET_TIMEOUT,
+                        help="dừng sau số giây không nhận thêm gói nào (classic/batch/workers)")
+    parser.add_argument("--mode", choices=["classic", "batch", "async"], default="classic",
+                        help="classic: in/ghi từng gói; batch: nhận theo lô thông lượng cao; "
+                             "async: asyncio nhiều phiên đồng thời, chạy tới khi Ctrl+C")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="số gói tối đa mỗi lần rút socket (chế độ batch)")
+    parser.add_argument("--no-recvmmsg", action="store_true",
+                        help="chế độ batch: bỏ qua recvmmsg, dùng vòng recv_into")
+    parser.add_argument("--max-size", type=parse_size, default=SLOT_SIZE, metavar="BYTE",
+                        help=f"batch/workers: datagram lớn nhất nhận nguyên vẹn (số byte, 64k, mtu, max; mặc định "
+                             f"{SLOT_SIZE}), dài hơn bị cắt cụt và đếm; classic luôn nhận tới {MAX_DATAGRAM} byte")
+    parser.add_argument("--gro", action="store_true",
+                        help="batch/workers: bật UDP_GRO - kernel gộp gói cùng flow, tách lại theo kích thước đoạn "
+                             "(dùng với client --gso); kernel không hỗ trợ thì nhận từng datagram")
+    parser.add_argument("--writer-queue", type=int, default=QUEUE_SIZE,
+                        help="số lô tối đa chờ ghi; đầy thì bỏ và đếm vào 'dropped'")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="số tiến trình nhận dùng chung cổng qua SO_REUSEPORT (mỗi worker chạy chế độ batch)")
+    parser.add_argument("--keep-shards", action="store_true",
+                        help="--workers: giữ lại file shard của từng worker sau khi trộn")
+    parser.add_argument("--session-idle", type=float, default=SESSION_IDLE_TIMEOUT,
+                        help="chế độ async: đóng phiên sau số giây không nhận gói")
+    parser.add_argument("--live", action="store_true",
+                        help="thống kê trực tiếp p50/p95/p99/p99.9, jitter, mất gói theo cửa sổ 1s/10s/60s")
+    parser.add_argument("--output", choices=["csv", "columnar"], default="csv",
+                        help="csv: data/results.csv; columnar: data/results.col (int64/float64 theo cột)")
+    parser.add_argument("--clock", choices=CLOCKS, default=CLOCK_WALL,
+                        help="wall: delay từ time.time_ns() hai phía; mono: từ time.monotonic_ns() "
+                             "(không bị NTP chỉnh, chỉ đúng khi client cùng máy; gói text vẫn dùng wall)")
+    parser.add_argument("--echo", action="store_true",
+                        help="trả lời gói đo đồng hồ trên cổng PORT+1 (client --sync ước lượng offset/drift/RTT)")
+    parser.add_argument("--kernel-stats", type=float, nargs="?", const=SAMPLE_INTERVAL, metavar="GIÂY",
+                        help=f"lấy mẫu rx_queue/drops (/proc/net/udp) và RcvbufErrors (/proc/net/snmp) mỗi "
+                             f"GIÂY (mặc định {SAMPLE_INTERVAL}), ghi <file kết quả>.kernel.csv")
+    parser.add_argument("--rxq-ovfl", action="store_true",
+                        help="classic/batch: bật SO_RXQ_OVFL, đọc số gói bị bỏ kèm từng gói (ngụ ý --kernel-stats)")
+    parser.add_argument("--feedback", type=float, nargs="?", const=FEEDBACK_INTERVAL, metavar="GIÂY",
+                        help=f"gửi phản hồi (id cao nhất, mất gói, min/p50/p99 delay) về từng flow mỗi GIÂY "
+                             f"(mặc định {FEEDBACK_INTERVAL}) cho client --adaptive")
+    parser.add_argument("--shm", nargs="?", const=SHM_NAME, metavar="TÊN",
+                        help=f"classic/batch: công bố bộ đếm + vòng gói gần nhất vào shared memory TÊN (mặc định "
+                             f"{SHM_NAME}) cho reader trực tiếp (analyze_results.py --shm), không qua file")
+    add_tuning_arguments(parser)
+    add_profiling_arguments(parser)
+    args = parser.parse_args()
+    if args.rxq_ovfl and args.kernel_stats is None:
+        args.kernel_stats = SAMPLE_INTERVAL
+    try:
+        args.tuning = tuning_from_args(args)
+    except (OSError, ValueError) as e:
+        parser.error(f"--tuning: {e}")
+
+    # Tạo thư mục data nếu chưa có
+    os.makedirs("data", exist_ok=True)
+
+    echo = EchoResponder(HOST, args.port).start() if args.echo else None
+    try:
+        serve(args)
+    finally:
+        if echo is not None:
+            echo.close()
+            print(f"[ECHO] Đã trả lời {echo.replies} gói đo đồng hồ")
+
+
+def record_tuning(result_path, tuning, applied):
+    """In giá trị hiệu lực và lưu hồ sơ tinh chỉnh cạnh file kết quả"""
+    print(f"[TUNING] {describe(tuning, applied)}")
+    path = save_record(result_path, make_record("server", tuning, applied))
+    print(f"[TUNING] Đã ghi {path}")
+
+
+def start_kernel_sampler(args, result_path, writer=None):
+    """--kernel-stats: luồng lấy mẫu bộ đếm kernel của cổng lắng nghe (None nếu tắt/không có /proc)"""
+    if args.kernel_stats is None:
+        return None
+    if not HAS_PROC:
+        print("[KERNEL] Không có /proc/net/udp (không phải Linux) - bỏ qua --kernel-stats")
+        return None
+    sampler = KernelSampler(counters_path(result_path), args.port, args.kernel_stats, writer).start()
+    print(f"[KERNEL] Lấy mẫu bộ đếm kernel mỗi {args.kernel_stats:g}s -> {sampler.path}")
+    return sampler
+
+
+def stop_kernel_sampler(sampler):
+    if sampler is not None:
+        sampler.close()
+        print(f"[KERNEL] {sampler.describe()}")
+
+
+def report_feedback(feedback):
+    if feedback is not None:
+        print(f"[FEEDBACK] Đã gửi {feedback.sent} gói phản hồi, lỗi gửi {feedback.errors}")
+
+
+def report_profiling(profiling, items=None, unit="vòng", writer_stages=None):
+    """In bảng chi phí từng công đoạn / cProfile / stack sampling khi dừng"""
+    for line in profiling.finish(items, unit):
+        print(f"[PROFILE] {line}")
+    if writer_stages is not None:
+        for line in writer_stages.report(unit="vòng ghi"):
+            print(f"[PROFILE] Luồng ghi: {line}")
+
+
+def serve(args):
+    """Chạy chế độ nhận đã chọn tới khi hết dữ liệu hoặc Ctrl+C"""
+    tuning = args.tuning
+    out_file = COLUMNAR_FILE if args.output == "columnar" else DATA_FILE
+
+    if args.mode == "async":
+        from async_server import SESSIONS_DIR, run
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        applied = apply_tuning(s, tuning)
+        s.bind((HOST, args.port))
+        os.makedirs(SESSIONS_DIR, exist_ok=True)
+        record_tuning(SESSIONS_DIR, tuning, applied)
+        kernel = start_kernel_sampler(args, SESSIONS_DIR)
+        if args.shm:
+            print("[SHM] --mode async: chưa hỗ trợ kênh shared memory - bỏ qua --shm")
+        # Vòng asyncio không có công đoạn cố định: chỉ cProfile / stack sampling
+        profiling = Profiling(args, ())
+        try:
+            run(HOST, args.port, output=args.output, idle_timeout=args.session_idle, clock=args.clock, sock=s,
+                feedback=args.feedback, live=LiveMetrics() if args.live else None)
+        finally:
+            stop_kernel_sampler(kernel)
+            report_profiling(profiling)
+        return
+
+    if args.workers > 1:
+        from multi_worker import run_workers
+
+        if args.profile_stages or args.cprofile or args.stack_sample:
+            print("[PROFILE] --workers: tiến trình chính chỉ chờ worker - bỏ qua đo chi phí "
+                  "(đo với một worker: --mode batch)")
+        if args.shm:
+            print("[SHM] --workers: mỗi worker một vòng nhận riêng - bỏ qua --shm (dùng với một worker)")
+
+        # Bộ lấy mẫu ở tiến trình chính cộng drops của mọi socket SO_REUSEPORT trên cổng
+        # (SO_RXQ_OVFL nằm trong từng worker nên không dùng ở chế độ này)
+        kernel = start_kernel_sampler(args, out_file)
+        try:
+            stats = run_workers(args.workers, HOST, args.port, "data", out_file, output=args.output,
+                                batch_size=args.batch_size, timeout=args.timeout, keep_shards=args.keep_shards,
+                                clock=args.clock, tuning=tuning, feedback=args.feedback, slot_size=args.max_size,
+                                gro=args.gro)
+        finally:
+            stop_kernel_sampler(kernel)
+        if stats["applied"] is not None:
+            record_tuning(out_file, tuning, stats["applied"])
+        return
+
+    # Tạo kênh shared memory trước socket/luồng ghi: tên đang được server khác dùng thì dừng ngay
+    shm = None
+    if args.shm:
+        try:
+            shm = MetricsPublisher(args.shm)
+        except FileExistsError as e:
+            sys.exit(f"[SHM] {e}")
+        print(f"[SHM] Công bố metrics vào shared memory '{shm.name}' "
+              f"({shm.capacity} gói gần nhất, bộ đếm mỗi {shm.interval_ns / 1e9:g}s)")
+
+    # Tạo socket UDP, tinh chỉnh trước khi bind (buffer nhận áp dụng cho hàng đợi của socket)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        applied = apply_tuning(s, tuning)
+        s.bind((HOST, args.port))
+        print(f"[SERVER] Listening on {HOST}:{args.port}")
+        record_tuning(out_file, tuning, applied)
+
+        # Mở file kết quả (ghi trên luồng nền, flush theo lô/thời gian)
+        sink = ColumnarSink(out_file) if args.output == "columnar" else CsvSink(out_file)
+        writer_stages = StageProfiler(WRITER_STAGES, sample_every=1) if args.profile_stages else None
+        writer = AsyncResultWriter(sink, queue_size=args.writer_queue, stages=writer_stages)
+        live = LiveMetrics() if args.live else None
+        kernel = start_kernel_sampler(args, out_file, writer)
+        feedback = FeedbackSender(s.sendto, args.feedback) if args.feedback else None
+        batch = args.mode == "batch"
+        profiling = Profiling(args, BATCH_STAGES if batch else CLASSIC_STAGES,
+                              waits=("recv_batch",) if batch else ("recvfrom",))
+        try:
+            if batch:
+                receive_batch(s, writer, timeout=args.timeout, batch_size=args.batch_size,
+                              use_recvmmsg=not args.no_recvmmsg, live=live, clock=args.clock,
+                              poller=tuning.get("poller", "select"), kernel=kernel, rxq_ovfl=args.rxq_ovfl,
+                              feedback=feedback, stages=profiling.stages, slot_size=args.max_size, gro=args.gro,
+                              shm=shm)
+            else:
+                receive_classic(s, writer, timeout=args.timeout, live=live, clock=args.clock,
+                                kernel=kernel, rxq_ovfl=args.rxq_ovfl, feedback=feedback, stages=profiling.stages,
+                                shm=shm)
+        except KeyboardInterrupt:
+            print("\n[SERVER] Nhận Ctrl+C, dừng và ghi nốt dữ liệu.")
+        finally:
+            if live is not None:
+                live.final_report()
+            writer.close()
+            stats = writer.stats()
+            print(f"[SERVER] Đã ghi {stats['written']} dòng vào {out_file}, "
+                  f"bỏ {stats['dropped']} dòng, hàng đợi tối đa {stats['max_queue_depth']}")
+            stop_kernel_sampler(kernel)
+            report_feedback(feedback)
+            if shm is not None:
+                shm.close()
+                print(f"[SHM] Đã công bố {shm.head} gói, gỡ '{shm.name}'")
+            if profiling.enabled:
+                report_profiling(profiling, stats['written'] + stats['dropped'] if batch else None,
+                                 "lô" if batch else "gói", writer_stages)
+
+
+if __name__ == "__main__":
+    main()